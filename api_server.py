@@ -0,0 +1,439 @@
+"""Headless HTTP API for the assistant, for the storefront widget and chat bots.
+
+A small asyncio HTTP/1.1 server (keep-alive, JSON and Server-Sent Events)
+around AsyncChatHandler, with conversation history kept server-side per
+session ID (in SQLite when SESSION_DB is set, so every worker sees every
+conversation). With --workers N the knowledge base and memory-mapped vector
+index are built once, then N forked workers share them and the listening
+socket; set RESPONSE_CACHE_SHM and they also share one response cache:
+
+    python api_server.py --port 8000 --workers 4
+
+Endpoints:
+    POST   /v1/chat                 {"message", "session_id"?} -> {"session_id", "reply"}
+    POST   /v1/chat/stream          same body, reply streamed as SSE "data: {"delta": ...}" events
+    GET    /v1/sessions/<id>        conversation history
+    DELETE /v1/sessions/<id>        forget a conversation
+    GET    /health, GET /metrics    liveness and Prometheus metrics
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import socket
+import uuid
+from collections import OrderedDict
+from http import HTTPStatus
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from async_chat_handler import AsyncChatHandler, create_async_groq_client
+from chat_handler import INTERRUPTED_NOTICE
+from intent_classifier import DEFAULT_THRESHOLD, IntentClassifier
+from knowledge_base import KnowledgeBase
+from knowledge_snapshot import KnowledgeReloader, KnowledgeSnapshot
+from precomputed import PrecomputedAnswers
+from response_cache import ResponseCache, backend_from_env
+from retrievers import VectorRetriever
+from session_store import MemorySessionStore, SQLiteSessionStore
+from startup import load_environment
+from vector_index import VECTOR_INDEX_DIR
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+MAX_MESSAGE_CHARS = 2000
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    def __init__(self, method: str, target: str, version: str, headers: Dict[str, str], body: bytes):
+        self.method = method
+        self.path = urlsplit(target).path
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def json(self) -> Dict[str, Any]:
+        try:
+            payload = json.loads(self.body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Request body must be JSON")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+        return payload
+
+
+class ChatSessions:
+    """Server-side conversation histories, keyed by session ID
+
+    Histories live in a session store: by default a MemorySessionStore
+    (newest max_messages per session, LRU and idle eviction), or a
+    SQLiteSessionStore shared by every worker. Turns in one session are
+    serialised within a worker so concurrent requests cannot interleave.
+    """
+
+    def __init__(self, max_sessions: int = 10000, max_messages: int = 40, idle_ttl: float = 3600.0,
+                 store: Any = None):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.store = store if store is not None else MemorySessionStore(max_sessions, max_messages, idle_ttl)
+        # session id -> turn lock, least recently used first
+        self._locks: "OrderedDict[str, asyncio.Lock]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def get(self, session_id: str) -> Tuple[List[Dict[str, str]], asyncio.Lock]:
+        lock = self._locks.pop(session_id, None) or asyncio.Lock()
+        self._locks[session_id] = lock
+        while len(self._locks) > self.max_sessions:
+            oldest_id, oldest = next(iter(self._locks.items()))
+            if oldest.locked():  # a turn is in progress; try again later
+                break
+            del self._locks[oldest_id]
+        return self.store.recent(session_id, self.max_messages), lock
+
+    def history(self, session_id: str) -> Optional[List[Dict[str, str]]]:
+        history = self.store.recent(session_id, self.max_messages)
+        return history if history else None
+
+    def append(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        self.store.append(session_id, messages)
+
+    def delete(self, session_id: str) -> bool:
+        self._locks.pop(session_id, None)
+        return self.store.delete(session_id)
+
+
+class ChatAPIServer:
+    """Routes HTTP requests on persistent connections to an AsyncChatHandler"""
+
+    def __init__(self, chat_handler: AsyncChatHandler, sessions: Optional[ChatSessions] = None,
+                 keepalive_timeout: float = 15.0, api_token: Optional[str] = None,
+                 cors_origin: Optional[str] = None):
+        self.chat_handler = chat_handler
+        self.sessions = sessions if sessions is not None else ChatSessions()
+        self.keepalive_timeout = keepalive_timeout
+        self.api_token = api_token
+        self.cors_origin = cors_origin
+        self.open_connections = 0
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve requests on one connection until it closes or idles out"""
+        self.open_connections += 1
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), self.keepalive_timeout)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+                keep_alive = await self._dispatch(request, writer)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.open_connections -= 1
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Request]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if not e.partial:
+                return None  # client closed an idle connection
+            raise
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431, "Request headers too large")
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(411, "Send a Content-Length instead of a chunked body")
+        content_length = headers.get("content-length") or "0"
+        # Digits only: int() would also take signs, underscores and other scripts' digits
+        if not re.fullmatch(r"[0-9]+", content_length):
+            raise HTTPError(400, "Invalid Content-Length")
+        length = int(content_length)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return Request(method.upper(), target, version, headers, body)
+
+    def _headers(self, keep_alive: bool) -> List[Tuple[str, str]]:
+        headers = [("Connection", "keep-alive" if keep_alive else "close")]
+        if keep_alive:
+            headers.append(("Keep-Alive", f"timeout={int(self.keepalive_timeout)}"))
+        if self.cors_origin:
+            headers += [
+                ("Access-Control-Allow-Origin", self.cors_origin),
+                ("Access-Control-Allow-Headers", "Authorization, Content-Type"),
+                ("Access-Control-Allow-Methods", "GET, POST, DELETE, OPTIONS"),
+                ("Access-Control-Expose-Headers", "X-Session-Id"),
+            ]
+        return headers
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, body: bytes, content_type: str,
+                    keep_alive: bool, extra: Optional[List[Tuple[str, str]]] = None) -> None:
+        headers = [("Content-Type", content_type), ("Content-Length", str(len(body)))]
+        headers += self._headers(keep_alive) + (extra or [])
+        head = f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers) + "\r\n"
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: Any, keep_alive: bool,
+                         extra: Optional[List[Tuple[str, str]]] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        await self._send(writer, status, body, "application/json; charset=utf-8", keep_alive, extra)
+
+    async def _dispatch(self, request: Request, writer: asyncio.StreamWriter) -> bool:
+        """Handle one request; returns whether the connection stays open"""
+        keep_alive = request.keep_alive
+        try:
+            if request.method == "OPTIONS":
+                await self._send(writer, 204, b"", "text/plain", keep_alive)
+                return keep_alive
+            if request.path == "/health" and request.method == "GET":
+                health = {"status": "ok", "pid": os.getpid(),
+                          "knowledge_version": self.chat_handler.knowledge_base.version,
+                          "circuits": self.chat_handler.upstream.circuit_states()}
+                await self._send_json(writer, 200, health, keep_alive)
+                return keep_alive
+
+            self._authorize(request)
+            if request.path == "/metrics" and request.method == "GET":
+                body = self.chat_handler.metrics.export_prometheus().encode("utf-8")
+                await self._send(writer, 200, body, "text/plain; version=0.0.4", keep_alive)
+            elif request.path == "/v1/chat" and request.method == "POST":
+                await self._chat(request, writer, keep_alive)
+            elif request.path == "/v1/chat/stream" and request.method == "POST":
+                await self._chat_stream(request, writer, keep_alive)
+            elif request.path.startswith("/v1/sessions/") and request.method in ("GET", "DELETE"):
+                await self._session(request, writer, keep_alive)
+            else:
+                raise HTTPError(404, "Not found")
+        except HTTPError as e:
+            await self._send_json(writer, e.status, {"error": e.message}, keep_alive)
+        return keep_alive
+
+    def _authorize(self, request: Request) -> None:
+        if self.api_token and request.headers.get("authorization") != f"Bearer {self.api_token}":
+            raise HTTPError(401, "Missing or invalid bearer token")
+
+    def _parse_chat(self, request: Request) -> Tuple[str, str]:
+        payload = request.json()
+        message = payload.get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise HTTPError(400, '"message" must be a non-empty string')
+        if len(message) > MAX_MESSAGE_CHARS:
+            raise HTTPError(413, f'"message" is limited to {MAX_MESSAGE_CHARS} characters')
+        session_id = payload.get("session_id") or uuid.uuid4().hex
+        if not isinstance(session_id, str) or not SESSION_ID_PATTERN.match(session_id):
+            raise HTTPError(400, '"session_id" must be 1-128 letters, digits, "-" or "_"')
+        return message.strip(), session_id
+
+    async def _chat(self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool) -> None:
+        message, session_id = self._parse_chat(request)
+        history, lock = self.sessions.get(session_id)
+        async with lock:
+            turn = history + [{"role": "user", "content": message}]
+            reply = await self.chat_handler.generate_response_async(message, turn)
+            self.sessions.append(session_id, [turn[-1], {"role": "assistant", "content": reply}])
+        await self._send_json(writer, 200, {"session_id": session_id, "reply": reply}, keep_alive,
+                              [("X-Session-Id", session_id)])
+
+    async def _chat_stream(self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool) -> None:
+        message, session_id = self._parse_chat(request)
+        history, lock = self.sessions.get(session_id)
+        async with lock:
+            turn = history + [{"role": "user", "content": message}]
+            headers = [("Content-Type", "text/event-stream; charset=utf-8"), ("Cache-Control", "no-cache"),
+                       ("Transfer-Encoding", "chunked"), ("X-Session-Id", session_id)]
+            head = "HTTP/1.1 200 OK\r\n" + "".join(
+                f"{name}: {value}\r\n" for name, value in headers + self._headers(keep_alive)
+            ) + "\r\n"
+            writer.write(head.encode("latin-1"))
+
+            parts = []
+            deltas = self.chat_handler.generate_response_stream_async(message, turn)
+            try:
+                async for delta in deltas:
+                    parts.append(delta)
+                    await self._write_event(writer, {"delta": delta})
+                # A disconnect raises above, and a reply cut off upstream ends with the notice;
+                # only finished replies join the history
+                reply = "".join(parts)
+                interrupted = reply.endswith(INTERRUPTED_NOTICE)
+                if not interrupted:
+                    self.sessions.append(session_id, [turn[-1], {"role": "assistant", "content": reply}])
+                await self._write_event(writer, {"session_id": session_id, "reply": reply,
+                                                 "interrupted": interrupted}, event="done")
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+            finally:
+                await deltas.aclose()
+
+    @staticmethod
+    async def _write_event(writer: asyncio.StreamWriter, payload: Dict[str, Any], event: Optional[str] = None) -> None:
+        data = json.dumps(payload, ensure_ascii=False)
+        frame = (f"event: {event}\n" if event else "") + f"data: {data}\n\n"
+        encoded = frame.encode("utf-8")
+        # One HTTP chunk per event keeps the connection reusable afterwards
+        writer.write(f"{len(encoded):x}\r\n".encode("latin-1") + encoded + b"\r\n")
+        await writer.drain()
+
+    async def _session(self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool) -> None:
+        session_id = request.path.rsplit("/", 1)[-1]
+        if request.method == "DELETE":
+            if not self.sessions.delete(session_id):
+                raise HTTPError(404, "Unknown session")
+            await self._send(writer, 204, b"", "text/plain", keep_alive)
+            return
+        history = self.sessions.history(session_id)
+        if history is None:
+            raise HTTPError(404, "Unknown session")
+        await self._send_json(writer, 200, {"session_id": session_id, "messages": history}, keep_alive)
+
+
+def build_chat_handler(knowledge_base: KnowledgeBase, retriever: VectorRetriever,
+                       groq_base_url: Optional[str] = None, max_concurrency: int = 64) -> AsyncChatHandler:
+    """Create a worker's handler; call after forking so connections are per process"""
+    client = create_async_groq_client(
+        api_key=os.getenv("GROQ_API_KEY"), base_url=groq_base_url or os.getenv("GROQ_BASE_URL"),
+        max_connections=max_concurrency, max_keepalive=max_concurrency,
+    )
+    # With RESPONSE_CACHE_SHM every worker reads and fills one cache
+    response_cache = ResponseCache(backend=backend_from_env())
+    handler = AsyncChatHandler(client, knowledge_base, retriever, response_cache, max_concurrency=max_concurrency)
+    handler.upstream.hedge = os.getenv("GROQ_HEDGE") == "1"
+    handler.intent_classifier = IntentClassifier.load_or_train(
+        threshold=float(os.getenv("INTENT_THRESHOLD", DEFAULT_THRESHOLD))
+    )
+    return handler
+
+
+def install_precomputed(handler: AsyncChatHandler) -> None:
+    """Serve the opening answers saved for the current knowledge version, if any
+
+    Workers only read them; `python precomputed.py` or the Streamlit app generates them.
+    """
+    answers = PrecomputedAnswers.load(handler.knowledge_base.version)
+    if answers is not None:
+        handler.use_precomputed(answers)
+
+
+async def run_worker(sock: socket.socket, knowledge_base: KnowledgeBase, retriever: VectorRetriever,
+                     args: argparse.Namespace) -> None:
+    handler = build_chat_handler(knowledge_base, retriever, args.groq_base_url, args.max_concurrency)
+    # Started after forking, since threads do not survive fork; each worker reuses the
+    # versioned index directory the first one to notice a change saved
+    reloader = KnowledgeReloader.from_parts(knowledge_base, retriever, interval=args.reload_interval)
+    install_precomputed(handler)
+
+    def on_snapshot(snapshot: KnowledgeSnapshot) -> None:
+        handler.use_knowledge(snapshot.knowledge_base, snapshot.retriever)
+        install_precomputed(handler)
+
+    reloader.subscribe(on_snapshot)
+    reloader.start()
+    # Opened after forking: SQLite connections must not be shared across processes
+    session_db = os.getenv("SESSION_DB")
+    store = SQLiteSessionStore(session_db) if session_db else None
+    api = ChatAPIServer(handler, ChatSessions(args.max_sessions, store=store), args.keepalive_timeout,
+                        os.getenv("API_TOKEN"), os.getenv("CORS_ORIGIN"))
+    server = await asyncio.start_server(api.handle_connection, sock=sock, limit=MAX_HEADER_BYTES,
+                                        backlog=args.backlog)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    async with server:
+        await stop.wait()
+    reloader.stop()
+    await handler.aclose()
+
+
+def serve(args: argparse.Namespace) -> None:
+    # Built before forking: workers share the mmap'd index pages and the parsed corpus
+    knowledge_base = KnowledgeBase()
+    retriever = VectorRetriever(knowledge_base, index_path=VECTOR_INDEX_DIR)
+    sock = socket.create_server((args.host, args.port), backlog=args.backlog)
+    print(f"Serving on http://{args.host}:{sock.getsockname()[1]} with {args.workers} worker(s)", flush=True)
+
+    if args.workers <= 1 or not hasattr(os, "fork"):
+        asyncio.run(run_worker(sock, knowledge_base, retriever, args))
+        return
+
+    children = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                asyncio.run(run_worker(sock, knowledge_base, retriever, args))
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def stop_children(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop_children)
+    signal.signal(signal.SIGINT, stop_children)
+    for pid in children:
+        os.waitpid(pid, 0)
+
+
+def main() -> None:
+    load_environment()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="forked worker processes sharing the socket")
+    parser.add_argument("--max-concurrency", type=int, default=64, help="upstream LLM requests per worker")
+    parser.add_argument("--max-sessions", type=int, default=10000, help="conversations kept per worker")
+    parser.add_argument("--keepalive-timeout", type=float, default=15.0)
+    parser.add_argument("--backlog", type=int, default=1024)
+    parser.add_argument("--groq-base-url", help="e.g. a local fake server for benchmarks")
+    parser.add_argument("--reload-interval", type=float,
+                        default=float(os.getenv("KNOWLEDGE_RELOAD_INTERVAL", "10")),
+                        help="seconds between knowledge source checks; 0 disables reloading")
+    serve(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
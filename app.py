@@ -1,11 +1,19 @@
-from dotenv import load_dotenv
-load_dotenv()
+from startup import LazyGroqClient, load_environment, startup_report, warm_up
+load_environment()
 import streamlit as st
 import os
-from groq import Groq
+import time
+from intent_classifier import DEFAULT_THRESHOLD, IntentClassifier
 from knowledge_base import KnowledgeBase
-from chat_handler import ChatHandler
-from utils import initialize_session_state, display_chat_history
+from knowledge_snapshot import KnowledgeReloader
+from chat_handler import INTERRUPTED_NOTICE, ChatHandler
+from metrics import MetricsRecorder
+from precomputed import SAMPLE_QUESTIONS, load_questions, refresh_in_background
+from response_cache import ResponseCache, backend_from_env
+from retrievers import VectorRetriever
+from session_store import MemorySessionStore, SQLiteSessionStore
+from vector_index import VECTOR_INDEX_DIR
+from utils import HISTORY_WINDOW, initialize_session_state, display_chat_history
 
 # Configure page
 st.set_page_config(
@@ -25,21 +33,92 @@ def get_groq_client():
     if not api_key:
         st.error("GROQ_API_KEY environment variable is not set. Please add your API key to continue.")
         st.stop()
-    return Groq(api_key=api_key)
+    # The groq SDK is imported on first use, keeping it off the first page load
+    return LazyGroqClient(startup_report, api_key=api_key)
 
 # Initialize knowledge base
 @st.cache_resource
 def get_knowledge_base():
-    return KnowledgeBase()
+    with startup_report.phase("knowledge_base"):
+        return KnowledgeBase()
+
+# Shared by every session of this server process
+@st.cache_resource
+def get_metrics():
+    # METRICS_JSONL appends one JSON line per request; PROFILE_SAMPLE_RATE samples stacks
+    return MetricsRecorder(
+        jsonl_path=os.getenv("METRICS_JSONL"),
+        profile_sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    )
+
+# Conversations of every session served by this process
+@st.cache_resource
+def get_session_store():
+    # Set SESSION_DB to keep conversations across restarts and share them between workers
+    session_db = os.getenv("SESSION_DB")
+    return SQLiteSessionStore(session_db) if session_db else MemorySessionStore()
+
+# Routes common intents (order tracking, COD, contact...) away from the LLM
+@st.cache_resource
+def get_intent_classifier():
+    with startup_report.phase("intent_classifier"):
+        # Set INTENT_THRESHOLD above 1 to send every query to the LLM
+        return IntentClassifier.load_or_train(threshold=float(os.getenv("INTENT_THRESHOLD", DEFAULT_THRESHOLD)))
+
+# Current knowledge snapshot, rebuilt in the background when attached_assets changes
+@st.cache_resource
+def get_knowledge_reloader():
+    knowledge_base = get_knowledge_base()
+    with startup_report.phase("vector_index"):
+        # Memory-mapped so every worker on the host shares one copy of the index
+        retriever = VectorRetriever(knowledge_base, index_path=VECTOR_INDEX_DIR)
+    # KNOWLEDGE_RELOAD_INTERVAL seconds between source checks; 0 disables reloading
+    interval = float(os.getenv("KNOWLEDGE_RELOAD_INTERVAL", "10"))
+    return KnowledgeReloader.from_parts(knowledge_base, retriever, interval=interval).start()
 
 # Initialize chat handler
 @st.cache_resource
 def get_chat_handler():
     groq_client = get_groq_client()
-    knowledge_base = get_knowledge_base()
-    return ChatHandler(groq_client, knowledge_base)
+    reloader = get_knowledge_reloader()
+    knowledge_base, retriever = reloader.current.knowledge_base, reloader.current.retriever
+    # RESPONSE_CACHE_SHM shares cached answers between every server process on the host;
+    # RESPONSE_CACHE_DB keeps them across restarts
+    response_cache = ResponseCache(backend=backend_from_env())
+    handler = ChatHandler(groq_client, knowledge_base, retriever, response_cache, metrics=get_metrics(),
+                          intent_classifier=get_intent_classifier())
+    # Send a second request when one runs past the recent p95 (GROQ_HEDGE=1; costs extra tokens)
+    handler.upstream.hedge = os.getenv("GROQ_HEDGE") == "1"
+    # Answer the sample questions and top intents ahead of time (PRECOMPUTE_ANSWERS=0 to disable)
+    questions = load_questions() if os.getenv("PRECOMPUTE_ANSWERS", "1") != "0" else []
+    
+    def on_snapshot(snapshot):
+        # Later snapshots replace the handler's knowledge between requests
+        handler.use_knowledge(snapshot.knowledge_base, snapshot.retriever)
+        if questions:
+            refresh_in_background(handler, questions)
+    
+    reloader.subscribe(on_snapshot)
+    # Fill lazy caches now rather than during the first user's question
+    warm_up(handler)
+    if questions:
+        refresh_in_background(handler, questions)
+    # Import the SDK in the background once the page is up (GROQ_PRELOAD=0 to defer to first use)
+    if os.getenv("GROQ_PRELOAD", "1") != "0":
+        groq_client.preload()
+    return handler
 
 def main():
+    started = time.perf_counter()
+    try:
+        render_page()
+    finally:
+        # Whole script run, including reruns triggered by st.rerun()
+        get_metrics().observe("script_run", time.perf_counter() - started)
+    if startup_report.mark_interactive():
+        print(startup_report.format(), flush=True)
+
+def render_page():
     # Header with professional styling
     st.markdown("""
     <div style="text-align: center; padding: 20px; background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%); border-radius: 10px; margin-bottom: 30px;">
@@ -95,8 +174,14 @@ def main():
         st.markdown("---")
         
         if st.button("🗑️ Clear Chat History", use_container_width=True):
-            st.session_state.chat_history = []
+            get_session_store().delete(st.session_state.session_id)
+            st.session_state.history_window = HISTORY_WINDOW
             st.rerun()
+        
+        # Hidden unless the page is opened with ?admin=<ADMIN_TOKEN>
+        admin_token = os.getenv("ADMIN_TOKEN")
+        if admin_token and st.query_params.get("admin") == admin_token:
+            display_admin_panel(get_metrics())
     
     # Main chat interface
     st.markdown("""
@@ -106,7 +191,10 @@ def main():
     """, unsafe_allow_html=True)
     
     # Display chat history
-    display_chat_history()
+    store = get_session_store()
+    welcome = display_chat_history(store)
+    # The new turn renders here, where the next run's history will show it
+    current_turn = st.container()
     
     # Chat input
     chat_handler = get_chat_handler()
@@ -119,58 +207,92 @@ def main():
     """, unsafe_allow_html=True)
     
     # Show common questions only if there's no chat history
-    if not st.session_state.chat_history:
-        # Sample questions with improved styling - positioned before chat input
-        st.markdown("""
-        <div style="background: #f0f8ff; padding: 15px; border-radius: 8px; margin: 20px 0;">
-            <h4 style="color: #2E8B57; margin: 0 0 15px 0;">🤔 Common Questions</h4>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            if st.button("🛍️ What products do you offer?", use_container_width=True):
-                handle_sample_question("What products do you offer?", chat_handler)
-        
-        with col2:
-            if st.button("🚚 Shipping and delivery info?", use_container_width=True):
-                handle_sample_question("What are your shipping and delivery policies?", chat_handler)
-        
-        with col3:
-            if st.button("🔄 Return policy?", use_container_width=True):
-                handle_sample_question("What is your return and refund policy?", chat_handler)
+    sample_question = None
+    common_questions = st.empty()
+    if welcome is not None:
+        with common_questions.container():
+            # Sample questions with improved styling - positioned before chat input
+            st.markdown("""
+            <div style="background: #f0f8ff; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                <h4 style="color: #2E8B57; margin: 0 0 15px 0;">🤔 Common Questions</h4>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            # Their answers are precomputed for each knowledge version, so a click is answered instantly
+            for column, (label, question) in zip(st.columns(len(SAMPLE_QUESTIONS)), SAMPLE_QUESTIONS):
+                with column:
+                    if st.button(label, use_container_width=True):
+                        sample_question = question
     
     user_input = st.chat_input("💬 Ask me anything about Aarogya Vatika...")
     
-    if user_input:
-        # Add user message to chat history
-        st.session_state.chat_history.append({"role": "user", "content": user_input})
-        
-        # Generate response
-        with st.spinner("Thinking..."):
-            response = chat_handler.generate_response(user_input, st.session_state.chat_history)
-        
-        # Add assistant response to chat history
-        st.session_state.chat_history.append({"role": "assistant", "content": response})
-        
-        # Rerun to update the display
-        st.rerun()
+    question = user_input or sample_question
+    if question:
+        # The welcome and sample questions only belong to an empty chat
+        if welcome is not None:
+            welcome.empty()
+        common_questions.empty()
+        with current_turn:
+            handle_question(question, chat_handler, store)
 
-def handle_sample_question(question, chat_handler):
-    """Handle sample question clicks"""
-    # Add user message to chat history
-    st.session_state.chat_history.append({"role": "user", "content": question})
+def handle_question(question, chat_handler, store):
+    """Answer a typed or sample question, streaming the reply as it is generated
     
-    # Generate response
-    with st.spinner("Thinking..."):
-        response = chat_handler.generate_response(question, st.session_state.chat_history)
+    The turn is drawn in place and appended to the history, which the next
+    run renders, so no extra full-page rerun is needed.
+    """
+    session_id = st.session_state.session_id
+    user_turn = {"role": "user", "content": question}
+    with st.chat_message("user", avatar="👤"):
+        st.write(question)
     
-    # Add assistant response to chat history
-    st.session_state.chat_history.append({"role": "assistant", "content": response})
+    # Render tokens as they arrive instead of blocking behind a spinner
+    started = time.perf_counter()
+    with st.chat_message("assistant", avatar="🪷"):
+        response = st.write_stream(
+            chat_handler.generate_response_stream(question, store.recent(session_id) + [user_turn])
+        )
+    get_metrics().observe("render_reply", time.perf_counter() - started)
     
-    # Rerun to update the display
-    st.rerun()
+    # Question and answer join the history together, so it keeps alternating. An interrupted
+    # reply is shown with its notice this once, and neither turn is kept
+    if not response.endswith(INTERRUPTED_NOTICE):
+        store.append(session_id, [user_turn, {"role": "assistant", "content": response}])
+
+def display_admin_panel(metrics):
+    """Rolling per-stage latency percentiles and metric exports"""
+    st.markdown("---")
+    st.header("📊 Pipeline Metrics")
+    with st.expander("Startup"):
+        st.json(startup_report.as_dict())
+    reloader = get_knowledge_reloader()
+    precomputed = get_chat_handler().precomputed
+    st.caption(f"Knowledge version: {reloader.current.version} · Reloads: {reloader.reloads} · "
+               f"Precomputed answers: {len(precomputed) if precomputed is not None else 0}"
+               + (f" · Last reload failed: {reloader.last_error}" if reloader.last_error else ""))
+    stages = metrics.stage_percentiles()
+    if not stages:
+        st.caption("No requests recorded yet.")
+        return
+    st.dataframe(
+        [{"stage": stage, **{key: round(value, 2) for key, value in stats.items()}}
+         for stage, stats in sorted(stages.items())],
+        hide_index=True, use_container_width=True,
+    )
+    st.caption(
+        f"Requests: {sum(metrics.requests.values())} · Cache hits: {metrics.requests['cache']} · "
+        f"FAQ: {metrics.requests['faq']} · Precomputed: {metrics.requests['precomputed']} · "
+        f"Intent: {metrics.requests['intent'] + metrics.requests['retrieval']} · "
+        f"Errors: {metrics.requests['error']} · "
+        f"Tokens: {metrics.tokens['prompt']} prompt / {metrics.tokens['completion']} completion"
+    )
+    st.download_button("Prometheus metrics", metrics.export_prometheus(), "metrics.prom",
+                       use_container_width=True)
+    st.download_button("Recent requests (JSON lines)", metrics.export_json_lines(), "requests.jsonl",
+                       use_container_width=True)
+    if metrics.profile:
+        st.download_button("Sampled stacks (collapsed)", metrics.export_profile(), "profile.folded",
+                           use_container_width=True)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,159 @@
+import asyncio
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+from groq import AsyncGroq, DefaultAsyncHttpxClient
+
+from chat_handler import ChatHandler
+from knowledge_base import KnowledgeBase
+from metrics import MetricsRecorder, RequestTrace
+from response_cache import ResponseCache
+from singleflight import AsyncSingleFlight
+from upstream import AsyncUpstreamClient, UpstreamUnavailable
+
+
+def create_async_groq_client(api_key: Optional[str] = None, base_url: Optional[str] = None,
+                             max_connections: int = 32, max_keepalive: int = 16,
+                             connect_timeout: float = 5.0, read_timeout: float = 30.0) -> AsyncGroq:
+    """Create an AsyncGroq client over one pooled, keep-alive HTTP connection set
+
+    Create it once per process (or event loop) and share it between handlers.
+    """
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=max_connections,
+                            max_keepalive_connections=max_keepalive,
+                            keepalive_expiry=30.0),
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+    )
+    return AsyncGroq(api_key=api_key, base_url=base_url, http_client=http_client)
+
+
+class AsyncChatHandler(ChatHandler):
+    """ChatHandler variant for asyncio servers built on the async Groq client
+
+    A semaphore bounds in-flight upstream requests, every call has a deadline
+    (request_timeout, across retries and fallback), and once every task
+    waiting on a request is cancelled (e.g. client disconnects) the upstream
+    stream is closed and its slot freed.
+    """
+
+    def __init__(self, groq_client: AsyncGroq, knowledge_base: KnowledgeBase, retriever=None,
+                 response_cache: ResponseCache = None, max_concurrency: int = 16,
+                 request_timeout: float = 30.0, metrics: MetricsRecorder = None):
+        # Read by _create_upstream during ChatHandler.__init__
+        self.request_timeout = request_timeout
+        super().__init__(groq_client, knowledge_base, retriever, response_cache, metrics=metrics)
+        self.async_single_flight = AsyncSingleFlight()
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Upstream requests currently holding a semaphore slot
+        self.in_flight = 0
+
+    def _create_upstream(self) -> AsyncUpstreamClient:
+        return AsyncUpstreamClient(self.groq_client, self.MODEL, self.FALLBACK_MODEL,
+                                   total_timeout=self.request_timeout, metrics=self.metrics)
+
+    async def generate_response_async(self, user_query: str, chat_history: List[Dict[str, str]]) -> str:
+        """Generate a response without blocking the event loop"""
+        trace = self.metrics.trace()
+        try:
+            ready_answer, messages, cache_key = self._prepare_request(user_query, chat_history, trace)
+            if ready_answer is not None:
+                return ready_answer
+
+            with trace.span("llm"):
+                return await self.async_single_flight.do(
+                    cache_key, lambda: self._complete_async(messages, cache_key, trace)
+                )
+
+        except asyncio.CancelledError:
+            trace.path = "cancelled"
+            raise
+        except UpstreamUnavailable:
+            trace.path = "fallback"
+            return self._fallback_answer(messages)
+        except Exception as e:
+            trace.path, trace.error = "error", type(e).__name__
+            return self._error_message()
+        finally:
+            trace.finish()
+
+    async def _complete_async(self, messages: List[Dict[str, str]], cache_key: str, trace: RequestTrace) -> str:
+        """Run one completion under the concurrency limit and cache its answer"""
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                response = await self._create_completion(messages, stream=False)
+            finally:
+                self.in_flight -= 1
+
+        trace.set_usage(response.usage)
+        content = response.choices[0].message.content
+        if content:
+            self.response_cache.set(cache_key, content)
+        return content
+
+    async def generate_response_stream_async(self, user_query: str,
+                                             chat_history: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Yield response deltas; the slot is held until the stream ends or every reader is cancelled"""
+        trace = self.metrics.trace()
+        messages: List[Dict[str, str]] = []
+        yielded = False
+        try:
+            ready_answer, messages, cache_key = self._prepare_request(user_query, chat_history, trace)
+            if ready_answer is not None:
+                yield ready_answer
+                return
+
+            started = time.perf_counter()
+            stream = self.async_single_flight.stream(
+                cache_key, lambda: self._stream_deltas_async(messages, cache_key, trace)
+            )
+            first = True
+            async for delta in stream:
+                if first:
+                    trace.add("llm_first_token", time.perf_counter() - started)
+                    first = False
+                yielded = True
+                yield delta
+            trace.add("llm", time.perf_counter() - started)
+
+        except asyncio.CancelledError:
+            trace.path = "cancelled"
+            raise
+        except Exception as e:
+            yield self._stream_failure(e, messages, yielded, trace)
+        finally:
+            trace.finish()
+
+    async def _stream_deltas_async(self, messages: List[Dict[str, str]], cache_key: str,
+                                   trace: RequestTrace) -> AsyncIterator[str]:
+        """Yield deltas of one streamed completion and cache the completed answer"""
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                stream = await self._create_completion(messages, stream=True)
+                parts = []
+                try:
+                    async for chunk in stream:
+                        x_groq = getattr(chunk, "x_groq", None)
+                        if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+                            trace.set_usage(x_groq.usage)
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            parts.append(delta)
+                            yield delta
+                finally:
+                    # Runs on completion, errors and cancellation alike
+                    await stream.close()
+            finally:
+                self.in_flight -= 1
+
+        content = "".join(parts)
+        if content:
+            self.response_cache.set(cache_key, content)
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP connections"""
+        await self.groq_client.close()
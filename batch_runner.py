@@ -0,0 +1,221 @@
+"""Run a JSONL file of customer questions through ChatHandler in parallel.
+
+Each input line is a JSON object with the question under "query" (or
+"message", "question", "text", or --field) and an optional "id" and
+"history" list. Results stream to JSONL as they complete, one line per
+input, with the reply, latency, answer path and cache status:
+
+    python batch_runner.py questions.jsonl -o results.jsonl --workers 8 --rate 5
+    python batch_runner.py questions.jsonl --dry-run   # routing and retrieval only, no LLM calls
+
+Memory stays constant: input is read lazily, and at most 2 x --workers
+questions are in flight or, with --ordered, waiting to be written.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import IO, Any, Deque, Dict, Iterator, Optional, Set, Tuple
+
+from chat_handler import ChatHandler
+from intent_classifier import DEFAULT_THRESHOLD, IntentClassifier
+from knowledge_base import KnowledgeBase
+from response_cache import ResponseCache, backend_from_env
+from retrievers import VectorRetriever
+from startup import LazyGroqClient, load_environment
+from vector_index import VECTOR_INDEX_DIR
+
+QUERY_FIELDS = ("query", "message", "question", "text")
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second, with bursts up to `burst`"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_for = (1 - self._tokens) / self.rate
+            time.sleep(wait_for)
+
+
+def read_items(stream: IO[str], field: Optional[str] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (line number, item) pairs; malformed lines become items with an "error" key"""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, {"error": f"invalid JSON: {e}"}
+            continue
+        if not isinstance(record, dict):
+            yield line_number, {"error": "line is not a JSON object"}
+            continue
+        fields = (field,) if field else QUERY_FIELDS
+        query = next((record[name] for name in fields if isinstance(record.get(name), str)), None)
+        if not query or not query.strip():
+            yield line_number, {"id": record.get("id"), "error": f"no question in {'/'.join(fields)}"}
+            continue
+        history = record.get("history") if isinstance(record.get("history"), list) else []
+        if not all(isinstance(turn, dict) and isinstance(turn.get("role"), str)
+                   and isinstance(turn.get("content"), str) for turn in history):
+            yield line_number, {"id": record.get("id", line_number),
+                                "error": "history entries need string role and content"}
+            continue
+        yield line_number, {"id": record.get("id", line_number), "query": query.strip(), "history": history}
+
+
+class BatchRunner:
+    """Answers items on a bounded thread pool and writes each result as soon as it is ready"""
+
+    def __init__(self, chat_handler: ChatHandler, workers: int = 8, rate: Optional[float] = None,
+                 dry_run: bool = False, ordered: bool = False):
+        self.chat_handler = chat_handler
+        self.workers = workers
+        self.limiter = RateLimiter(rate, burst=workers) if rate else None
+        self.dry_run = dry_run
+        self.ordered = ordered
+        self.counts: Dict[str, int] = {}
+
+    def answer(self, line_number: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        if "error" in item:
+            return {"line": line_number, "id": item.get("id"), "path": "invalid", "error": item["error"]}
+        if self.limiter is not None:
+            self.limiter.acquire()
+
+        trace = self.chat_handler.metrics.trace()
+        start = time.perf_counter()
+        if self.dry_run:
+            try:
+                reply, _, _ = self.chat_handler._prepare_request(item["query"], item["history"], trace)
+                if reply is None:
+                    trace.path = "needs_llm"
+            except Exception as e:
+                # One bad item is reported in its own result instead of stopping the batch
+                trace.path, trace.error = "error", type(e).__name__
+                reply = None
+            finally:
+                trace.finish()
+        else:
+            reply = self.chat_handler.generate_response(item["query"], item["history"], trace)
+        latency = time.perf_counter() - start
+        return {
+            "line": line_number,
+            "id": item["id"],
+            "query": item["query"],
+            "path": trace.path,
+            "intent": trace.intent,
+            "cache_hit": trace.cache_hit,
+            "latency_ms": round(latency * 1000, 2),
+            "prompt_tokens": trace.prompt_tokens,
+            "completion_tokens": trace.completion_tokens,
+            "error": trace.error,
+            "reply": reply,
+        }
+
+    def _write(self, output: IO[str], result: Dict[str, Any]) -> None:
+        self.counts[result["path"]] = self.counts.get(result["path"], 0) + 1
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        output.flush()
+
+    def run(self, items: Iterator[Tuple[int, Dict[str, Any]]], output: IO[str]) -> Dict[str, int]:
+        """Process every item, keeping at most 2 x workers submitted or buffered at a time"""
+        max_pending = self.workers * 2
+        pending: Set[Future] = set()
+        # With ordered output, finished results wait here until their predecessors are written;
+        # they count toward max_pending, so a slow head item pauses submission
+        finished: Dict[int, Dict[str, Any]] = {}
+        order: Deque[int] = deque()
+
+        def drain(block_until: int) -> None:
+            nonlocal pending
+            while len(pending) + len(finished) > block_until:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    if not self.ordered:
+                        self._write(output, result)
+                        continue
+                    finished[result["line"]] = result
+                while order and order[0] in finished:
+                    self._write(output, finished.pop(order.popleft()))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for line_number, item in items:
+                if self.ordered:
+                    order.append(line_number)
+                pending.add(pool.submit(self.answer, line_number, item))
+                drain(max_pending - 1)
+            drain(0)
+        return self.counts
+
+
+def main() -> None:
+    load_environment()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("input", help="JSONL file of questions, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL results file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=8, help="questions answered in parallel")
+    parser.add_argument("--rate", type=float, help="maximum questions started per second")
+    parser.add_argument("--field", help="JSON field holding the question")
+    parser.add_argument("--ordered", action="store_true", help="write results in input order")
+    parser.add_argument("--dry-run", action="store_true", help="stop before the LLM; report the path only")
+    parser.add_argument("--groq-base-url", help="e.g. the local fake server in benchmarks/")
+    parser.add_argument("--no-cache", action="store_true", help="answer every question afresh")
+    parser.add_argument("--intent-threshold", type=float,
+                        default=float(os.getenv("INTENT_THRESHOLD", DEFAULT_THRESHOLD)),
+                        help="intent confidence needed to skip the LLM (above 1 disables)")
+    args = parser.parse_args()
+
+    if not args.dry_run and not os.getenv("GROQ_API_KEY"):
+        parser.error("GROQ_API_KEY is not set (use --dry-run to skip LLM calls)")
+
+    knowledge_base = KnowledgeBase()
+    retriever = VectorRetriever(knowledge_base, index_path=VECTOR_INDEX_DIR)
+    response_cache = ResponseCache(
+        max_entries=0 if args.no_cache else 512,
+        backend=None if args.no_cache else backend_from_env(),
+    )
+    client = LazyGroqClient(api_key=os.getenv("GROQ_API_KEY"), base_url=args.groq_base_url)
+    classifier = IntentClassifier.load_or_train(threshold=args.intent_threshold)
+    handler = ChatHandler(client, knowledge_base, retriever, response_cache, intent_classifier=classifier)
+    runner = BatchRunner(handler, args.workers, args.rate, args.dry_run, args.ordered)
+
+    started = time.perf_counter()
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        counts = runner.run(read_items(source, args.field), output)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    summary = ", ".join(f"{path} {count}" for path, count in sorted(counts.items()))
+    print(f"{total} questions in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f}/s): {summary}",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
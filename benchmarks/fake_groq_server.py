@@ -0,0 +1,203 @@
+"""Local stand-in for the Groq (OpenAI-compatible) chat completions API.
+
+Serves POST /openai/v1/chat/completions with configurable latency, token
+rate and error, stall and per-model failure injection, in both JSON and SSE
+streaming modes, so the chat pipeline can be benchmarked and fault-tested
+fully offline:
+
+    python -m benchmarks.fake_groq_server --port 8765 --latency 0.3 --tokens-per-second 150
+
+Point a client at it with Groq(api_key="test", base_url="http://127.0.0.1:8765").
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+FILLER_WORDS = (
+    "Aarogya Vatika offers pure Ayurvedic products for holistic wellness, with free "
+    "shipping above ₹699 and expert doctor guidance for personalised care."
+).split()
+
+
+class FakeServerConfig:
+    """Behaviour knobs, adjustable while the server runs"""
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.0, tokens_per_second: float = 200.0,
+                 completion_tokens: int = 120, error_rate: float = 0.0, error_status: int = 500,
+                 stall_rate: float = 0.0, stall_seconds: float = 30.0, seed: Optional[int] = None,
+                 failing_models: Iterable[str] = ()):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        # Requests for these models always fail, e.g. to exercise model fallback
+        self.failing_models = set(failing_models)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.models: Dict[str, int] = {}
+
+    def draw(self, model: str = "") -> Tuple[float, bool, bool]:
+        """Pick (time to first token, inject error, stall) for one request"""
+        with self.lock:
+            self.requests += 1
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            error = model in self.failing_models or self.random.random() < self.error_rate
+            stall = not error and self.random.random() < self.stall_rate
+            if error:
+                self.errors += 1
+            return delay, error, stall
+
+
+def _estimate_prompt_tokens(messages) -> int:
+    return sum(len(str(message.get("content", "")).split()) * 4 // 3 + 4 for message in messages)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeGroqServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != COMPLETIONS_PATH:
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+
+        config = self.server.config
+        model = request.get("model", "fake-model")
+        with config.lock:
+            config.models[model] = config.models.get(model, 0) + 1
+        delay, error, stall = config.draw(model)
+        time.sleep(delay + (config.stall_seconds if stall else 0.0))
+        if error:
+            self._send_json(config.error_status, {"error": {"message": "injected failure", "type": "server_error"}})
+            return
+
+        max_tokens = int(request.get("max_tokens") or config.completion_tokens)
+        n_tokens = min(config.completion_tokens, max_tokens)
+        words = [FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(n_tokens)]
+        usage = {
+            "prompt_tokens": _estimate_prompt_tokens(request.get("messages", [])),
+            "completion_tokens": n_tokens,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = "chatcmpl-" + uuid.uuid4().hex[:12]
+        created = int(time.time())
+
+        if not request.get("stream"):
+            time.sleep(n_tokens / config.tokens_per_second)
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{
+                    "index": 0, "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": " ".join(words)},
+                }],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send_event(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra: Any) -> None:
+            chunk = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            chunk.update(extra)
+            self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        try:
+            send_event({"role": "assistant", "content": ""})
+            interval = 1.0 / config.tokens_per_second
+            for index, word in enumerate(words):
+                send_event({"content": word if index == 0 else " " + word})
+                time.sleep(interval)
+            send_event({}, "stop", x_groq={"id": completion_id, "usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled mid-stream
+            pass
+
+
+class FakeGroqServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connection bursts into 1s SYN retries
+    request_queue_size = 1024
+
+    def __init__(self, address: Tuple[str, int], config: FakeServerConfig):
+        super().__init__(address, _Handler)
+        self.config = config
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_fake_server(config: Optional[FakeServerConfig] = None, host: str = "127.0.0.1",
+                      port: int = 0) -> FakeGroqServer:
+    """Start the server on a background thread; call shutdown() when done"""
+    server = FakeGroqServer((host, port), config or FakeServerConfig())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds added to latency")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--completion-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="fraction of requests that hang")
+    parser.add_argument("--stall-seconds", type=float, default=30.0)
+    parser.add_argument("--fail-model", action="append", default=[], help="model whose requests always fail")
+    args = parser.parse_args()
+
+    config = FakeServerConfig(args.latency, args.jitter, args.tokens_per_second, args.completion_tokens,
+                              args.error_rate, args.error_status, args.stall_rate, args.stall_seconds,
+                              failing_models=args.fail_model)
+    server = FakeGroqServer((args.host, args.port), config)
+    print(f"Fake Groq server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
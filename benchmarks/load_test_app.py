@@ -0,0 +1,343 @@
+"""Multi-session load test for the Streamlit app.
+
+Starts `streamlit run app.py` against the local fake Groq server, then opens
+many concurrent sessions over Streamlit's own websocket protocol, as browser
+tabs would. Each session loads the page and plays a scripted multi-turn
+conversation (sample question clicks, typed follow-ups, Hinglish and FAQ
+questions), with think time between turns. For each concurrency level the
+server is restarted and the run reports rerun latency (message sent to
+script finished), time to the first rendered element, server CPU and memory
+per session. Results are saved as JSON that --compare checks later runs
+against:
+
+    python -m benchmarks.load_test_app --sessions 25,100,200
+    python -m benchmarks.load_test_app --compare benchmarks/results/<previous>.json
+
+CPU and memory are read from /proc, so they are reported on Linux only.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+import httpx  # noqa: E402
+from streamlit.proto.BackMsg_pb2 import BackMsg  # noqa: E402
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg  # noqa: E402
+from streamlit.proto.WidgetStates_pb2 import WidgetState  # noqa: E402
+
+try:
+    import websockets
+except ImportError:  # shipped with recent Streamlit releases
+    websockets = None
+
+from benchmarks.fake_groq_server import FakeServerConfig, start_fake_server  # noqa: E402
+from benchmarks.run_benchmarks import RESULTS_DIR, _git_sha, compare, summarize  # noqa: E402
+from precomputed import SAMPLE_QUESTIONS  # noqa: E402
+
+# ("click", sample button label) or ("ask", chat input text); session i plays SCRIPTS[i % len(SCRIPTS)]
+SCRIPTS: List[List[Tuple[str, str]]] = [
+    [("click", SAMPLE_QUESTIONS[0][0]), ("ask", "Which of these help with immunity?"),
+     ("ask", "Anything under ₹500?"), ("ask", "How long will delivery take?")],
+    [("ask", "I can't sleep well, what do you recommend?"), ("ask", "Is it safe to take daily?"),
+     ("ask", "How do I book a consultation with a doctor?")],
+    [("click", SAMPLE_QUESTIONS[1][0]), ("ask", "cod available hai?"), ("ask", "refnd kab milega"),
+     ("ask", "Where is my order?")],
+    [("ask", "Garry N Sun products under ₹1000"), ("ask", "Do you have hair oil for dandruff?"),
+     ("ask", "Which payment methods do you accept?")],
+    [("click", SAMPLE_QUESTIONS[2][0]), ("ask", "pet dard ke liye kya hai"),
+     ("ask", "Tell me about Aarogya Vatika"), ("ask", "What is good for joint pain?")],
+]
+
+
+class ProcessMonitor:
+    """Samples a process's resident memory and CPU time from /proc on a background thread"""
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def rss_bytes(self) -> Optional[int]:
+        try:
+            with open(f"/proc/{self.pid}/statm", "r") as handle:
+                return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            return None
+
+    def cpu_seconds(self) -> Optional[float]:
+        try:
+            with open(f"/proc/{self.pid}/stat", "r") as handle:
+                fields = handle.read().rsplit(")", 1)[1].split()
+            # utime and stime, fields 14 and 15 of the full line
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self.rss_bytes() or 0)
+
+    def start(self) -> "ProcessMonitor":
+        self.peak_rss = self.rss_bytes() or 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.peak_rss = max(self.peak_rss, self.rss_bytes() or 0)
+
+
+def start_streamlit(groq_base_url: str, port: int = 0) -> Tuple[subprocess.Popen, str]:
+    """Launch the app against the fake Groq server and wait until it is healthy"""
+    if not port:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.join(BASE_DIR, "app.py"),
+         "--server.headless", "true", "--server.address", "127.0.0.1", "--server.port", str(port),
+         "--browser.gatherUsageStats", "false"],
+        cwd=BASE_DIR, env=dict(os.environ, GROQ_API_KEY="bench", GROQ_BASE_URL=groq_base_url),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://{base_url}/_stcore/health", timeout=1).raise_for_status()
+            return process, base_url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("streamlit did not become healthy")
+
+
+class AppSession:
+    """One browser tab: a websocket session replaying a script of clicks and questions"""
+
+    def __init__(self, address: str, script: List[Tuple[str, str]], suffix: str = "", timeout: float = 60.0):
+        self.address = address
+        self.script = script
+        # Appended to typed questions to keep them past the response cache
+        self.suffix = suffix
+        self.timeout = timeout
+        self.query_string = ""
+        self.page_script_hash = ""
+        # Widget id by (type, label) from the latest run, e.g. ("button", "🔄 Return policy?")
+        self.widgets: Dict[Tuple[str, str], str] = {}
+        self.reruns: List[Dict[str, Any]] = []
+
+    async def run(self, think_time: float, rng: random.Random) -> List[Dict[str, Any]]:
+        try:
+            async with websockets.connect(f"ws://{self.address}/_stcore/stream", subprotocols=["streamlit"],
+                                          max_size=None, open_timeout=self.timeout) as connection:
+                await self._rerun(connection, "load", [])
+                for action, value in self.script:
+                    await asyncio.sleep(think_time * rng.uniform(0.5, 1.5))
+                    await self._rerun(connection, action, [self._widget_state(action, value)])
+        except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+            self.reruns.append({"action": "connection", "latency": None, "first_element": None,
+                                "error": type(e).__name__})
+        return self.reruns
+
+    def _widget_state(self, action: str, value: str) -> WidgetState:
+        if action == "click":
+            state = WidgetState(id=self.widgets.get(("button", value), ""))
+            state.trigger_value = True
+        else:
+            state = WidgetState(id=self.widgets.get(("chat_input", ""), ""))
+            state.chat_input_value.data = value + self.suffix
+        return state
+
+    async def _rerun(self, connection: Any, action: str, widget_states: List[WidgetState]) -> None:
+        message = BackMsg()
+        message.rerun_script.query_string = self.query_string
+        message.rerun_script.page_script_hash = self.page_script_hash
+        message.rerun_script.widget_states.widgets.extend(widget_states)
+        started = time.perf_counter()
+        first_element = None
+        error = None
+        widgets = {}
+        await connection.send(message.SerializeToString())
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await asyncio.wait_for(connection.recv(), self.timeout))
+            kind = forward.WhichOneof("type")
+            if kind == "new_session":
+                self.page_script_hash = forward.new_session.page_script_hash
+            elif kind == "page_info_changed":
+                # The app keeps its conversation id in the URL, as a browser would
+                self.query_string = forward.page_info_changed.query_string
+            elif kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                if first_element is None:
+                    first_element = time.perf_counter() - started
+                element = forward.delta.new_element
+                element_type = element.WhichOneof("type")
+                if element_type in ("button", "chat_input"):
+                    widget = getattr(element, element_type)
+                    widgets[(element_type, getattr(widget, "label", ""))] = widget.id
+                elif element_type == "exception":
+                    error = element.exception.type or "exception"
+                elif element_type == "markdown" and "I apologize" in element.markdown.body:
+                    error = "error_message"
+            elif kind == "script_finished" and forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                break
+        self.widgets = widgets
+        self.reruns.append({"action": action, "latency": time.perf_counter() - started,
+                            "first_element": first_element, "error": error})
+
+
+def run_level(groq_base_url: str, sessions: int, think_time: float, ramp_up: float,
+              unique_queries: bool, timeout: float) -> Dict[str, Any]:
+    """Run `sessions` concurrent sessions against a fresh server process"""
+    process, address = start_streamlit(groq_base_url)
+    try:
+        # One full conversation first, so startup and cached resources are not counted
+        asyncio.run(AppSession(address, SCRIPTS[0], timeout=timeout).run(0.0, random.Random(0)))
+        monitor = ProcessMonitor(process.pid)
+        baseline_rss = monitor.rss_bytes()
+        cpu_start = monitor.cpu_seconds()
+        monitor.start()
+
+        async def main() -> Tuple[List[Dict[str, Any]], float]:
+            run_id = f"{sessions}-{time.time_ns()}"
+
+            async def one(index: int) -> List[Dict[str, Any]]:
+                await asyncio.sleep(ramp_up * index / sessions)
+                session = AppSession(address, SCRIPTS[index % len(SCRIPTS)],
+                                     f" (load {run_id}-{index})" if unique_queries else "", timeout)
+                return await session.run(think_time, random.Random(index))
+
+            started = time.perf_counter()
+            outcomes = await asyncio.gather(*(one(i) for i in range(sessions)))
+            return [rerun for session in outcomes for rerun in session], time.perf_counter() - started
+
+        reruns, wall = asyncio.run(main())
+        monitor.stop()
+        cpu_end = monitor.cpu_seconds()
+    finally:
+        process.terminate()
+        process.wait()
+
+    ok = [r for r in reruns if r["error"] is None]
+    turns = [r for r in ok if r["action"] in ("click", "ask")]
+    result: Dict[str, Any] = {
+        "concurrency": sessions,
+        "reruns": len(reruns),
+        "errors": len(reruns) - len(ok),
+        "error_types": sorted({r["error"] for r in reruns if r["error"] is not None}),
+        "wall_s": wall,
+        "throughput_rps": len(ok) / wall if wall else 0.0,
+        "rerun": summarize([r["latency"] for r in turns]),
+        "page_load": summarize([r["latency"] for r in ok if r["action"] == "load"]),
+        "first_element": summarize([r["first_element"] for r in turns if r["first_element"] is not None]),
+    }
+    if cpu_start is not None and cpu_end is not None:
+        result["cpu_percent"] = (cpu_end - cpu_start) / wall * 100 if wall else 0.0
+        result["cpu_ms_per_rerun"] = (cpu_end - cpu_start) * 1000 / max(len(ok), 1)
+    if baseline_rss:
+        result["rss_baseline_mb"] = baseline_rss / 1e6
+        result["rss_peak_mb"] = monitor.peak_rss / 1e6
+        result["memory_per_session_kb"] = max(monitor.peak_rss - baseline_rss, 0) / 1e3 / sessions
+    return result
+
+
+def print_report(levels: List[Dict[str, Any]]) -> None:
+    print("\nStreamlit sessions (rerun latency after a click or question, ms)")
+    for level in levels:
+        rerun = level["rerun"]
+        if not rerun.get("count"):
+            print(f"  sessions={level['concurrency']:<4} all {level['reruns']} reruns failed {level['error_types']}")
+            continue
+        resources = ""
+        if "cpu_percent" in level:
+            resources += f"  cpu {level['cpu_percent']:5.0f}% ({level['cpu_ms_per_rerun']:.1f} ms/rerun)"
+        if "memory_per_session_kb" in level:
+            resources += f"  rss peak {level['rss_peak_mb']:6.1f} MB ({level['memory_per_session_kb']:.0f} KB/session)"
+        print(f"  sessions={level['concurrency']:<4} {level['throughput_rps']:6.1f} reruns/s  "
+              f"p50 {rerun['p50_ms']:7.1f}  p95 {rerun['p95_ms']:7.1f}  p99 {rerun['p99_ms']:7.1f}  "
+              f"first element p50 {level['first_element'].get('p50_ms', 0):6.1f}  "
+              f"page load p95 {level['page_load'].get('p95_ms', 0):7.1f}{resources}  errors {level['errors']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sessions", default="25,100,200", help="comma-separated concurrent session counts")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean seconds between a session's turns")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds over which sessions connect")
+    parser.add_argument("--unique-queries", action="store_true",
+                        help="make every typed question unique, so none is answered from the response cache")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for one rerun")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake server time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--completion-tokens", type=int, default=60)
+    parser.add_argument("--max-p95-ms", type=float, help="exit non-zero if any level's rerun p95 exceeds this")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/streamlit-<timestamp>.json)")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    args = parser.parse_args()
+    if websockets is None:
+        parser.error("the websockets package is required (pip install websockets)")
+
+    config = FakeServerConfig(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                              completion_tokens=args.completion_tokens, seed=0)
+    server = start_fake_server(config)
+    try:
+        levels = [run_level(server.base_url, int(level), args.think_time, args.ramp_up,
+                            args.unique_queries, args.timeout)
+                  for level in args.sessions.split(",") if level]
+    finally:
+        server.shutdown()
+
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    report = {
+        "timestamp": timestamp,
+        "git_sha": _git_sha(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "fake_server": {key: getattr(config, key) for key in ("latency", "tokens_per_second", "completion_tokens")},
+        "load": {"think_time": args.think_time, "ramp_up": args.ramp_up, "unique_queries": args.unique_queries},
+        "results": {"streamlit": levels},
+    }
+    print_report(levels)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"streamlit-{timestamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+    failed = False
+    if args.max_p95_ms is not None:
+        slow = [level["concurrency"] for level in levels if level["rerun"].get("p95_ms", float("inf")) > args.max_p95_ms]
+        if slow:
+            print(f"Rerun p95 above {args.max_p95_ms:.0f} ms at sessions={slow}")
+            failed = True
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            failed = bool(compare(report, json.load(f))) or failed
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
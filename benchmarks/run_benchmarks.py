@@ -0,0 +1,397 @@
+"""Offline benchmark suite for the chat pipeline.
+
+Times retrieval, FAQ routing and prompt assembly in-process, then drives the
+full ChatHandler (sync and async) and the HTTP API server against a local
+fake Groq server at several concurrency levels. Reports p50/p95/p99 latency, time to first token and
+throughput, and saves JSON results that later runs can be compared against:
+
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/<previous>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from groq import Groq  # noqa: E402
+
+from benchmarks.fake_groq_server import FakeServerConfig, start_fake_server  # noqa: E402
+from chat_handler import ChatHandler  # noqa: E402
+from knowledge_base import KnowledgeBase  # noqa: E402
+from retrievers import KeywordRetriever, VectorRetriever  # noqa: E402
+
+RESULTS_DIR = os.path.join(BASE_DIR, "benchmarks", "results")
+
+QUERIES = [
+    "What products do you offer?",
+    "Tell me about your shipping policy",
+    "How can I contact customer service?",
+    "Do you have herbal teas for better sleep?",
+    "Which oils help with hair fall?",
+    "What is good for digestion and acidity?",
+    "Garry N Sun products",
+    "Do you have anything for joint pain?",
+    "How do I book a consultation with a doctor?",
+    "What are the benefits of Ashwagandha?",
+]
+
+FAQ_QUERIES = [
+    "How long does shipping take?",
+    "Is there free shipping?",
+    "What is your return policy?",
+    "Which payment methods do you accept?",
+    "Can I book a consultation?",
+    "Tell me about your skin care range",
+]
+
+HISTORY = [
+    {"role": "user", "content": "Hi, I am looking for something to improve my sleep."},
+    {"role": "assistant", "content": "We have calming herbal teas and Ashwagandha blends that support restful sleep."},
+    {"role": "user", "content": "Are they safe to take daily?"},
+    {"role": "assistant", "content": "Yes, they are gentle herbal formulations, but please consult our doctors if you take other medication."},
+]
+
+# Relative slowdown of p50/p95 that --compare reports as a regression
+REGRESSION_THRESHOLD = 0.10
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency percentiles in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def percentile(p: float) -> float:
+        index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+        return ordered[index] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def time_calls(fn: Callable[[Any], Any], inputs: List[Any], repeat: int, warmup: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        for item in inputs:
+            fn(item)
+    samples = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            fn(item)
+            samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def run_microbenchmarks(kb: KnowledgeBase, repeat: int) -> Dict[str, Any]:
+    """In-process timings of the stages that run before the upstream call"""
+    keyword = KeywordRetriever(kb)
+    vector = VectorRetriever(kb)
+    handler = ChatHandler(None, kb, retriever=vector)
+    context = handler._format_context(vector.retrieve(QUERIES[0]))
+
+    results = {
+        "keyword_retrieve": time_calls(keyword.retrieve, QUERIES, repeat),
+        "vector_retrieve": time_calls(vector.retrieve, QUERIES, repeat),
+        "faq_route": time_calls(kb.route_faq, FAQ_QUERIES, repeat * 10),
+        "prompt_build": time_calls(
+            lambda q: handler.prompt_builder.build(q, context, HISTORY + [{"role": "user", "content": q}]),
+            QUERIES, repeat,
+        ),
+        "prepare_request": time_calls(
+            lambda q: handler._prepare_request(q, HISTORY, handler.metrics.trace()), QUERIES, repeat,
+        ),
+    }
+    build_start = time.perf_counter()
+    KnowledgeBase(kb.chunks)
+    results["knowledge_base_init_ms"] = (time.perf_counter() - build_start) * 1000
+    return results
+
+
+def _unique_query(index: int, run_id: str) -> str:
+    # A unique suffix keeps every request past the response cache and single-flight
+    return f"{QUERIES[index % len(QUERIES)]} (bench {run_id}-{index})"
+
+
+def run_sync_level(kb: KnowledgeBase, base_url: str, concurrency: int, requests: int) -> Dict[str, Any]:
+    """Stream requests through ChatHandler from a thread pool"""
+    client = Groq(api_key="bench", base_url=base_url, max_retries=0)
+    handler = ChatHandler(client, kb)
+    run_id = f"s{concurrency}-{time.time_ns()}"
+
+    def one(index: int) -> Dict[str, Any]:
+        start = time.perf_counter()
+        first = None
+        chunks = []
+        for delta in handler.generate_response_stream(_unique_query(index, run_id), HISTORY):
+            if first is None:
+                first = time.perf_counter() - start
+            chunks.append(delta)
+        text = "".join(chunks)
+        return {"latency": time.perf_counter() - start, "ttft": first, "error": text.startswith("I apologize")}
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - wall_start
+    client.close()
+    result = _level_result(outcomes, concurrency, wall)
+    result["stages"] = handler.metrics.stage_percentiles()
+    return result
+
+
+def run_async_level(kb: KnowledgeBase, base_url: str, concurrency: int, requests: int) -> Dict[str, Any]:
+    """Stream requests through AsyncChatHandler on one event loop"""
+    from async_chat_handler import AsyncChatHandler, create_async_groq_client
+
+    async def main() -> Dict[str, Any]:
+        client = create_async_groq_client(api_key="bench", base_url=base_url, max_connections=max(concurrency, 1))
+        client = client.with_options(max_retries=0)
+        handler = AsyncChatHandler(client, kb, max_concurrency=concurrency)
+        run_id = f"a{concurrency}-{time.time_ns()}"
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one(index: int) -> Dict[str, Any]:
+            async with gate:
+                start = time.perf_counter()
+                first = None
+                chunks = []
+                async for delta in handler.generate_response_stream_async(_unique_query(index, run_id), HISTORY):
+                    if first is None:
+                        first = time.perf_counter() - start
+                    chunks.append(delta)
+                text = "".join(chunks)
+                return {"latency": time.perf_counter() - start, "ttft": first,
+                        "error": text.startswith("I apologize")}
+
+        wall_start = time.perf_counter()
+        outcomes = await asyncio.gather(*(one(i) for i in range(requests)))
+        wall = time.perf_counter() - wall_start
+        await handler.aclose()
+        result = _level_result(list(outcomes), concurrency, wall)
+        result["stages"] = handler.metrics.stage_percentiles()
+        return result
+
+    return asyncio.run(main())
+
+
+def start_api_server(groq_base_url: str, workers: int, port: int = 0) -> Tuple[subprocess.Popen, str]:
+    """Launch api_server.py against the fake Groq server and wait until it is healthy"""
+    import httpx
+
+    if not port:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BASE_DIR, "api_server.py"), "--port", str(port),
+         "--workers", str(workers), "--groq-base-url", groq_base_url, "--max-concurrency", "256"],
+        cwd=BASE_DIR, env=dict(os.environ, GROQ_API_KEY="bench"),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(base_url + "/health", timeout=1).raise_for_status()
+            return process, base_url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("api_server.py did not become healthy")
+
+
+def run_http_level(api_url: str, concurrency: int, requests: int) -> Dict[str, Any]:
+    """Stream requests through the API server's SSE endpoint over keep-alive connections"""
+    import httpx
+
+    async def main() -> Dict[str, Any]:
+        run_id = f"h{concurrency}-{time.time_ns()}"
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=api_url, limits=limits, timeout=60) as client:
+            gate = asyncio.Semaphore(concurrency)
+
+            async def one(index: int) -> Dict[str, Any]:
+                async with gate:
+                    start = time.perf_counter()
+                    first = None
+                    error = False
+                    payload = {"message": _unique_query(index, run_id), "session_id": f"{run_id}-{index}"}
+                    async with client.stream("POST", "/v1/chat/stream", json=payload) as response:
+                        error = response.status_code != 200
+                        async for line in response.aiter_lines():
+                            if line.startswith("data:") and first is None:
+                                first = time.perf_counter() - start
+                            if line.startswith("data:") and "I apologize" in line:
+                                error = True
+                    return {"latency": time.perf_counter() - start, "ttft": first, "error": error}
+
+            wall_start = time.perf_counter()
+            outcomes = await asyncio.gather(*(one(i) for i in range(requests)))
+            wall = time.perf_counter() - wall_start
+        return _level_result(list(outcomes), concurrency, wall)
+
+    return asyncio.run(main())
+
+
+def _level_result(outcomes: List[Dict[str, Any]], concurrency: int, wall: float) -> Dict[str, Any]:
+    ok = [o for o in outcomes if not o["error"]]
+    return {
+        "concurrency": concurrency,
+        "requests": len(outcomes),
+        "errors": len(outcomes) - len(ok),
+        "wall_s": wall,
+        "throughput_rps": len(ok) / wall if wall else 0.0,
+        "latency": summarize([o["latency"] for o in ok]),
+        "ttft": summarize([o["ttft"] for o in ok if o["ttft"] is not None]),
+    }
+
+
+def _git_sha() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict) and "concurrency" in item:
+                    flat.update(_flatten(item, f"{name}.c{item['concurrency']}."))
+        elif isinstance(value, (int, float)):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Print latency/throughput deltas against a baseline run; returns regressions"""
+    now, before = _flatten(current["results"]), _flatten(baseline["results"])
+    regressions = []
+    print(f"\nComparison with {baseline.get('git_sha')} ({baseline.get('timestamp')})")
+    for name in sorted(now.keys() & before.keys()):
+        if not name.endswith(("p50_ms", "p95_ms", "throughput_rps")) or not before[name]:
+            continue
+        change = (now[name] - before[name]) / before[name]
+        # Higher is better only for throughput
+        worse = -change if name.endswith("throughput_rps") else change
+        flag = "  REGRESSION" if worse > REGRESSION_THRESHOLD else ""
+        print(f"  {name:<48} {before[name]:>10.3f} -> {now[name]:>10.3f} ({change:+.1%}){flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    print("\nMicrobenchmarks (ms)")
+    for name, stats in results["micro"].items():
+        if isinstance(stats, dict):
+            print(f"  {name:<18} p50 {stats['p50_ms']:8.3f}  p95 {stats['p95_ms']:8.3f}  p99 {stats['p99_ms']:8.3f}")
+        else:
+            print(f"  {name:<18} {stats:8.1f}")
+    for mode in ("sync", "async", "http"):
+        if mode not in results:
+            continue
+        print(f"\nEnd-to-end streaming ({mode})")
+        for level in results[mode]:
+            latency, ttft = level["latency"], level["ttft"]
+            if not latency.get("count"):
+                print(f"  c={level['concurrency']:<3} all {level['requests']} requests failed")
+                continue
+            print(f"  c={level['concurrency']:<3} {level['throughput_rps']:7.2f} req/s  "
+                  f"p50 {latency['p50_ms']:7.1f}  p95 {latency['p95_ms']:7.1f}  p99 {latency['p99_ms']:7.1f}  "
+                  f"ttft p50 {ttft.get('p50_ms', 0):7.1f}  errors {level['errors']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="end-to-end requests per level")
+    parser.add_argument("--repeat", type=int, default=20, help="passes over the query set in microbenchmarks")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake server time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--completion-tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--modes", default="sync,async,http", help="end-to-end modes: sync, async, http")
+    parser.add_argument("--api-workers", type=int, default=2, help="api_server.py workers in http mode")
+    parser.add_argument("--micro-only", action="store_true", help="skip the end-to-end runs")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(",") if level]
+    kb = KnowledgeBase()
+    results: Dict[str, Any] = {"micro": run_microbenchmarks(kb, args.repeat)}
+
+    config = FakeServerConfig(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                              completion_tokens=args.completion_tokens, error_rate=args.error_rate, seed=0)
+    if not args.micro_only:
+        server = start_fake_server(config)
+        try:
+            modes = args.modes.split(",")
+            if "sync" in modes:
+                results["sync"] = [run_sync_level(kb, server.base_url, c, args.requests) for c in levels]
+            if "async" in modes:
+                results["async"] = [run_async_level(kb, server.base_url, c, args.requests) for c in levels]
+            if "http" in modes:
+                api, api_url = start_api_server(server.base_url, args.api_workers)
+                try:
+                    results["http"] = [run_http_level(api_url, c, args.requests) for c in levels]
+                finally:
+                    api.terminate()
+                    api.wait()
+        finally:
+            server.shutdown()
+
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    report = {
+        "timestamp": timestamp,
+        "git_sha": _git_sha(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "fake_server": {key: getattr(config, key) for key in (
+            "latency", "tokens_per_second", "completion_tokens", "error_rate")},
+        "results": results,
+    }
+    print_report(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{timestamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Product category by the first term found in its name; earlier entries win
+CATEGORY_TERMS: List[Tuple[str, Tuple[str, ...]]] = [
+    ("Combos", ("combo",)),
+    ("Capsules", ("capsule", "tablet")),
+    ("Soaps", ("soap",)),
+    ("Hair Care", ("hair",)),
+    ("Bath", ("bath",)),
+    ("Skin Care", ("moisturiser", "moisturizer", "facial", "face", "lip", "scrub", "skincare", "serum")),
+    ("Wellness", ("shilajit", "churna", "juice")),
+]
+
+# Query words that name a category ("skin care", "capsules", ...)
+CATEGORY_QUERY_TERMS: Dict[str, Tuple[str, ...]] = {
+    "Combos": ("combo", "combos", "kit", "kits"),
+    "Capsules": ("capsule", "capsules", "tablet", "tablets"),
+    "Soaps": ("soap", "soaps"),
+    "Hair Care": ("hair", "hair care", "haircare"),
+    "Bath": ("bath", "bath salt", "bath salts"),
+    "Skin Care": ("skin care", "skincare", "moisturiser", "moisturizer", "lip care", "face"),
+    "Wellness": ("shilajit",),
+}
+
+# Categories whose names read as plural nouns; the others are described as "<category> products"
+PLURAL_CATEGORIES = ("Combos", "Capsules", "Soaps")
+
+# Trailing words a customer may leave off a vendor's name
+VENDOR_SUFFIXES = ("organics", "naturals", "ayurveda", "herbals")
+
+PRICE_PATTERN = re.compile(r"(?P<from>from\s+)?(?:rs\.?|₹|inr)\s*(?P<amount>\d[\d,]*(?:\.\d+)?)", re.IGNORECASE)
+
+# A bare number followed by a unit ("within 7 days") is not a price
+AMOUNT = (r"(?:₹|rs\.?|inr)?\s*(\d[\d,]*(?:\.\d+)?)(?!\s*(?:days?|hours?|hrs?|weeks?|months?|years?|yrs?|"
+          r"kg|gm?|mg|ml|l|%|capsules?|tablets?|pieces?|pcs)\b)\s*(?:/-|rs\b\.?|rupees?|inr)?")
+PRICE_BETWEEN = re.compile(rf"\bbetween\s+{AMOUNT}\s*(?:and|to|-)\s*{AMOUNT}|{AMOUNT}\s*(?:-|to)\s*{AMOUNT}")
+PRICE_MAX = re.compile(rf"(?:\b(?:under|below|less than|cheaper than|upto|up to|within|at most|max(?:imum)?)|<)\s*{AMOUNT}")
+PRICE_MIN = re.compile(rf"(?:\b(?:over|above|more than|at least|greater than|min(?:imum)?)|>)\s*{AMOUNT}")
+# Without one of these (or a vendor/category) a number in the query is not read as a price
+PRICE_CONTEXT = re.compile(r"₹|\brs\b|rupee|\binr\b|price|cost|budget|cheap|afford|product|buy|item")
+# Wording that asks for a product listing rather than about a product
+LISTING_PATTERN = re.compile(
+    r"\b(?:show|list|browse)\b|\bdo you (?:have|sell|stock|carry)\b|"
+    r"\b(?:what|which|all|any)\s+(?:\w+\s+){0,4}?(?:products|items|range|options)\b"
+)
+
+
+def parse_price(text: Optional[str]) -> Tuple[Optional[float], bool]:
+    """Parse storefront prices like "From Rs. 282.00"; returns (rupees, is starting price)"""
+    match = PRICE_PATTERN.search(text or "")
+    if not match:
+        return None, False
+    return float(match.group("amount").replace(",", "")), bool(match.group("from"))
+
+
+def format_price(price: Optional[float], price_from: bool = False) -> str:
+    if price is None:
+        return "price on request"
+    amount = f"₹{price:,.0f}" if price == int(price) else f"₹{price:,.2f}"
+    return f"from {amount}" if price_from else amount
+
+
+def _amount(value: str) -> float:
+    return float(value.replace(",", ""))
+
+
+def categorize(name: str) -> str:
+    lowered = name.lower()
+    for category, terms in CATEGORY_TERMS:
+        if any(term in lowered for term in terms):
+            return category
+    return "Other"
+
+
+class Product:
+    """One catalog entry; slotted because a catalog holds many of them"""
+
+    __slots__ = ("product_id", "name", "vendor", "price", "price_from", "category",
+                 "collection", "url", "description")
+
+    def __init__(self, product_id: int, name: str, vendor: str, price: Optional[float], price_from: bool,
+                 category: str, collection: str = "", url: str = "", description: str = ""):
+        self.product_id = product_id
+        self.name = name
+        self.vendor = vendor
+        self.price = price
+        self.price_from = price_from
+        self.category = category
+        self.collection = collection
+        self.url = url
+        self.description = description
+
+    @property
+    def display_price(self) -> str:
+        return format_price(self.price, self.price_from)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """The shape of knowledge_data["featured_products"] entries"""
+        return {"name": self.name, "vendor": self.vendor, "price": self.display_price, "url": self.url}
+
+    def __repr__(self) -> str:
+        return f"Product({self.name!r}, {self.vendor!r}, {self.display_price!r})"
+
+
+class CatalogQuery(NamedTuple):
+    vendor: Optional[str] = None
+    category: Optional[str] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    # The question asks for a listing ("show", "do you have", "which products")
+    listing: bool = False
+
+    @property
+    def has_price(self) -> bool:
+        return self.min_price is not None or self.max_price is not None
+
+    @property
+    def wants_listing(self) -> bool:
+        """True when a product list answers the question; otherwise the filters only narrow the context"""
+        return self.has_price or self.listing
+
+    def describe(self) -> str:
+        """Human phrasing, e.g. "Garry N Sun Organics capsules under ₹500\""""
+        if self.category is None:
+            subject = "products"
+        elif self.category in PLURAL_CATEGORIES:
+            subject = self.category.lower()
+        else:
+            subject = f"{self.category.lower()} products"
+        if self.vendor:
+            subject = f"{self.vendor} {subject}"
+        if self.min_price is not None and self.max_price is not None:
+            return f"{subject} between {format_price(self.min_price)} and {format_price(self.max_price)}"
+        if self.max_price is not None:
+            return f"{subject} under {format_price(self.max_price)}"
+        if self.min_price is not None:
+            return f"{subject} over {format_price(self.min_price)}"
+        return subject
+
+
+class ProductCatalog:
+    """Typed product store with vendor, category and price-range indexes
+
+    Priced products are kept in price order with their prices in a float
+    array, so a price range is two binary searches; vendor and category
+    indexes hold product ids in that same order, so filtered results come
+    out sorted by price without re-sorting.
+    """
+
+    def __init__(self, products: Iterable[Product]):
+        self.products: List[Product] = list(products)
+        priced = sorted((p for p in self.products if p.price is not None), key=lambda p: (p.price, p.name))
+        unpriced = [p for p in self.products if p.price is None]
+        self._order: List[int] = [p.product_id for p in priced + unpriced]
+        self._rank: Dict[int, int] = {product_id: rank for rank, product_id in enumerate(self._order)}
+        self._prices = array("d", (p.price for p in priced))
+
+        self._by_vendor: Dict[str, List[int]] = {}
+        self._by_category: Dict[str, List[int]] = {}
+        for product_id in self._order:
+            product = self.products[product_id]
+            self._by_vendor.setdefault(product.vendor.lower(), []).append(product_id)
+            self._by_category.setdefault(product.category, []).append(product_id)
+
+        self._vendor_pattern, self._vendor_aliases = self._compile_vendor_pattern()
+        self._category_aliases = {alias: category for category, aliases in CATEGORY_QUERY_TERMS.items()
+                                  for alias in aliases}
+        self._category_pattern = re.compile(r"\b(" + "|".join(
+            re.escape(alias) for alias in sorted(self._category_aliases, key=len, reverse=True)
+        ) + r")\b")
+
+    @classmethod
+    def from_chunks(cls, chunks: List[Dict[str, Any]]) -> "ProductCatalog":
+        """Build from the product chunks produced by ingestion.parse_markdown"""
+        products, seen = [], set()
+        for chunk in chunks:
+            if chunk.get("kind") != "product":
+                continue
+            metadata = chunk["metadata"]
+            if metadata.get("url") in seen:
+                continue
+            seen.add(metadata.get("url"))
+            price, price_from = parse_price(metadata.get("price"))
+            name = metadata["product"]
+            # The chunk text is "<name> by <vendor>: <price>. <description>"
+            prefix = f"{name} by {metadata.get('vendor') or 'Aarogya Vatika'}: {metadata.get('price') or 'price on request'}."
+            description = chunk["text"][len(prefix):].strip() if chunk["text"].startswith(prefix) else ""
+            products.append(Product(
+                len(products), name, metadata.get("vendor") or "Aarogya Vatika", price, price_from,
+                categorize(name), chunk.get("section", ""), metadata.get("url", ""), description,
+            ))
+        return cls(products)
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> "ProductCatalog":
+        """Build from dicts with name, vendor and price strings"""
+        products = []
+        for record in records:
+            price, price_from = parse_price(record.get("price"))
+            products.append(Product(len(products), record["name"], record.get("vendor") or "Aarogya Vatika",
+                                    price, price_from, categorize(record["name"]), url=record.get("url", "")))
+        return cls(products)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def vendors(self) -> List[str]:
+        return sorted({p.vendor for p in self.products})
+
+    def categories(self) -> List[str]:
+        return sorted(self._by_category)
+
+    def by_vendor(self, vendor: str) -> List[Product]:
+        return [self.products[i] for i in self._by_vendor.get(vendor.lower(), [])]
+
+    def by_category(self, category: str) -> List[Product]:
+        return [self.products[i] for i in self._by_category.get(category, [])]
+
+    def price_range(self, min_price: Optional[float] = None, max_price: Optional[float] = None) -> List[Product]:
+        """Priced products with min_price <= price <= max_price, cheapest first"""
+        low = bisect_left(self._prices, min_price) if min_price is not None else 0
+        high = bisect_right(self._prices, max_price) if max_price is not None else len(self._prices)
+        return [self.products[self._order[rank]] for rank in range(low, high)]
+
+    def query(self, vendor: Optional[str] = None, category: Optional[str] = None,
+              min_price: Optional[float] = None, max_price: Optional[float] = None,
+              limit: Optional[int] = None) -> List[Product]:
+        """Products matching every given filter, cheapest first"""
+        candidates: Optional[set] = None
+        for ids in (
+            self._by_vendor.get(vendor.lower(), []) if vendor else None,
+            self._by_category.get(category, []) if category else None,
+        ):
+            if ids is not None:
+                candidates = set(ids) if candidates is None else candidates & set(ids)
+
+        if min_price is not None or max_price is not None:
+            in_range = (p.product_id for p in self.price_range(min_price, max_price))
+            ranked = [i for i in in_range if candidates is None or i in candidates]
+        elif candidates is not None:
+            ranked = sorted(candidates, key=self._rank.__getitem__)
+        else:
+            ranked = list(self._order)
+        return [self.products[i] for i in ranked[:limit]]
+
+    def _compile_vendor_pattern(self) -> Tuple[Optional["re.Pattern"], Dict[str, str]]:
+        aliases: Dict[str, str] = {}
+        for vendor in self.vendors():
+            lowered = vendor.lower()
+            aliases[lowered] = vendor
+            words = lowered.split()
+            if len(words) > 1 and words[-1] in VENDOR_SUFFIXES:
+                aliases.setdefault(" ".join(words[:-1]), vendor)
+        if not aliases:
+            return None, aliases
+        alternation = "|".join(re.escape(alias) for alias in sorted(aliases, key=len, reverse=True))
+        return re.compile(rf"\b({alternation})\b"), aliases
+
+    def parse_query(self, text: str) -> Optional[CatalogQuery]:
+        """Extract vendor, category and price filters from a question, if any
+
+        >>> catalog = ProductCatalog.from_records([
+        ...     {"name": "Pure Himalayan Shilajit", "vendor": "Garry N Sun Organics", "price": "Rs. 999.00"},
+        ...     {"name": "Neem Capsule", "vendor": "Garry N Sun Organics", "price": "Rs. 282.00"},
+        ... ])
+        >>> catalog.parse_query("Is Garry N Sun shilajit safe during pregnancy?").wants_listing
+        False
+        >>> catalog.parse_query("Show me Garry N Sun capsules").wants_listing
+        True
+        >>> catalog.parse_query("shilajit under ₹1000").describe()
+        'wellness products under ₹1,000'
+        """
+        lowered = text.lower()
+        vendor = category = min_price = max_price = None
+
+        if self._vendor_pattern is not None:
+            match = self._vendor_pattern.search(lowered)
+            if match:
+                vendor = self._vendor_aliases[match.group(1)]
+        match = self._category_pattern.search(lowered)
+        if match:
+            category = self._category_aliases[match.group(1)]
+
+        between = below = above = None
+        if vendor or category or PRICE_CONTEXT.search(lowered):
+            between = PRICE_BETWEEN.search(lowered)
+            if not between:
+                below, above = PRICE_MAX.search(lowered), PRICE_MIN.search(lowered)
+        if between:
+            low, high = [_amount(value) for value in between.groups() if value]
+            min_price, max_price = min(low, high), max(low, high)
+        else:
+            max_price = _amount(below.group(1)) if below else None
+            min_price = _amount(above.group(1)) if above else None
+
+        query = CatalogQuery(vendor, category, min_price, max_price, bool(LISTING_PATTERN.search(lowered)))
+        return query if any(value is not None for value in query[:4]) else None
+
+    def answer(self, query: CatalogQuery, limit: int = 8) -> str:
+        """Answer a filtered product question straight from the indexes"""
+        matches = self.query(query.vendor, query.category, query.min_price, query.max_price)
+        if not matches:
+            text = f"I couldn't find any {query.describe()} in our current catalog."
+            # Point to the nearest option without the price filter
+            fallback = self.query(query.vendor, query.category) if query.has_price else []
+            if fallback and fallback[0].price is not None:
+                cheapest = fallback[0]
+                text += f" The most affordable option is **{cheapest.name}** at {cheapest.display_price}."
+            return text + " You can browse everything at [aarogyavatika.com](https://www.aarogyavatika.com/collections/all)."
+
+        lines = [f"Here are our {query.describe()}:"]
+        for product in matches[:limit]:
+            name = f"[{product.name}]({product.url})" if product.url else product.name
+            vendor = "" if query.vendor else f" by {product.vendor}"
+            lines.append(f"- **{name}**{vendor}: {product.display_price}")
+        if len(matches) > limit:
+            lines.append(f"…and {len(matches) - limit} more on our website.")
+        lines.append("Prices are from our online store and may change with offers.")
+        return "\n".join(lines)
@@ -1,13 +1,79 @@
-from groq import Groq
+from context_fragments import DOCUMENTS_HEADING
+from intent_classifier import ROUTE_RETRIEVAL, ROUTE_TEMPLATE, IntentClassifier
 from knowledge_base import KnowledgeBase
-from typing import List, Dict, Any
+from metrics import MetricsRecorder, RequestTrace
+from precomputed import PrecomputedAnswers
+from prompt_builder import CONTEXT_HEADING, PromptBuilder
+from response_cache import ResponseCache, make_cache_key
+from retrievers import VectorRetriever
+from singleflight import SingleFlight
+from upstream import UpstreamClient, UpstreamUnavailable
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
 import json
+import time
+
+if TYPE_CHECKING:  # the SDK is imported lazily, on the first LLM-bound message
+    from groq import Groq
+
+# Ends a streamed reply that failed after part of it was shown; such replies are never stored as answers
+INTERRUPTED_NOTICE = "\n\n_(Response interrupted. Please ask again.)_"
+
+def _is_opening(user_query: str, chat_history: List[Dict[str, str]]) -> bool:
+    """True when the query starts the conversation; app.py may already have appended it"""
+    return not chat_history or (len(chat_history) == 1 and chat_history[0]["content"] == user_query)
 
 class ChatHandler:
-    def __init__(self, groq_client: Groq, knowledge_base: KnowledgeBase):
+    MODEL = "llama-3.3-70b-versatile"
+    # Smaller, faster model used while the primary is failing or its circuit is open
+    FALLBACK_MODEL = "llama-3.1-8b-instant"
+    MAX_TOKENS = 1024
+    TEMPERATURE = 0.3
+    # Prompt tokens per request: system prompt, then context, then newest history
+    PROMPT_TOKEN_BUDGET = 2500
+    
+    def __init__(self, groq_client: "Groq", knowledge_base: KnowledgeBase, retriever=None,
+                 response_cache: ResponseCache = None, single_flight: SingleFlight = None,
+                 metrics: MetricsRecorder = None, upstream: UpstreamClient = None,
+                 intent_classifier: Optional[IntentClassifier] = None):
         self.groq_client = groq_client
-        self.knowledge_base = knowledge_base
+        # Any object with retrieve(query) -> context dict; KeywordRetriever uses BM25 instead
+        retriever = retriever if retriever is not None else VectorRetriever(knowledge_base)
+        # Swapped as one tuple so a request never pairs one version's index with another's data
+        self._knowledge = (knowledge_base, retriever)
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        # Identical requests in flight at the same time share one upstream call
+        self.single_flight = single_flight if single_flight is not None else SingleFlight()
+        # Per-stage timings, token usage and cache hits of every request
+        self.metrics = metrics if metrics is not None else MetricsRecorder()
+        # Deadlines, retries, hedging, circuit breaking and model fallback for every LLM call
+        self.upstream = upstream if upstream is not None else self._create_upstream()
+        # Confident intents are answered from a template or the retrieved context, without the LLM
+        self.intent_classifier = intent_classifier
+        # Opening answers generated ahead of time; only used while their version is current
+        self.precomputed: Optional[PrecomputedAnswers] = None
         self.system_prompt = self._create_system_prompt()
+        self.prompt_builder = PromptBuilder(self.system_prompt, self.PROMPT_TOKEN_BUDGET)
+    
+    @property
+    def knowledge_base(self) -> KnowledgeBase:
+        return self._knowledge[0]
+    
+    @property
+    def retriever(self):
+        return self._knowledge[1]
+    
+    def use_knowledge(self, knowledge_base: KnowledgeBase, retriever) -> None:
+        """Serve a new knowledge version; requests already running finish on the old one
+        
+        Cache keys include the knowledge version, so answers cached for the
+        old version are never served again and age out of the cache.
+        """
+        self._knowledge = (knowledge_base, retriever)
+    
+    def use_precomputed(self, answers: PrecomputedAnswers) -> None:
+        """Serve these opening answers; ignored unless generated for the current knowledge version"""
+        if answers.version == self.knowledge_base.version:
+            self.precomputed = answers
     
     def _create_system_prompt(self) -> str:
         """Create a comprehensive system prompt for the chatbot"""
@@ -44,100 +110,234 @@ Contact Information:
 Remember to be helpful, informative, and guide customers toward finding the right Ayurvedic solutions for their wellness needs.
 """
     
-    def generate_response(self, user_query: str, chat_history: List[Dict[str, str]]) -> str:
-        """Generate a response using Groq API with knowledge base context"""
-        try:
-            # Search knowledge base for relevant information
-            relevant_info = self.knowledge_base.search_knowledge(user_query)
-            
-            # Check for FAQ response first
-            faq_response = self.knowledge_base.get_faq_response(user_query)
-            if faq_response:
-                return faq_response
-            
-            # Create context from relevant information
-            context = self._format_context(relevant_info)
-            
-            # Prepare messages for Groq API
-            messages = [
-                {"role": "system", "content": self.system_prompt + "\n\nRelevant Information:\n" + context}
-            ]
-            
-            # Add recent chat history (last 6 messages for context)
-            recent_history = chat_history[-6:] if len(chat_history) > 6 else chat_history
-            for msg in recent_history:
-                if msg["role"] in ["user", "assistant"]:
-                    messages.append({"role": msg["role"], "content": msg["content"]})
-            
-            # Add current user query
-            messages.append({"role": "user", "content": user_query})
-            
-            # Generate response using Groq
-            response = self.groq_client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=messages,
-                max_tokens=1024,
-                temperature=0.3,
-                stream=False
-            )
-            
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            return f"I apologize, but I'm having trouble processing your request right now. Please contact our customer service team at +91-9910474566 or aumyanaturals@gmail.com for immediate assistance. Error: {str(e)}"
-    
-    def _format_context(self, relevant_info: Dict[str, Any]) -> str:
-        """Format relevant information into context for the AI"""
-        if not relevant_info:
-            return "No specific information found in knowledge base."
+    def _prepare_request(self, user_query: str, chat_history: List[Dict[str, str]],
+                         trace: RequestTrace) -> Tuple[Optional[str], List[Dict[str, str]], str]:
+        """Build the Groq messages; returns (ready answer, messages, cache key)
+        
+        The ready answer is set when an FAQ or a cached response already answers the query.
+        
+        >>> handler = ChatHandler(None, KnowledgeBase())
+        >>> trace = handler.metrics.trace()
+        >>> handler._prepare_request("Is Garry N Sun shilajit safe during pregnancy?", [], trace)[0], trace.path
+        (None, 'llm')
+        >>> trace = handler.metrics.trace()
+        >>> handler._prepare_request("Show me Garry N Sun capsules", [], trace)[0] is not None, trace.path
+        (True, 'catalog')
+        """
+        # One knowledge version for the whole request, even if a reload lands meanwhile
+        knowledge_base, retriever = self._knowledge
         
-        context_parts = []
+        # Typos, inflections and Hinglish mapped onto the knowledge vocabulary for matching;
+        # the prompt and the cache key keep the customer's own words
+        with trace.span("normalize"):
+            search_query = knowledge_base.normalize_query(user_query)
         
-        if 'company_info' in relevant_info:
-            info = relevant_info['company_info']
-            context_parts.append(f"Company: {info['name']} - {info['tagline']}")
-            context_parts.append(f"Legacy: {info['legacy']}")
-            context_parts.append(f"Products: {info['products_count']}")
-            context_parts.append(f"Community: {info['community']}")
-            if 'contact' in info:
-                contact = info['contact']
-                context_parts.append(f"Contact: {contact['phone']}, {contact['email']}")
-                context_parts.append(f"Address: {contact['address']}")
+        # Check for FAQ response first, before any retrieval work
+        with trace.span("faq"):
+            faq_response = knowledge_base.get_faq_response(search_query)
+        if faq_response:
+            trace.path = "faq"
+            return faq_response, [], ""
         
-        if 'featured_products' in relevant_info:
-            context_parts.append("Featured Products:")
-            for product in relevant_info['featured_products'][:5]:  # Limit to first 5 products
-                context_parts.append(f"- {product['name']} by {product['vendor']}: {product['price']}")
+        # Frequent opening questions were answered when this knowledge version was built
+        precomputed = self.precomputed
+        if (precomputed is not None and precomputed.version == knowledge_base.version
+                and _is_opening(user_query, chat_history)):
+            answer = precomputed.get(user_query)
+            if answer is not None:
+                trace.path = "precomputed"
+                return answer, [], ""
         
-        if 'wellness_categories' in relevant_info:
-            context_parts.append("Wellness Categories:")
-            for category, description in relevant_info['wellness_categories'].items():
-                context_parts.append(f"- {category.replace('_', ' ').title()}: {description}")
+        # Price filters and listing requests are answered from the catalog indexes directly;
+        # a question that only names a brand or category goes on with those products as context
+        with trace.span("catalog"):
+            catalog_query = knowledge_base.parse_catalog_query(search_query)
+            if catalog_query is not None and catalog_query.wants_listing:
+                trace.path = "catalog"
+                return knowledge_base.catalog.answer(catalog_query), [], ""
         
-        if 'shipping_delivery' in relevant_info:
-            shipping = relevant_info['shipping_delivery']
-            context_parts.append("Shipping & Delivery:")
-            context_parts.append(f"- Processing: {shipping['processing_time']}")
-            context_parts.append(f"- Delivery: {shipping['delivery_time']}")
-            context_parts.append(f"- Coverage: {shipping['coverage']}")
-            context_parts.append(f"- Free shipping: {shipping['free_shipping']}")
-            context_parts.append(f"- Charges: {shipping['shipping_charges']}")
+        prediction = None
+        if self.intent_classifier is not None:
+            with trace.span("intent"):
+                # The classifier learnt from raw phrasings, so the more confident reading wins
+                queries = [user_query] if search_query == user_query.lower() else [user_query, search_query]
+                prediction = max(self.intent_classifier.classify_batch(queries), key=lambda p: p.confidence)
+            trace.intent = prediction.intent
+            if prediction.route == ROUTE_TEMPLATE:
+                answer = knowledge_base.faq_router.answer_for(prediction.intent)
+                if answer:
+                    trace.path = "intent"
+                    return answer, [], ""
         
-        if 'payment_methods' in relevant_info:
-            context_parts.append("Payment Methods: " + ", ".join(relevant_info['payment_methods']))
+        # Search knowledge base for relevant information
+        with trace.span("retrieve"):
+            relevant_info = retriever.retrieve(search_query)
+            if catalog_query is not None:
+                # Only the products of the brand and category asked about, cheapest first
+                products = knowledge_base.catalog.query(catalog_query.vendor, catalog_query.category)
+                if products:
+                    relevant_info = {**relevant_info, 'featured_products': [p.as_dict() for p in products]}
         
-        if 'return_policy' in relevant_info:
-            policy = relevant_info['return_policy']
-            context_parts.append(f"Return Policy: {policy['general']}")
-            context_parts.append("Exceptions: " + ", ".join(policy['exceptions']))
-            context_parts.append(f"Refund Processing: {policy['refund_processing']}")
+        # Create context from relevant information
+        with trace.span("format_context"):
+            context = self._format_context(relevant_info, knowledge_base)
         
-        if 'health_category' in relevant_info:
-            for category, description in relevant_info['health_category'].items():
-                context_parts.append(f"Health Category - {category.replace('_', ' ').title()}: {description}")
+        if prediction is not None and prediction.route == ROUTE_RETRIEVAL:
+            # Structured sections read well verbatim; raw document chunks need the LLM
+            answer = self._context_answer(context.split(DOCUMENTS_HEADING, 1)[0].strip())
+            if answer is not None:
+                trace.path = "retrieval"
+                return answer, [], ""
         
-        if 'wellness_category' in relevant_info:
-            for category, description in relevant_info['wellness_category'].items():
-                context_parts.append(f"Wellness Category - {category.replace('_', ' ').title()}: {description}")
+        # Fit system prompt, context and the newest history into the token budget
+        with trace.span("prompt_build"):
+            prompt = self.prompt_builder.build(user_query, context, chat_history)
         
-        return "\n".join(context_parts)
+        # Identical query, context and history means the answer would be the same
+        with trace.span("cache_lookup"):
+            # Everything sent upstream between the system prompt and the query: summary, turns, context
+            cache_key = make_cache_key(user_query, prompt.reference, prompt.messages[1:-2],
+                                       knowledge_base.version)
+            cached = self.response_cache.get(cache_key, count=trace.recorded)
+        if cached is not None:
+            trace.path = "cache"
+            trace.cache_hit = True
+        return cached, prompt.messages, cache_key
+    
+    def _create_upstream(self) -> UpstreamClient:
+        return UpstreamClient(self.groq_client, self.MODEL, self.FALLBACK_MODEL, metrics=self.metrics)
+    
+    def _create_completion(self, messages: List[Dict[str, str]], stream: bool):
+        """Call the Groq chat completions API"""
+        return self.upstream.create(
+            messages,
+            stream=stream,
+            max_tokens=self.MAX_TOKENS,
+            temperature=self.TEMPERATURE
+        )
+    
+    def generate_response(self, user_query: str, chat_history: List[Dict[str, str]],
+                          trace: Optional[RequestTrace] = None) -> str:
+        """Generate a response using Groq API with knowledge base context
+        
+        Pass a trace from self.metrics.trace() to inspect the answer path and timings afterwards.
+        """
+        trace = trace if trace is not None else self.metrics.trace()
+        try:
+            ready_answer, messages, cache_key = self._prepare_request(user_query, chat_history, trace)
+            if ready_answer is not None:
+                return ready_answer
+            
+            # Generate response using Groq, shared with identical concurrent requests
+            with trace.span("llm"):
+                return self.single_flight.do(cache_key, lambda: self._complete(messages, cache_key, trace))
+            
+        except UpstreamUnavailable:
+            trace.path = "fallback"
+            return self._fallback_answer(messages)
+        except Exception as e:
+            trace.path, trace.error = "error", type(e).__name__
+            return self._error_message()
+        finally:
+            trace.finish()
+    
+    def _complete(self, messages: List[Dict[str, str]], cache_key: str, trace: RequestTrace) -> str:
+        """Run one blocking completion and cache its answer"""
+        response = self._create_completion(messages, stream=False)
+        trace.set_usage(response.usage)
+        content = response.choices[0].message.content
+        if content:
+            self.response_cache.set(cache_key, content)
+        return content
+    
+    def generate_response_stream(self, user_query: str, chat_history: List[Dict[str, str]]) -> Iterator[str]:
+        """Yield the response as text deltas as soon as Groq produces them"""
+        trace = self.metrics.trace()
+        messages: List[Dict[str, str]] = []
+        yielded = False
+        try:
+            ready_answer, messages, cache_key = self._prepare_request(user_query, chat_history, trace)
+            if ready_answer is not None:
+                yield ready_answer
+                return
+            
+            # Concurrent identical requests all receive the deltas of one upstream stream
+            started = time.perf_counter()
+            deltas = self.single_flight.stream(cache_key, lambda: self._stream_deltas(messages, cache_key, trace))
+            for index, delta in enumerate(deltas):
+                if index == 0:
+                    trace.add("llm_first_token", time.perf_counter() - started)
+                yielded = True
+                yield delta
+            trace.add("llm", time.perf_counter() - started)
+            
+        except Exception as e:
+            yield self._stream_failure(e, messages, yielded, trace)
+        finally:
+            # Also runs when the reader stops early and the generator is closed
+            trace.finish()
+    
+    def _stream_deltas(self, messages: List[Dict[str, str]], cache_key: str, trace: RequestTrace) -> Iterator[str]:
+        """Yield deltas of one streamed completion and cache the completed answer"""
+        parts = []
+        for chunk in self._create_completion(messages, stream=True):
+            # Groq reports token usage on the final chunk
+            x_groq = getattr(chunk, "x_groq", None)
+            if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+                trace.set_usage(x_groq.usage)
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+        
+        # Only a completed stream is cached, never a partial answer
+        content = "".join(parts)
+        if content:
+            self.response_cache.set(cache_key, content)
+    
+    def _stream_failure(self, error: Exception, messages: List[Dict[str, str]], yielded: bool,
+                        trace: RequestTrace) -> str:
+        """Last text of a failed stream: the fallback or apology, unless part of the reply was shown"""
+        if yielded:
+            # An apology appended to half an answer would read as its ending
+            trace.path, trace.error = "error", type(error).__name__
+            return INTERRUPTED_NOTICE
+        if isinstance(error, UpstreamUnavailable):
+            trace.path = "fallback"
+            return self._fallback_answer(messages)
+        trace.path, trace.error = "error", type(error).__name__
+        return self._error_message()
+    
+    def _error_message(self) -> str:
+        # The error type is recorded on the request trace; its text never reaches customers
+        return "I apologize, but I'm having trouble processing your request right now. Please contact our customer service team at +91-9910474566 or aumyanaturals@gmail.com for immediate assistance."
+    
+    def _context_answer(self, context: str,
+                        lead: str = "Here is what I found in our store information:") -> Optional[str]:
+        """Render formatted context as a Markdown answer; None when there is nothing to show"""
+        lines = []
+        for line in context.split("\n")[:12]:
+            if line.endswith(":"):
+                lines.append(f"**{line[:-1]}**")
+            elif line.strip():
+                lines.append(line if line.startswith("- ") else f"- {line}")
+        if not lines or context.startswith("No specific information"):
+            return None
+        return (lead + "\n\n" + "\n".join(lines)
+                + "\n\nFor anything else, please contact our customer service team at +91-9910474566 "
+                "or aumyanaturals@gmail.com.")
+    
+    def _fallback_answer(self, messages: List[Dict[str, str]]) -> str:
+        """Answer from the retrieved context alone while no model is available"""
+        # The context message comes just before the query
+        reference = messages[-2]["content"] if len(messages) > 2 else ""
+        context = reference[len(CONTEXT_HEADING):] if reference.startswith(CONTEXT_HEADING) else ""
+        answer = self._context_answer(
+            context, "Our assistant is busy right now, so here is what I found in our store information:"
+        )
+        return answer if answer is not None else self._error_message()
+    
+    def _format_context(self, relevant_info: Dict[str, Any],
+                        knowledge_base: Optional[KnowledgeBase] = None) -> str:
+        """Format relevant information into context for the AI"""
+        return (knowledge_base or self.knowledge_base).format_context(relevant_info)
@@ -0,0 +1,155 @@
+"""Knowledge sections rendered once into prompt context fragments.
+
+Every section of a KnowledgeBase is formatted when the knowledge version is
+built, so assembling the context for a request is a lookup per retrieved
+section and one join. Sections always appear in the same canonical order,
+so the same retrieved set gives the same bytes whatever its ranking, and so
+does the cache key and the prompt sent upstream.
+"""
+from typing import Any, Callable, Dict, List, Tuple
+
+# Introduces raw document chunks in the formatted context
+DOCUMENTS_HEADING = "From the knowledge base:"
+NO_CONTEXT = "No specific information found in knowledge base."
+
+
+def _title(category: str) -> str:
+    return category.replace("_", " ").title()
+
+
+def _company_info(info: Dict[str, Any]) -> List[str]:
+    lines = [
+        f"Company: {info['name']} - {info['tagline']}",
+        f"Legacy: {info['legacy']}",
+        f"Products: {info['products_count']}",
+        f"Community: {info['community']}",
+    ]
+    if 'contact' in info:
+        contact = info['contact']
+        lines.append(f"Contact: {contact['phone']}, {contact['email']}")
+        lines.append(f"Address: {contact['address']}")
+    return lines
+
+
+def _featured_products(products: List[Dict[str, Any]]) -> List[str]:
+    # Limit to first 5 products
+    return ["Featured Products:"] + [
+        f"- {product['name']} by {product['vendor']}: {product['price']}" for product in products[:5]
+    ]
+
+
+def _wellness_categories(categories: Dict[str, str]) -> List[str]:
+    return ["Wellness Categories:"] + [
+        f"- {_title(category)}: {description}" for category, description in categories.items()
+    ]
+
+
+def _shipping_delivery(shipping: Dict[str, str]) -> List[str]:
+    return [
+        "Shipping & Delivery:",
+        f"- Processing: {shipping['processing_time']}",
+        f"- Delivery: {shipping['delivery_time']}",
+        f"- Coverage: {shipping['coverage']}",
+        f"- Free shipping: {shipping['free_shipping']}",
+        f"- Charges: {shipping['shipping_charges']}",
+    ]
+
+
+def _payment_methods(methods: List[str]) -> List[str]:
+    return ["Payment Methods: " + ", ".join(methods)]
+
+
+def _return_policy(policy: Dict[str, Any]) -> List[str]:
+    return [
+        f"Return Policy: {policy['general']}",
+        "Exceptions: " + ", ".join(policy['exceptions']),
+        f"Refund Processing: {policy['refund_processing']}",
+    ]
+
+
+# Whole-section renderers, in the order sections appear in the context
+SECTION_RENDERERS: Dict[str, Callable[[Any], List[str]]] = {
+    "company_info": _company_info,
+    "featured_products": _featured_products,
+    "wellness_categories": _wellness_categories,
+    "shipping_delivery": _shipping_delivery,
+    "payment_methods": _payment_methods,
+    "return_policy": _return_policy,
+}
+
+# One line per category, after the whole sections
+CATEGORY_PREFIXES = {
+    "health_category": "Health Category",
+    "wellness_category": "Wellness Category",
+}
+
+
+def _category_line(result_key: str, category: str, description: str) -> str:
+    return f"{CATEGORY_PREFIXES[result_key]} - {_title(category)}: {description}"
+
+
+def _document_line(chunk: Dict[str, Any]) -> str:
+    url = chunk['metadata'].get('url')
+    return f"- {chunk['text']}" + (f" ({url})" if url else "")
+
+
+class ContextFragments:
+    """Pre-rendered context for every section of one knowledge version
+
+    Payloads that did not come from these sections (the catalog's filtered
+    product lists, say) are rendered on the fly, the same way.
+    """
+
+    def __init__(self, sections: Dict[str, Tuple[str, Any]]):
+        # Whole sections, keyed by result key; valid only for the payload object they were rendered from
+        self._sections: Dict[str, Tuple[Any, str]] = {}
+        # (result key, category) -> (canonical position, line)
+        self._categories: Dict[Tuple[str, str], Tuple[int, str]] = {}
+        # Chunk id -> line
+        self._documents: Dict[str, str] = {}
+        for result_key, payload in sections.values():
+            if result_key in SECTION_RENDERERS:
+                self._sections[result_key] = (payload, "\n".join(SECTION_RENDERERS[result_key](payload)))
+            elif result_key in CATEGORY_PREFIXES:
+                for category, description in payload.items():
+                    line = _category_line(result_key, category, description)
+                    self._categories[(result_key, category)] = (len(self._categories), line)
+            elif result_key == "documents":
+                self._documents[payload["id"]] = _document_line(payload)
+
+    def __len__(self) -> int:
+        return len(self._sections) + len(self._categories) + len(self._documents)
+
+    def render(self, relevant_info: Dict[str, Any]) -> str:
+        """Join the fragments of the retrieved sections in canonical order"""
+        if not relevant_info:
+            return NO_CONTEXT
+
+        parts = []
+        for result_key, renderer in SECTION_RENDERERS.items():
+            payload = relevant_info.get(result_key)
+            if payload is None:
+                continue
+            cached = self._sections.get(result_key)
+            parts.append(cached[1] if cached is not None and cached[0] is payload
+                         else "\n".join(renderer(payload)))
+
+        for result_key in CATEGORY_PREFIXES:
+            categories = relevant_info.get(result_key)
+            if not categories:
+                continue
+            lines = []
+            for category, description in categories.items():
+                cached = self._categories.get((result_key, category))
+                lines.append(cached if cached is not None
+                             else (len(self._categories), _category_line(result_key, category, description)))
+            parts.extend(line for _, line in sorted(lines, key=lambda entry: entry[0]))
+
+        if 'documents' in relevant_info:
+            # Chunks keep their ranking: the prompt builder trims context from the end
+            parts.append(DOCUMENTS_HEADING)
+            for chunk in relevant_info['documents']:
+                line = self._documents.get(chunk['id'])
+                parts.append(line if line is not None else _document_line(chunk))
+
+        return "\n".join(parts)
@@ -0,0 +1,115 @@
+import re
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from search_index import tokenize
+
+# Each intent fires when every group in "require" has at least one term in the
+# query. Terms are whole words (plural/verb suffixes allowed); earlier intents
+# win ties. Answers are templates filled from the knowledge data at load time.
+# Intents with an empty "require" never match here; only the intent classifier
+# (intent_classifier.py) routes queries to them.
+FAQ_INTENTS: List[Dict[str, Any]] = [
+    {
+        "intent": "shipping_time",
+        "require": [["shipping", "delivery", "dispatch"], ["time", "long", "days"]],
+        "answer": "Orders are processed within 1-2 days, and delivery takes 3-10 days depending on your location. We ship across India with tracking via SMS/email.",
+    },
+    {
+        "intent": "free_shipping",
+        "require": [["free"], ["shipping", "delivery"]],
+        "answer": "We offer free shipping on orders above ₹699. For orders below ₹699, there's a flat shipping charge of ₹79, and ₹50 for COD.",
+    },
+    {
+        "intent": "returns",
+        "require": [["return", "refund"]],
+        "answer": "Due to the perishable nature of Ayurvedic products, we generally don't accept returns except for damaged products (report within 48 hours) or incorrect items shipped. Refunds are processed within 7-10 business days.",
+    },
+    {
+        "intent": "payment",
+        "require": [["payment", "pay"]],
+        "answer": "We accept {payment_list}. All transactions are secured with SSL encryption.",
+    },
+    {
+        "intent": "consultation",
+        "require": [["consultation", "consult"]],
+        "answer": "We offer personalized health consultations with expert Ayurvedic doctors. You can book a consultation through our website.",
+    },
+    {
+        "intent": "cod_charges",
+        "require": [["cod", "cash on delivery"]],
+        "answer": "Cash on Delivery is available across India with a {cod_charge} COD charge. Shipping is free on orders above ₹699; below that there's a flat ₹79 shipping charge.",
+    },
+    {
+        "intent": "order_tracking",
+        "require": [],
+        "answer": "Orders are processed within 1-2 days and tracking details are sent to you via SMS/email once your order ships. For an update on a specific order, please contact us at {phone} or {email} with your order number.",
+    },
+    {
+        "intent": "contact",
+        "require": [],
+        "answer": "You can reach our customer service team at {phone} or {email}. Our address is {company}, {address}.",
+    },
+]
+
+WORD_SUFFIXES = r"(?:s|es|ed|ing)?"
+
+
+class FAQMatch(NamedTuple):
+    intent: str
+    answer: str
+    confidence: float
+
+
+class FAQRouter:
+    """Data-driven FAQ matcher compiled into one combined regex
+
+    Every intent term becomes a named group of a single alternation, so a
+    query is routed with one left-to-right scan whatever the number of FAQs.
+    """
+
+    def __init__(self, intents: List[Dict[str, Any]], template_values: Optional[Dict[str, Any]] = None):
+        self.intents = intents
+        self.answers = [intent["answer"].format_map(template_values or {}) for intent in intents]
+
+        # term -> [(intent index, group index)], shared when intents reuse a word
+        self._memberships: List[List[tuple]] = []
+        term_ids: Dict[str, int] = {}
+        for intent_index, intent in enumerate(intents):
+            for group_index, group in enumerate(intent["require"]):
+                for term in group:
+                    if term not in term_ids:
+                        term_ids[term] = len(self._memberships)
+                        self._memberships.append([])
+                    self._memberships[term_ids[term]].append((intent_index, group_index))
+
+        # Longest terms first so a phrase wins over a word it starts with
+        ordered = sorted(term_ids.items(), key=lambda item: -len(item[0]))
+        self._pattern = re.compile(
+            r"\b(?:" + "|".join(
+                f"(?P<t{term_id}>{re.escape(term)}{WORD_SUFFIXES})" for term, term_id in ordered
+            ) + r")\b"
+        )
+
+    def answer_for(self, intent: str) -> Optional[str]:
+        """The filled-in answer of an intent by name"""
+        for index, candidate in enumerate(self.intents):
+            if candidate["intent"] == intent:
+                return self.answers[index]
+        return None
+
+    def route(self, query: str) -> Optional[FAQMatch]:
+        """Return the first intent whose required term groups all appear in query"""
+        matched_groups: Dict[int, set] = {}
+        matched_words = 0
+        for match in self._pattern.finditer(query.lower()):
+            matched_words += 1
+            for intent_index, group_index in self._memberships[int(match.lastgroup[1:])]:
+                matched_groups.setdefault(intent_index, set()).add(group_index)
+
+        for intent_index, groups in sorted(matched_groups.items()):
+            if len(groups) == len(self.intents[intent_index]["require"]):
+                # Share of the query's content words explained by FAQ terms
+                content_words = max(len(tokenize(query)), 1)
+                confidence = min(1.0, matched_words / content_words)
+                return FAQMatch(self.intents[intent_index]["intent"], self.answers[intent_index], confidence)
+        return None
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import re
+import warnings
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BASE_DIR = Path(__file__).resolve().parent
+SOURCE_DIR = BASE_DIR / "attached_assets"
+CACHE_PATH = BASE_DIR / ".cache" / "knowledge_corpus.json"
+
+# Bump when the parsers change so stale snapshots are re-parsed
+PARSER_VERSION = 1
+
+PDF_CHUNK_WORDS = 120
+
+LINK_PATTERN = re.compile(r"\[([^\]]+)\]\((https?://[^\s)]+)")
+HEADING_PATTERN = re.compile(r"^#{1,6}\s+(.*)$")
+PRICE_PATTERN = re.compile(r"^(?:From )?Rs\. [\d,]+\.\d{2}$")
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\s*●\s*")
+
+# Storefront chrome that carries no knowledge
+BOILERPLATE = frozenset([
+    "Add to cart", "Unit price/ per", "Pre-Order", "Sale", "Close", "Subscribe",
+    "Search", "Reload", "Browse Products", "Language", "en", "MenuClose",
+])
+IGNORED_SECTIONS = ("Back In Stock Notification", "is blocked")
+
+
+def _file_sha256(path: Path) -> str:
+    """Hash a source file's bytes"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def discover_sources(source_dir: Path = SOURCE_DIR) -> List[Path]:
+    """List the markdown and PDF knowledge sources in a directory"""
+    return sorted(source_dir.glob("content-*.md")) + sorted(source_dir.glob("*.pdf"))
+
+
+def parse_markdown(path: Path) -> List[Dict[str, Any]]:
+    """Parse scraped storefront markdown into product, collection and prose chunks"""
+    products: Dict[str, Dict[str, Any]] = {}
+    links: Dict[str, Dict[str, Any]] = {}
+    prose: Dict[str, List[str]] = {}
+    section = ""
+    vendor = None
+    product = None
+
+    for raw_line in path.read_text(encoding="utf-8").splitlines():
+        line = raw_line.strip()
+        if not line or line in BOILERPLATE or line.startswith(("~~", "![", "[![")):
+            continue
+
+        heading = HEADING_PATTERN.match(line)
+        if heading:
+            title = heading.group(1).strip()
+            link = LINK_PATTERN.match(title)
+            if link and ("/collections/" in link.group(2) or "/blogs/" in link.group(2)):
+                name, url = link.groups()
+                kind = "collection" if "/collections/" in url else "article"
+                links.setdefault(url, {"name": name, "url": url, "kind": kind})
+            section = link.group(1) if link else title
+            product = None
+            continue
+
+        link = LINK_PATTERN.match(line)
+        if line.startswith("Vendor: ") or (link and "/collections/vendors" in link.group(2)):
+            vendor = LINK_PATTERN.search(line).group(1)
+            continue
+
+        if link and "/products/" in link.group(2) and line.endswith(")"):
+            name, url = link.groups()
+            product = products.setdefault(url, {
+                "name": name, "url": url, "vendor": vendor, "price": None,
+                "description": "", "section": section,
+            })
+            product["vendor"] = product["vendor"] or vendor
+            continue
+
+        if PRICE_PATTERN.match(line):
+            if product is not None and not product["price"]:
+                product["price"] = line
+            continue
+
+        # Plain prose: a product blurb if we are inside a product, else section text
+        if link or len(line) < 40:
+            continue
+        if product is not None:
+            if not product["description"]:
+                product["description"] = line
+        elif section and not any(ignored in section for ignored in IGNORED_SECTIONS):
+            prose.setdefault(section, []).append(re.sub(r"\*\*", "", line))
+
+    chunks = []
+    for item in products.values():
+        text = f"{item['name']} by {item['vendor'] or 'Aarogya Vatika'}: {item['price'] or 'price on request'}."
+        if item["description"]:
+            text += " " + item["description"]
+        chunks.append({
+            "id": f"{path.name}:product:{item['url'].rsplit('/', 1)[-1]}",
+            "source": path.name,
+            "kind": "product",
+            "section": item["section"],
+            "text": text,
+            "metadata": {
+                "product": item["name"], "price": item["price"],
+                "vendor": item["vendor"], "url": item["url"],
+            },
+        })
+
+    for item in links.values():
+        if item["kind"] == "collection":
+            text = f"Shop the {item['name']} collection."
+        else:
+            text = f"Blog article: {item['name']}"
+        chunks.append({
+            "id": f"{path.name}:{item['kind']}:{item['url'].rsplit('/', 1)[-1]}",
+            "source": path.name,
+            "kind": item["kind"],
+            "section": item["name"],
+            "text": text,
+            "metadata": {"url": item["url"]},
+        })
+
+    for title, paragraphs in prose.items():
+        chunks.append({
+            "id": f"{path.name}:section:{re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-')}",
+            "source": path.name,
+            "kind": "section",
+            "section": title,
+            "text": " ".join(paragraphs),
+            "metadata": {},
+        })
+
+    return chunks
+
+
+def parse_pdf(path: Path, chunk_words: int = PDF_CHUNK_WORDS) -> List[Dict[str, Any]]:
+    """Extract PDF text and pack its sentences into roughly chunk_words-sized chunks"""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        warnings.warn(f"pypdf is not installed; skipping {path.name}")
+        return []
+
+    reader = PdfReader(str(path))
+    text = " ".join(page.extract_text() or "" for page in reader.pages)
+    text = re.sub(r"[\ue000-\uf8ff\U000f0000-\U000fffff]", "", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    text = re.sub(r" ([,.:;)])", r"\1", text)
+
+    chunks = []
+    current: List[str] = []
+    word_count = 0
+
+    def flush():
+        body = " ".join(current)
+        chunks.append({
+            "id": f"{path.name}:chunk:{len(chunks)}",
+            "source": path.name,
+            "kind": "document",
+            "section": " ".join(body.split()[:8]),
+            "text": body,
+            "metadata": {},
+        })
+
+    for sentence in SENTENCE_SPLIT.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        current.append(sentence)
+        word_count += len(sentence.split())
+        if word_count >= chunk_words:
+            flush()
+            current, word_count = [], 0
+    if current:
+        flush()
+
+    return chunks
+
+
+def parse_source(path: Path) -> List[Dict[str, Any]]:
+    """Dispatch a source file to its parser"""
+    if path.suffix.lower() == ".pdf":
+        return parse_pdf(path)
+    return parse_markdown(path)
+
+
+def _read_snapshot(cache_path: Path) -> Dict[str, Any]:
+    """Read a snapshot, treating missing, corrupt or outdated files as empty"""
+    try:
+        with open(cache_path, "r", encoding="utf-8") as handle:
+            snapshot = json.load(handle)
+    except (OSError, ValueError):
+        return {}
+    if snapshot.get("parser_version") != PARSER_VERSION:
+        return {}
+    return snapshot.get("sources", {})
+
+
+def _write_snapshot(cache_path: Path, sources: Dict[str, Any]) -> None:
+    """Atomically replace the snapshot file"""
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump({"parser_version": PARSER_VERSION, "sources": sources},
+                  handle, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, cache_path)
+
+
+def load_corpus(source_dir: Path = SOURCE_DIR, cache_path: Optional[Path] = CACHE_PATH,
+                rebuild: bool = False) -> List[Dict[str, Any]]:
+    """Load knowledge chunks, re-parsing only the sources whose hash changed"""
+    cached = {} if (rebuild or cache_path is None) else _read_snapshot(cache_path)
+    sources = {}
+    changed = rebuild
+
+    for path in discover_sources(Path(source_dir)):
+        digest = _file_sha256(path)
+        entry = cached.get(path.name)
+        if entry is None or entry.get("sha256") != digest:
+            entry = {"sha256": digest, "chunks": parse_source(path)}
+            changed = True
+        sources[path.name] = entry
+
+    if set(sources) != set(cached):
+        changed = True
+    if changed and cache_path is not None:
+        try:
+            _write_snapshot(cache_path, sources)
+        except OSError:
+            # A read-only deployment still works, it just re-parses on each start
+            pass
+
+    return [chunk for entry in sources.values() for chunk in entry["chunks"]]
+
+
+if __name__ == "__main__":
+    corpus = load_corpus(rebuild=True)
+    print(f"Wrote {len(corpus)} chunks to {CACHE_PATH}")
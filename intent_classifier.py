@@ -0,0 +1,244 @@
+"""Hashed n-gram logistic regression that answers common intents without the LLM.
+
+Trained from a labelled JSONL of past queries ({"query": ..., "intent": ...}
+per line; attached_assets/intent_examples.jsonl by default). A query
+predicted with at least `threshold` confidence is answered by its intent's
+route: a template answer, an answer rendered from the retrieved context
+alone, or the LLM. Every other query goes to the LLM as before.
+
+    python intent_classifier.py train               # INTENT_EXAMPLES=past_queries.jsonl to use your own
+    python intent_classifier.py evaluate queries.jsonl    # routes and deflection rate
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ingestion import SOURCE_DIR
+from vector_index import HashingTfidfVectorizer
+
+INTENT_EXAMPLES_PATH = SOURCE_DIR / "intent_examples.jsonl"
+INTENT_MODEL_PATH = Path(__file__).resolve().parent / ".cache" / "intent_classifier.npz"
+N_FEATURES = 1 << 13
+# About 95% of queries routed away from the LLM get the right answer in cross-validation
+DEFAULT_THRESHOLD = 0.7
+
+ROUTE_TEMPLATE = "template"
+ROUTE_RETRIEVAL = "retrieval"
+ROUTE_LLM = "llm"
+
+# Template intents are answered by the FAQ answer of the same name; unlisted intents go to the LLM
+INTENT_ROUTES: Dict[str, str] = {
+    "order_tracking": ROUTE_TEMPLATE,
+    "cod_charges": ROUTE_TEMPLATE,
+    "consultation": ROUTE_TEMPLATE,
+    "contact": ROUTE_TEMPLATE,
+    "shipping_time": ROUTE_TEMPLATE,
+    "free_shipping": ROUTE_TEMPLATE,
+    "returns": ROUTE_TEMPLATE,
+    "payment": ROUTE_TEMPLATE,
+    "company_info": ROUTE_RETRIEVAL,
+    "shipping_policy": ROUTE_RETRIEVAL,
+}
+
+
+class IntentPrediction(NamedTuple):
+    intent: str
+    confidence: float
+    route: str
+
+
+def load_examples(path: Optional[Path] = None) -> List[Tuple[str, str]]:
+    """(query, intent) pairs from a JSONL file (INTENT_EXAMPLES, else the bundled examples)"""
+    path = path or Path(os.getenv("INTENT_EXAMPLES", str(INTENT_EXAMPLES_PATH)))
+    examples = []
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                record = json.loads(line)
+                examples.append((record["query"], record["intent"]))
+    return examples
+
+
+def _fingerprint(examples: Sequence[Tuple[str, str]], n_features: int) -> str:
+    digest = hashlib.sha256(str(n_features).encode("utf-8"))
+    for query, intent in examples:
+        digest.update(f"{query}\0{intent}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class IntentClassifier:
+    """Softmax regression over hashed word and character n-gram TF-IDF features
+
+    Classifying a batch is one vectorisation, one matrix product and one
+    softmax, so a few thousand queries take milliseconds on a CPU.
+    """
+
+    def __init__(self, classes: List[str], weights: np.ndarray, bias: np.ndarray,
+                 vectorizer: HashingTfidfVectorizer, threshold: float = DEFAULT_THRESHOLD,
+                 fingerprint: str = ""):
+        self.classes = classes
+        self.weights = weights
+        self.bias = bias
+        self.vectorizer = vectorizer
+        self.threshold = threshold
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def train(cls, examples: Sequence[Tuple[str, str]], n_features: int = N_FEATURES,
+              epochs: int = 150, learning_rate: float = 0.5, l2: float = 1e-4) -> "IntentClassifier":
+        """Fit by full-batch gradient descent with Adam steps and L2 regularisation"""
+        classes = sorted({intent for _, intent in examples})
+        labels = np.array([classes.index(intent) for _, intent in examples])
+        vectorizer = HashingTfidfVectorizer(n_features)
+        features = vectorizer.fit_transform([query for query, _ in examples])
+        targets = np.eye(len(classes), dtype=np.float32)[labels]
+        # Rare intents weigh as much as common ones
+        sample_weights = (len(labels) / (len(classes) * np.bincount(labels)))[labels].astype(np.float32)
+
+        weights = np.zeros((n_features, len(classes)), dtype=np.float32)
+        bias = np.zeros(len(classes), dtype=np.float32)
+        moments = [np.zeros_like(weights), np.zeros_like(weights), np.zeros_like(bias), np.zeros_like(bias)]
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+        for step in range(1, epochs + 1):
+            errors = (_softmax(features @ weights + bias) - targets) * sample_weights[:, None] / len(labels)
+            grad_w = features.T @ errors + l2 * weights
+            grad_b = errors.sum(axis=0)
+            for param, grad, m, v in ((weights, grad_w, moments[0], moments[1]),
+                                      (bias, grad_b, moments[2], moments[3])):
+                m *= beta1
+                m += (1 - beta1) * grad
+                v *= beta2
+                v += (1 - beta2) * grad * grad
+                param -= learning_rate * (m / (1 - beta1 ** step)) / (np.sqrt(v / (1 - beta2 ** step)) + eps)
+        return cls(classes, weights, bias, vectorizer, fingerprint=_fingerprint(examples, n_features))
+
+    def predict_proba(self, queries: Sequence[str]) -> np.ndarray:
+        """Class probabilities, one row per query"""
+        if not queries:
+            return np.zeros((0, len(self.classes)), dtype=np.float32)
+        return _softmax(self.vectorizer.transform(queries) @ self.weights + self.bias)
+
+    def classify_batch(self, queries: Sequence[str]) -> List[IntentPrediction]:
+        probabilities = self.predict_proba(queries)
+        best = probabilities.argmax(axis=1)
+        predictions = []
+        for row, index in enumerate(best):
+            intent, confidence = self.classes[index], float(probabilities[row, index])
+            route = INTENT_ROUTES.get(intent, ROUTE_LLM) if confidence >= self.threshold else ROUTE_LLM
+            predictions.append(IntentPrediction(intent, confidence, route))
+        return predictions
+
+    def classify(self, query: str) -> IntentPrediction:
+        """Intent of one query; near misses of a template intent are labelled "other" in the examples
+
+        >>> classifier = IntentClassifier.train(load_examples(INTENT_EXAMPLES_PATH))
+        >>> classifier.classify("Where is my order?").route
+        'template'
+        >>> [classifier.classify(query).route for query in (
+        ...     "Can I cancel my order?", "How do I change my address for an order?", "Can I modify my order?")]
+        ['llm', 'llm', 'llm']
+        """
+        return self.classify_batch([query])[0]
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, weights=self.weights, bias=self.bias, idf=self.vectorizer.idf,
+                 classes=np.array(self.classes), fingerprint=np.array(self.fingerprint))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path, threshold: float = DEFAULT_THRESHOLD) -> "IntentClassifier":
+        with np.load(path) as data:
+            vectorizer = HashingTfidfVectorizer(data["weights"].shape[0])
+            vectorizer.idf = data["idf"]
+            return cls([str(c) for c in data["classes"]], data["weights"], data["bias"], vectorizer,
+                       threshold, str(data["fingerprint"]))
+
+    @classmethod
+    def load_or_train(cls, examples_path: Optional[Path] = None, model_path: Optional[Path] = INTENT_MODEL_PATH,
+                      threshold: float = DEFAULT_THRESHOLD) -> "IntentClassifier":
+        """Reuse the saved model when it was trained on these examples, else train and save one"""
+        examples = load_examples(examples_path)
+        if model_path is not None:
+            try:
+                classifier = cls.load(model_path, threshold)
+                if classifier.fingerprint == _fingerprint(examples, classifier.weights.shape[0]):
+                    return classifier
+            except (OSError, ValueError, KeyError):
+                pass
+        classifier = cls.train(examples)
+        classifier.threshold = threshold
+        if model_path is not None:
+            try:
+                classifier.save(model_path)
+            except OSError:
+                pass
+        return classifier
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    np.exp(logits, out=logits)
+    logits /= logits.sum(axis=1, keepdims=True)
+    return logits
+
+
+def _read_records(path: str) -> Iterable[Dict[str, str]]:
+    source = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with source:
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("train", help="train on the labelled examples and save the model")
+    evaluate = commands.add_parser("evaluate", help="route a JSONL file of queries and report deflection")
+    evaluate.add_argument("queries", help='JSONL with a "query" field per line (and optionally "intent"), or -')
+    evaluate.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        started = time.perf_counter()
+        examples = load_examples()
+        classifier = IntentClassifier.train(examples)
+        classifier.save(INTENT_MODEL_PATH)
+        print(f"{len(examples)} examples, {len(classifier.classes)} intents, "
+              f"trained in {time.perf_counter() - started:.2f}s -> {INTENT_MODEL_PATH}")
+        return
+
+    classifier = IntentClassifier.load_or_train(threshold=args.threshold)
+    records = list(_read_records(args.queries))
+    queries = [record["query"] for record in records]
+    started = time.perf_counter()
+    predictions = classifier.classify_batch(queries)
+    elapsed = time.perf_counter() - started
+    routes = Counter(prediction.route for prediction in predictions)
+    for query, prediction in zip(queries, predictions):
+        print(json.dumps({"query": query, **prediction._asdict()}, ensure_ascii=False))
+    deflected = [(record, prediction) for record, prediction in zip(records, predictions)
+                 if prediction.route != ROUTE_LLM]
+    summary = (f"{len(queries)} queries in {elapsed * 1000:.1f}ms: "
+               + ", ".join(f"{route} {count}" for route, count in sorted(routes.items()))
+               + f"; {len(deflected) / max(len(queries), 1):.0%} answered without the LLM")
+    labelled = [(record, prediction) for record, prediction in deflected if "intent" in record]
+    if labelled:
+        correct = sum(record["intent"] == prediction.intent for record, prediction in labelled)
+        summary += f", {correct / len(labelled):.0%} of those labelled correct"
+    print(summary, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
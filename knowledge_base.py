@@ -1,191 +1,193 @@
-import os
+import hashlib
 import json
-from typing import Dict, List, Any
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+from catalog import CatalogQuery, ProductCatalog
+from context_fragments import ContextFragments
+from faq_router import FAQ_INTENTS, FAQMatch, FAQRouter
+from ingestion import SOURCE_DIR, load_corpus
+from intent_classifier import load_examples
+from query_normalizer import QueryNormalizer
+from search_index import InvertedIndex
+
+# Company facts, policies and featured products; edit to change what the assistant knows
+KNOWLEDGE_DATA_PATH = SOURCE_DIR / "knowledge_data.json"
+
+# Extra terms indexed with each section so common customer wording finds it
+SECTION_KEYWORDS = {
+    "company_info": "company about aarogya vatika",
+    "featured_products": "product buy shop price cost",
+    "wellness_categories": "product shop wellness",
+    "shipping_delivery": "shipping delivery order dispatch",
+    "payment_methods": "payment pay method",
+    "return_policy": "return refund exchange",
+    "contact": "contact phone email address",
+}
+
+def _flatten_text(value: Any) -> str:
+    """Flatten nested knowledge values into plain text for indexing"""
+    if isinstance(value, dict):
+        return " ".join(f"{key.replace('_', ' ')} {_flatten_text(item)}" for key, item in value.items())
+    if isinstance(value, list):
+        return " ".join(_flatten_text(item) for item in value)
+    return str(value)
+
+def load_knowledge_data(path: Path = KNOWLEDGE_DATA_PATH) -> Dict[str, Any]:
+    """Read the structured knowledge (company, shipping, returns, products) from JSON"""
+    with open(path, "r", encoding="utf-8") as handle:
+        return json.load(handle)
 
 class KnowledgeBase:
-    def __init__(self):
-        self.knowledge_data = self._load_knowledge_base()
+    """Immutable once built; a content change means building a new KnowledgeBase
     
-    def _load_knowledge_base(self) -> Dict[str, Any]:
-        """Load and structure the knowledge base from the provided documents"""
-        return {
-            "company_info": {
-                "name": "Aarogya Vatika",
-                "tagline": "Ayurvedic Wellness Redefined",
-                "legacy": "45+ years of traditional healing wisdom",
-                "products_count": "50+ Pure Ayurvedic Products",
-                "community": "7,200+ Members, 15,000+ Readers",
-                "website": "www.aarogyavatika.com",
-                "contact": {
-                    "company": "Aumya Naturals LLP",
-                    "address": "D-9, Sector-3, Noida, U.P. – 201301",
-                    "phone": "+91-9910474566",
-                    "email": "aumyanaturals@gmail.com"
-                }
-            },
-            "philosophy": {
-                "core_values": [
-                    "Personalized healing",
-                    "Sustainable and pure products",
-                    "Evidence-backed practices",
-                    "Holistic care that addresses mind, body, and spirit"
-                ],
-                "approach": "Blends ancient Ayurvedic traditions with modern wellness support"
-            },
-            "key_offerings": [
-                "50+ Pure Ayurvedic Products – Carefully sourced, natural, and curated",
-                "Expert Doctor Guidance – Personalized health consultations available",
-                "Educational Content – Science-backed articles on key wellness topics",
-                "Community Support – 7,200+ members, 15,000+ readers"
-            ],
-            "wellness_categories": {
-                "womens_health": "Hormonal balance, menstrual care",
-                "gut_health": "Digestion and microbiome-friendly support",
-                "immunity_boosters": "Herbs like Ashwagandha, Tulsi, etc.",
-                "diabetes_management": "Herbal support (e.g., bitter melon, cinnamon)"
-            },
-            "featured_products": [
-                {
-                    "name": "Neem Capsule",
-                    "vendor": "Garry N Sun Organics",
-                    "price": "From Rs. 282.00"
-                },
-                {
-                    "name": "Ashoka Capsule",
-                    "vendor": "Garry N Sun Organics",
-                    "price": "From Rs. 290.00"
-                },
-                {
-                    "name": "Moringa Capsule",
-                    "vendor": "Garry N Sun Organics",
-                    "price": "From Rs. 289.00"
-                },
-                {
-                    "name": "Ultra Lite Chamomile Moisturiser",
-                    "vendor": "Vatsa Padam",
-                    "price": "Rs. 850.00"
-                },
-                {
-                    "name": "Pure Himalayan Shilajit",
-                    "vendor": "Garry N Sun Organics",
-                    "price": "Rs. 1,999.00"
-                }
-            ],
-            "shipping_delivery": {
-                "processing_time": "1–2 days order processing",
-                "delivery_time": "3–10 days delivery depending on location",
-                "coverage": "Ships across India",
-                "tracking": "Tracking via SMS/email",
-                "free_shipping": "Free shipping over ₹699",
-                "shipping_charges": "Flat ₹79 below ₹699, ₹50 COD charge",
-                "multi_vendor": "Allows multi-vendor shipments"
-            },
-            "payment_methods": [
-                "Credit/Debit Cards",
-                "UPI Payments",
-                "Net Banking",
-                "Digital Wallets"
-            ],
-            "return_policy": {
-                "general": "Due to the perishable nature of Ayurvedic products, we generally do not accept returns except for:",
-                "exceptions": [
-                    "Products damaged during shipping (must report within 48 hours of delivery)",
-                    "Incorrect items shipped"
-                ],
-                "refund_processing": "Refunds will be processed to the original payment method within 7-10 business days"
-            },
-            "privacy_security": [
-                "Data collected: Name, contact info, order details, usage stats",
-                "No data sold or shared without consent",
-                "SSL encryption for all transactions",
-                "Rights to access, correct, or delete user data available"
-            ],
-            "featured_articles": [
-                "Irregular Menstrual Cycles & Ayurveda",
-                "Ayurvedic Fertility Guide",
-                "Beyond Normal Period Pain",
-                "Urinary Discomfort: Ayurvedic Perspective",
-                "Pelvic Inflammatory Disease & Ayurveda"
-            ],
-            "testimonials": [
-                "Transformed my space with Ayurvedic herbs—delivered pristine! – Emily R., Designer",
-                "Peace Lily brought calm to my creative process. – Sarah T., Writer"
-            ],
-            "health_categories": {
-                "heart_harmony": "Heart health support",
-                "kidney_care": "Kidney health and detox",
-                "skin_care": "Natural skincare solutions",
-                "bone_joint": "Bone and joint support",
-                "breathe_easy": "Respiratory health",
-                "liver_care": "Liver detox and care",
-                "digestive_care": "Gut health and digestion",
-                "mood_stress": "Mental wellness and stress management"
-            }
-        }
+    `version` fingerprints the data file and every indexed section, so two builds from the same
+    sources share a version and any edit produces a new one.
+    """
     
-    def search_knowledge(self, query: str) -> Dict[str, Any]:
-        """Search the knowledge base for relevant information"""
-        query_lower = query.lower()
-        relevant_info = {}
-        
-        # Search for company information
-        if any(word in query_lower for word in ['company', 'about', 'aarogya', 'vatika']):
-            relevant_info['company_info'] = self.knowledge_data['company_info']
-        
-        # Search for product information
-        if any(word in query_lower for word in ['product', 'buy', 'shop', 'price', 'cost']):
-            relevant_info['featured_products'] = self.knowledge_data['featured_products']
-            relevant_info['wellness_categories'] = self.knowledge_data['wellness_categories']
-        
-        # Search for shipping information
-        if any(word in query_lower for word in ['shipping', 'delivery', 'order', 'dispatch']):
-            relevant_info['shipping_delivery'] = self.knowledge_data['shipping_delivery']
-        
-        # Search for payment information
-        if any(word in query_lower for word in ['payment', 'pay', 'method']):
-            relevant_info['payment_methods'] = self.knowledge_data['payment_methods']
+    def __init__(self, corpus: Optional[List[Dict[str, Any]]] = None,
+                 knowledge_data: Optional[Dict[str, Any]] = None):
+        self.knowledge_data = knowledge_data if knowledge_data is not None else load_knowledge_data()
+        # Chunks ingested from attached_assets, served from the on-disk snapshot
+        self.chunks = corpus if corpus is not None else load_corpus()
+        self.sections = self._build_sections()
+        self.documents = self._build_documents()
+        self.version = self._fingerprint()
+        self.index = self._build_index()
+        # Every section pre-rendered as prompt context for this version
+        self.context_fragments = ContextFragments(self.sections)
+        self.faq_router = FAQRouter(FAQ_INTENTS, self._faq_template_values())
+        self.catalog = self._build_catalog()
+        self.normalizer = self._build_normalizer()
+    
+    def _build_sections(self) -> Dict[str, Tuple[str, Any]]:
+        """Split the knowledge data into indexable sections keyed by document id"""
+        data = self.knowledge_data
+        sections = {
+            "company_info": ("company_info", data["company_info"]),
+            "featured_products": ("featured_products", data["featured_products"]),
+            "wellness_categories": ("wellness_categories", data["wellness_categories"]),
+            "shipping_delivery": ("shipping_delivery", data["shipping_delivery"]),
+            "payment_methods": ("payment_methods", data["payment_methods"]),
+            "return_policy": ("return_policy", data["return_policy"]),
+            "contact": ("contact", data["company_info"]["contact"]),
+        }
         
-        # Search for return/refund information
-        if any(word in query_lower for word in ['return', 'refund', 'exchange']):
-            relevant_info['return_policy'] = self.knowledge_data['return_policy']
+        # Each category is its own section so a query only pulls in the one it names
+        for category, description in data["health_categories"].items():
+            sections[f"health_categories.{category}"] = ("health_category", {category: description})
+        for category, description in data["wellness_categories"].items():
+            sections[f"wellness_categories.{category}"] = ("wellness_category", {category: description})
         
-        # Search for contact information
-        if any(word in query_lower for word in ['contact', 'phone', 'email', 'address']):
-            relevant_info['contact'] = self.knowledge_data['company_info']['contact']
+        for chunk in self.chunks:
+            sections[f"chunk:{chunk['id']}"] = ("documents", chunk)
         
-        # Search for health categories
-        for category, description in self.knowledge_data['health_categories'].items():
-            if any(word in query_lower for word in category.split('_')):
-                relevant_info['health_category'] = {category: description}
+        return sections
+    
+    def _build_documents(self) -> List[Tuple[str, str, str]]:
+        """Render each section as (doc id, text, keywords) for the retrieval indexes"""
+        documents = []
+        for doc_id, (result_key, payload) in self.sections.items():
+            if result_key == "documents":
+                keywords = " ".join(filter(None, [payload["section"], payload["metadata"].get("vendor")]))
+                if payload["kind"] == "product":
+                    keywords += " price"
+                documents.append((doc_id, payload["text"], keywords))
+                continue
+            keywords = SECTION_KEYWORDS.get(doc_id, "")
+            if result_key in ("health_category", "wellness_category"):
+                keywords = " ".join(payload).replace("_", " ")
+            documents.append((doc_id, _flatten_text(payload), keywords))
+        return documents
+    
+    def _fingerprint(self) -> str:
+        # The whole data file counts, including fields only FAQ templates read
+        digest = hashlib.sha256(json.dumps(self.knowledge_data, sort_keys=True).encode("utf-8"))
+        for doc_id, text, keywords in self.documents:
+            digest.update(f"{doc_id}\0{text}\0{keywords}\0".encode("utf-8"))
+        return digest.hexdigest()[:12]
+    
+    def _build_index(self) -> InvertedIndex:
+        """Build the BM25 index over all knowledge sections"""
+        index = InvertedIndex()
+        for doc_id, text, keywords in self.documents:
+            index.add_document(doc_id, text, keywords)
+        return index.build()
+    
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """Return the top_k (section id, score) pairs for a query"""
+        return self.index.search(query, top_k)
+    
+    def search_knowledge(self, query: str, top_k: int = 5) -> Dict[str, Any]:
+        """Search the knowledge base for relevant information"""
+        return self.collect_sections(doc_id for doc_id, _ in self.search(query, top_k))
+    
+    def collect_sections(self, doc_ids: Iterable[str]) -> Dict[str, Any]:
+        """Group ranked section ids into the context dict used by ChatHandler"""
+        relevant_info = {}
         
-        # Search for wellness categories
-        for category, description in self.knowledge_data['wellness_categories'].items():
-            if any(word in query_lower for word in category.split('_')):
-                relevant_info['wellness_category'] = {category: description}
+        for doc_id in doc_ids:
+            result_key, payload = self.sections[doc_id]
+            if result_key in ("health_category", "wellness_category"):
+                relevant_info.setdefault(result_key, {}).update(payload)
+            elif result_key == "documents":
+                relevant_info.setdefault(result_key, []).append(payload)
+            else:
+                relevant_info[result_key] = payload
         
         return relevant_info
     
+    def format_context(self, relevant_info: Dict[str, Any]) -> str:
+        """Prompt context for retrieved sections, joined from the pre-rendered fragments"""
+        return self.context_fragments.render(relevant_info)
+    
     def get_all_data(self) -> Dict[str, Any]:
         """Get all knowledge base data"""
         return self.knowledge_data
     
-    def get_faq_response(self, query: str) -> str:
+    def _faq_template_values(self) -> Dict[str, Any]:
+        """Values the FAQ answer templates may reference"""
+        methods = self.knowledge_data["payment_methods"]
+        contact = self.knowledge_data["company_info"]["contact"]
+        cod_charge = re.search(r"(₹\d+) COD", self.knowledge_data["shipping_delivery"]["shipping_charges"])
+        return {
+            "payment_list": ", ".join(methods[:-1]) + ", and " + methods[-1],
+            "cod_charge": cod_charge.group(1) if cod_charge else "small",
+            "phone": contact["phone"],
+            "email": contact["email"],
+            "company": contact["company"],
+            "address": contact["address"],
+        }
+    
+    def route_faq(self, query: str) -> Optional[FAQMatch]:
+        """Match a query against the FAQ intents, with the intent name and confidence"""
+        return self.faq_router.route(query)
+    
+    def get_faq_response(self, query: str) -> Optional[str]:
         """Get specific FAQ responses"""
-        query_lower = query.lower()
-        
-        if 'shipping' in query_lower and 'time' in query_lower:
-            return "Orders are processed within 1-2 days, and delivery takes 3-10 days depending on your location. We ship across India with tracking via SMS/email."
-        
-        elif 'free shipping' in query_lower:
-            return "We offer free shipping on orders above ₹699. For orders below ₹699, there's a flat shipping charge of ₹79, and ₹50 for COD."
-        
-        elif 'return' in query_lower or 'refund' in query_lower:
-            return "Due to the perishable nature of Ayurvedic products, we generally don't accept returns except for damaged products (report within 48 hours) or incorrect items shipped. Refunds are processed within 7-10 business days."
-        
-        elif 'payment' in query_lower:
-            return "We accept Credit/Debit Cards, UPI Payments, Net Banking, and Digital Wallets. All transactions are secured with SSL encryption."
-        
-        elif 'consultation' in query_lower:
-            return "We offer personalized health consultations with expert Ayurvedic doctors. You can book a consultation through our website."
-        
-        return None
+        match = self.faq_router.route(query)
+        return match.answer if match else None
+    
+    def _build_catalog(self) -> ProductCatalog:
+        """Typed product catalog from the ingested storefront, else the hardcoded featured list"""
+        catalog = ProductCatalog.from_chunks(self.chunks)
+        return catalog if len(catalog) else ProductCatalog.from_records(self.knowledge_data["featured_products"])
+    
+    def _build_normalizer(self) -> QueryNormalizer:
+        """Vocabulary of the indexed sections, the FAQ terms and past customer queries"""
+        texts = [text for _, text, _ in self.documents] + [keywords for _, _, keywords in self.documents]
+        texts += [term for intent in FAQ_INTENTS for group in intent["require"] for term in group]
+        # Past queries are optional vocabulary: a missing or malformed examples file is skipped
+        try:
+            texts += [query for query, _ in load_examples()]
+        except (OSError, ValueError, KeyError):
+            pass
+        return QueryNormalizer.from_texts(texts)
+    
+    def normalize_query(self, query: str) -> str:
+        """Query with typos, inflections and Hinglish mapped onto this knowledge's vocabulary"""
+        return self.normalizer.normalize(query)
+    
+    def parse_catalog_query(self, query: str) -> Optional[CatalogQuery]:
+        """Vendor, category and price filters mentioned in a question"""
+        return self.catalog.parse_query(query)
@@ -0,0 +1,116 @@
+"""Versioned knowledge snapshots, rebuilt in the background when sources change.
+
+A snapshot pairs a KnowledgeBase with the VectorRetriever built over it, and
+neither is modified after it is built. KnowledgeReloader polls the source
+files (attached_assets/*.md, *.pdf and knowledge_data.json). When one
+changes, it builds the next snapshot on its own thread, reusing the parsed
+chunks of unchanged files and the vectors of unchanged sections, then
+hands the finished snapshot to its subscribers. Requests already running
+finish on the snapshot they started with.
+"""
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from ingestion import discover_sources, load_corpus
+from knowledge_base import KNOWLEDGE_DATA_PATH, KnowledgeBase, load_knowledge_data
+from retrievers import VectorRetriever
+from vector_index import VECTOR_INDEX_DIR
+
+
+class KnowledgeSnapshot(NamedTuple):
+    version: str
+    knowledge_base: KnowledgeBase
+    retriever: VectorRetriever
+    built_at: float
+
+
+def watched_sources() -> List[Path]:
+    return discover_sources() + [KNOWLEDGE_DATA_PATH]
+
+
+def source_signature(paths: List[Path]) -> Tuple[Tuple[str, int, int], ...]:
+    """Cheap change check: (path, mtime, size) of every source; hashing happens only on rebuild"""
+    signature = []
+    for path in paths:
+        try:
+            stat = path.stat()
+            signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((str(path), -1, -1))
+    return tuple(signature)
+
+
+def build_snapshot(previous: Optional[KnowledgeSnapshot] = None,
+                   index_path: Optional[Path] = VECTOR_INDEX_DIR) -> KnowledgeSnapshot:
+    """Build the next snapshot; returns `previous` itself when the content is unchanged"""
+    knowledge_base = KnowledgeBase(load_corpus(), load_knowledge_data())
+    if previous is not None and knowledge_base.version == previous.version:
+        return previous
+    retriever = VectorRetriever(knowledge_base, index_path=index_path,
+                                previous=previous.retriever if previous is not None else None)
+    return KnowledgeSnapshot(knowledge_base.version, knowledge_base, retriever, time.time())
+
+
+class KnowledgeReloader:
+    """Polls the knowledge sources and publishes a rebuilt snapshot when they change"""
+
+    def __init__(self, snapshot: KnowledgeSnapshot, interval: float = 10.0,
+                 index_path: Optional[Path] = VECTOR_INDEX_DIR):
+        self.current = snapshot
+        self.interval = interval
+        self.index_path = index_path
+        self.reloads = 0
+        self.last_error: Optional[str] = None
+        self._subscribers: List[Callable[[KnowledgeSnapshot], None]] = []
+        self._signature = source_signature(watched_sources())
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_parts(cls, knowledge_base: KnowledgeBase, retriever: VectorRetriever,
+                   **kwargs) -> "KnowledgeReloader":
+        return cls(KnowledgeSnapshot(knowledge_base.version, knowledge_base, retriever, time.time()), **kwargs)
+
+    def subscribe(self, callback: Callable[[KnowledgeSnapshot], None]) -> None:
+        """Call `callback(snapshot)` with every new snapshot"""
+        self._subscribers.append(callback)
+
+    def check(self) -> bool:
+        """Rebuild now if a source changed; returns True when a new version was published"""
+        with self._lock:
+            signature = source_signature(watched_sources())
+            if signature == self._signature:
+                return False
+            # Recorded before building, so a broken edit is not rebuilt on every poll
+            self._signature = signature
+            try:
+                snapshot = build_snapshot(self.current, self.index_path)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Knowledge reload failed, still serving {self.current.version}: {self.last_error}",
+                      flush=True)
+                return False
+            self.last_error = None
+            if snapshot is self.current:
+                return False
+            self.current = snapshot
+            self.reloads += 1
+        for callback in self._subscribers:
+            callback(snapshot)
+        return True
+
+    def start(self) -> "KnowledgeReloader":
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="knowledge-reload", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check()
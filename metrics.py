@@ -0,0 +1,244 @@
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+# Quantiles reported by the admin panel and the Prometheus summary
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted samples"""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, max(0, round(q * (len(samples) - 1))))]
+
+
+class SamplingProfiler:
+    """Statistical profiler for one thread, sampled from a background thread
+
+    Stacks are collapsed to "outer;inner" strings so the output loads
+    directly into flame graph tools.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.002, max_depth: int = 40):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None and len(names) < self.max_depth:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+
+class RequestTrace:
+    """Timings and attributes of one chat request
+
+    Stages are timed with span(); the trace is recorded when finish() is
+    called, which may happen on a different thread than the one that started it.
+    Internal traces (recorded=False) only collect the answer path and timings.
+    """
+
+    def __init__(self, recorder: "MetricsRecorder", profile: bool = False, recorded: bool = True):
+        self.recorder = recorder
+        self.recorded = recorded
+        self.started = time.perf_counter()
+        self.timestamp = time.time()
+        self.stages: Dict[str, float] = {}
+        self.path = "llm"
+        self.cache_hit = False
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.error: Optional[str] = None
+        # Set when the intent classifier ran
+        self.intent: Optional[str] = None
+        self.finished = False
+        self.stacks: Optional[Counter] = None
+        self.profiler = SamplingProfiler(interval=recorder.profile_interval).start() if profile else None
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def set_usage(self, usage: Any) -> None:
+        """Copy token counts from an API usage object, when the response has one"""
+        if usage is not None:
+            self.prompt_tokens = getattr(usage, "prompt_tokens", None)
+            self.completion_tokens = getattr(usage, "completion_tokens", None)
+
+    def finish(self) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        self.add("total", time.perf_counter() - self.started)
+        if self.profiler is not None:
+            self.stacks = self.profiler.stop()
+        if self.recorded:
+            self.recorder.record(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ts": round(self.timestamp, 3),
+            "path": self.path,
+            "cache_hit": self.cache_hit,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "error": self.error,
+            "intent": self.intent,
+            "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()},
+        }
+
+
+class MetricsRecorder:
+    """Rolling per-stage latency windows and counters for the chat pipeline
+
+    Percentiles cover the last `window` observations of each stage, while
+    Prometheus sums and counts are cumulative. Finished traces can also be
+    appended to a JSON lines file.
+    """
+
+    def __init__(self, window: int = 1024, jsonl_path: Optional[str] = None,
+                 profile_sample_rate: float = 0.0, profile_interval: float = 0.002):
+        self.window = window
+        self.jsonl_path = jsonl_path
+        self.profile_sample_rate = profile_sample_rate
+        self.profile_interval = profile_interval
+        self.profile: Counter = Counter()
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+        self._sums: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._traces: Deque[Dict[str, Any]] = deque(maxlen=window)
+        self.requests: Counter = Counter()
+        self.tokens: Counter = Counter()
+        # Retries, hedges, timeouts and fallbacks of upstream LLM calls
+        self.upstream: Counter = Counter()
+
+    def trace(self) -> RequestTrace:
+        profile = self.profile_sample_rate > 0 and random.random() < self.profile_sample_rate
+        return RequestTrace(self, profile)
+
+    def internal_trace(self) -> RequestTrace:
+        """Trace for warm-up and precompute work: never profiled, recorded or counted as a cache lookup"""
+        return RequestTrace(self, recorded=False)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record one timing outside a request trace (e.g. a UI render)"""
+        with self._lock:
+            self._observe(stage, seconds)
+
+    def _observe(self, stage: str, seconds: float) -> None:
+        if stage not in self._samples:
+            self._samples[stage] = deque(maxlen=self.window)
+            self._sums[stage] = 0.0
+            self._counts[stage] = 0
+        self._samples[stage].append(seconds)
+        self._sums[stage] += seconds
+        self._counts[stage] += 1
+
+    def count_upstream(self, event: str) -> None:
+        with self._lock:
+            self.upstream[event] += 1
+
+    def record(self, trace: RequestTrace) -> None:
+        record = trace.to_dict()
+        with self._lock:
+            for stage, seconds in trace.stages.items():
+                self._observe(stage, seconds)
+            self.requests[trace.path] += 1
+            self.tokens["prompt"] += trace.prompt_tokens or 0
+            self.tokens["completion"] += trace.completion_tokens or 0
+            if trace.stacks:
+                self.profile.update(trace.stacks)
+            self._traces.append(record)
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+
+    def stage_percentiles(self) -> Dict[str, Dict[str, float]]:
+        """Rolling p50/p95/p99 (ms) and cumulative count per stage"""
+        with self._lock:
+            snapshot = {stage: sorted(samples) for stage, samples in self._samples.items()}
+            counts = dict(self._counts)
+        return {
+            stage: {
+                **{f"p{int(q * 100)}_ms": percentile(samples, q) * 1000 for q in QUANTILES},
+                "count": counts[stage],
+            }
+            for stage, samples in snapshot.items()
+        }
+
+    def export_prometheus(self, prefix: str = "aarogya_chat") -> str:
+        """Render metrics in the Prometheus text exposition format"""
+        with self._lock:
+            snapshot = {stage: sorted(samples) for stage, samples in self._samples.items()}
+            sums, counts = dict(self._sums), dict(self._counts)
+            requests, tokens = dict(self.requests), dict(self.tokens)
+            upstream = dict(self.upstream)
+
+        lines = [
+            f"# HELP {prefix}_stage_seconds Latency of each chat pipeline stage",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for stage, samples in sorted(snapshot.items()):
+            for q in QUANTILES:
+                lines.append(f'{prefix}_stage_seconds{{stage="{stage}",quantile="{q}"}} {percentile(samples, q):.6f}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {sums[stage]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {counts[stage]}')
+
+        lines += [f"# HELP {prefix}_requests_total Requests by answer path",
+                  f"# TYPE {prefix}_requests_total counter"]
+        lines += [f'{prefix}_requests_total{{path="{path}"}} {count}' for path, count in sorted(requests.items())]
+        lines += [f"# HELP {prefix}_tokens_total Tokens reported by the API usage field",
+                  f"# TYPE {prefix}_tokens_total counter"]
+        lines += [f'{prefix}_tokens_total{{kind="{kind}"}} {count}' for kind, count in sorted(tokens.items())]
+        lines += [f"# HELP {prefix}_upstream_events_total Retries, hedges, timeouts and fallbacks of LLM calls",
+                  f"# TYPE {prefix}_upstream_events_total counter"]
+        lines += [f'{prefix}_upstream_events_total{{event="{event}"}} {count}'
+                  for event, count in sorted(upstream.items())]
+        return "\n".join(lines) + "\n"
+
+    def export_json_lines(self) -> str:
+        """The most recent traces, one JSON object per line"""
+        with self._lock:
+            traces = list(self._traces)
+        return "".join(json.dumps(trace) + "\n" for trace in traces)
+
+    def export_profile(self) -> str:
+        """Sampled stacks in collapsed "frame;frame count" form for flame graphs"""
+        with self._lock:
+            stacks = self.profile.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
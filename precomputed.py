@@ -0,0 +1,171 @@
+"""Answers to frequent first questions, generated ahead of time per knowledge version.
+
+The Common Questions buttons and a few top intents always open a conversation
+with the same text, so their answers are generated once for each knowledge
+version, saved under .cache/precomputed/ and served with no LLM call. Generate
+them at deploy time (the app also does it in the background on startup and
+after every knowledge reload):
+
+    python precomputed.py
+    python precomputed.py --questions questions.txt --groq-base-url http://127.0.0.1:8765
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from response_cache import normalize_query
+from vector_index import KEEP_VERSIONS
+
+PRECOMPUTED_DIR = Path(__file__).resolve().parent / ".cache" / "precomputed"
+
+# (button label, question) shown on an empty chat
+SAMPLE_QUESTIONS = [
+    ("🛍️ What products do you offer?", "What products do you offer?"),
+    ("🚚 Shipping and delivery info?", "What are your shipping and delivery policies?"),
+    ("🔄 Return policy?", "What is your return and refund policy?"),
+]
+
+# Sample questions first, then the most frequent opening questions
+DEFAULT_QUESTIONS = [question for _, question in SAMPLE_QUESTIONS] + [
+    "Tell me about Aarogya Vatika",
+    "How can I contact you?",
+    "Which products help with immunity?",
+    "Do you have products for digestion?",
+    "What do you recommend for stress and better sleep?",
+]
+
+# Only answers from the model (live or cached) are stored; FAQ and catalog answers are instant already
+PRECOMPUTABLE_PATHS = ("llm", "cache", "precomputed")
+
+
+def load_questions(path: Optional[str] = None) -> List[str]:
+    """One question per line from `path` (or PRECOMPUTE_QUESTIONS), else the defaults"""
+    path = path or os.getenv("PRECOMPUTE_QUESTIONS")
+    if not path:
+        return list(DEFAULT_QUESTIONS)
+    with open(path, "r", encoding="utf-8") as handle:
+        return [line.strip() for line in handle if line.strip() and not line.startswith("#")]
+
+
+class PrecomputedAnswers:
+    """Opening answers for one knowledge version, keyed by the normalised question"""
+
+    def __init__(self, version: str, answers: Dict[str, str], questions: List[str],
+                 generated_at: float = 0.0):
+        self.version = version
+        self.answers = answers
+        # Every question asked, including those skipped, so a changed list is regenerated
+        self.questions = questions
+        self.generated_at = generated_at
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    def get(self, query: str) -> Optional[str]:
+        return self.answers.get(normalize_query(query))
+
+    @classmethod
+    def generate(cls, chat_handler: Any, questions: List[str]) -> "PrecomputedAnswers":
+        """Answer each question as the opening message of a conversation
+
+        Runs the handler's own pipeline, so answers match what a live request
+        would return. Questions answered by the FAQ router or the catalog, or
+        that fail, are skipped. Internal traces keep generation out of the
+        metrics, the profiler and the cache hit rate.
+        """
+        knowledge_base = chat_handler.knowledge_base
+        answers = {}
+        for question in questions:
+            trace = chat_handler.metrics.internal_trace()
+            try:
+                answer, messages, cache_key = chat_handler._prepare_request(question, [], trace)
+                if answer is None:
+                    answer = chat_handler._complete(messages, cache_key, trace)
+            except Exception as e:
+                print(f"Precompute skipped {question!r}: {type(e).__name__}", flush=True)
+                continue
+            if answer and trace.path in PRECOMPUTABLE_PATHS:
+                answers[normalize_query(question)] = answer
+        return cls(knowledge_base.version, answers, list(questions), time.time())
+
+    def save(self, directory: Path = PRECOMPUTED_DIR) -> Path:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{self.version}.json"
+        tmp = directory / f"{self.version}.json.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as handle:
+            json.dump({"version": self.version, "generated_at": self.generated_at,
+                       "questions": self.questions, "answers": self.answers}, handle, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+        for old in sorted(directory.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)[KEEP_VERSIONS:]:
+            old.unlink(missing_ok=True)
+        return path
+
+    @classmethod
+    def load(cls, version: str, directory: Path = PRECOMPUTED_DIR) -> Optional["PrecomputedAnswers"]:
+        try:
+            with open(Path(directory) / f"{version}.json", "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != version or "questions" not in data:
+            return None
+        return cls(version, data["answers"], data["questions"], data.get("generated_at", 0.0))
+
+
+def refresh(chat_handler: Any, questions: List[str], directory: Path = PRECOMPUTED_DIR) -> PrecomputedAnswers:
+    """Install the answers for the handler's knowledge version, generating them if none are saved"""
+    version = chat_handler.knowledge_base.version
+    answers = PrecomputedAnswers.load(version, directory)
+    if answers is None or answers.questions != list(questions):
+        answers = PrecomputedAnswers.generate(chat_handler, questions)
+        try:
+            answers.save(directory)
+        except OSError:
+            pass
+    chat_handler.use_precomputed(answers)
+    return answers
+
+
+def refresh_in_background(chat_handler: Any, questions: List[str],
+                          directory: Path = PRECOMPUTED_DIR) -> threading.Thread:
+    """refresh() on a daemon thread; until it finishes, the live path answers as usual"""
+    thread = threading.Thread(target=refresh, args=(chat_handler, questions, directory),
+                              name="precompute", daemon=True)
+    thread.start()
+    return thread
+
+
+def main() -> None:
+    from chat_handler import ChatHandler
+    from knowledge_base import KnowledgeBase
+    from retrievers import VectorRetriever
+    from startup import LazyGroqClient, load_environment
+    from vector_index import VECTOR_INDEX_DIR
+
+    load_environment()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--questions", help="text file with one question per line (default: built-in list)")
+    parser.add_argument("--groq-base-url", help="e.g. the local fake server in benchmarks/")
+    args = parser.parse_args()
+    if not os.getenv("GROQ_API_KEY"):
+        parser.error("GROQ_API_KEY is not set")
+
+    knowledge_base = KnowledgeBase()
+    retriever = VectorRetriever(knowledge_base, index_path=VECTOR_INDEX_DIR)
+    client = LazyGroqClient(api_key=os.getenv("GROQ_API_KEY"), base_url=args.groq_base_url)
+    handler = ChatHandler(client, knowledge_base, retriever)
+    questions = load_questions(args.questions)
+    started = time.perf_counter()
+    answers = PrecomputedAnswers.generate(handler, questions)
+    path = answers.save()
+    print(f"{len(answers)}/{len(questions)} answers for knowledge version {answers.version} "
+          f"in {time.perf_counter() - started:.1f}s -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a regex estimate
+    tiktoken = None
+
+# Approximates BPE splits: words, numbers, and single punctuation/symbols
+TOKEN_ESTIMATE_PATTERN = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+# Fixed overhead the chat format adds per message (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Headings of the system messages carrying the retrieved context and the history summary
+CONTEXT_HEADING = "Relevant Information:\n"
+SUMMARY_HEADING = "Earlier in this conversation:\n"
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken when installed, else a close regex estimate
+
+    Llama 3 uses a tiktoken-style BPE, so cl100k_base counts are within a few
+    percent. Counts are memoised because the same strings recur every turn.
+    """
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        self._encoder = tiktoken.get_encoding(encoding) if tiktoken is not None else None
+        self.count = lru_cache(maxsize=4096)(self._count)
+
+    def _count(self, text: str) -> int:
+        if self._encoder is not None:
+            return len(self._encoder.encode(text, disallowed_special=()))
+        # Long words split into several BPE pieces, roughly one per 6 letters
+        return sum(
+            (len(piece) + 5) // 6 if piece.isalpha() else 1
+            for piece in TOKEN_ESTIMATE_PATTERN.findall(text)
+        )
+
+    def count_message(self, message: Dict[str, str]) -> int:
+        return self.count(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+class BuiltPrompt(NamedTuple):
+    messages: List[Dict[str, str]]
+    history: List[Dict[str, str]]
+    summary: str
+    token_count: int
+    # Content of the context message, second to last
+    reference: str
+
+
+def _first_sentence(text: str, max_chars: int = 160) -> str:
+    sentence = re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars].rstrip() + "…"
+
+
+class HistorySummarizer:
+    """Extractive rolling summary of the turns that no longer fit the budget
+
+    Each dropped turn contributes one line; summaries are cached by the hash
+    of the dropped prefix, and a longer prefix extends its cached parent.
+    """
+
+    def __init__(self, counter: TokenCounter, max_tokens: int = 200, max_entries: int = 1024):
+        self.counter = counter
+        self.max_tokens = max_tokens
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def summarize(self, turns: List[Dict[str, str]]) -> str:
+        lines = self._lines(turns)
+        # Keep the most recent lines that fit the summary allowance
+        kept: List[str] = []
+        used = 0
+        for line in reversed(lines):
+            cost = self.counter.count(line) + 1
+            if used + cost > self.max_tokens:
+                break
+            kept.append(line)
+            used += cost
+        return "\n".join(reversed(kept))
+
+    def _lines(self, turns: List[Dict[str, str]]) -> List[str]:
+        digest = hashlib.sha256()
+        keys = []
+        for message in turns:
+            digest.update(f"{message['role']}\0{message['content']}\0".encode("utf-8"))
+            keys.append(digest.hexdigest())
+
+        with self._lock:
+            # Reuse the longest cached prefix, then summarise only the new turns
+            start, lines = 0, []
+            for position in range(len(keys), 0, -1):
+                cached = self._cache.get(keys[position - 1])
+                if cached is not None:
+                    start, lines = position, list(cached)
+                    self._cache.move_to_end(keys[position - 1])
+                    break
+
+        for message in turns[start:]:
+            speaker = "Customer" if message["role"] == "user" else "Assistant"
+            lines.append(f"- {speaker}: {_first_sentence(message['content'])}")
+
+        if keys:
+            with self._lock:
+                self._cache[keys[-1]] = lines
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return lines
+
+
+class PromptBuilder:
+    """Fills a token budget in priority order: system prompt, context, newest history
+
+    Messages run from the most to the least stable: the static system prompt
+    (byte-identical on every request), the rolling summary of older turns,
+    as many of the newest turns as fit, then the retrieved context and the
+    user query. Consecutive turns of a conversation share everything up to
+    the context, so provider-side prompt caching can reuse that prefix.
+    """
+
+    def __init__(self, system_prompt: str, token_budget: int = 2500, max_context_tokens: int = 900,
+                 counter: Optional[TokenCounter] = None, summary_tokens: int = 200):
+        self.system_prompt = system_prompt
+        # Shared by every prompt; never mutated
+        self._system_message = {"role": "system", "content": system_prompt}
+        self.token_budget = token_budget
+        self.max_context_tokens = max_context_tokens
+        self.counter = counter or TokenCounter()
+        self.summarizer = HistorySummarizer(self.counter, summary_tokens)
+
+    def _fit_context(self, context: str, allowance: int) -> str:
+        """Keep whole context lines, in order, until the allowance is spent"""
+        kept, used = [], 0
+        for line in context.split("\n"):
+            cost = self.counter.count(line) + 1
+            if used + cost > allowance:
+                break
+            kept.append(line)
+            used += cost
+        return "\n".join(kept)
+
+    def build(self, user_query: str, context: str, chat_history: List[Dict[str, str]]) -> BuiltPrompt:
+        history = [m for m in chat_history if m["role"] in ("user", "assistant")]
+        # app.py appends the current query before calling; don't send it twice
+        if history and history[-1]["role"] == "user" and history[-1]["content"] == user_query:
+            history = history[:-1]
+
+        query_message = {"role": "user", "content": user_query}
+        used = (self.counter.count_message(self._system_message) + self.counter.count_message(query_message)
+                + self.counter.count(CONTEXT_HEADING) + MESSAGE_OVERHEAD_TOKENS)
+        remaining = max(self.token_budget - used, 0)
+
+        context = self._fit_context(context, min(self.max_context_tokens, remaining))
+        remaining -= self.counter.count(context)
+
+        # Reserve room for a summary only when some history will be dropped
+        history_cost = sum(self.counter.count_message(m) for m in history)
+        if history_cost > remaining:
+            remaining -= (self.summarizer.max_tokens + self.counter.count(SUMMARY_HEADING)
+                          + MESSAGE_OVERHEAD_TOKENS)
+
+        kept: List[Dict[str, str]] = []
+        for message in reversed(history):
+            cost = self.counter.count_message(message)
+            if cost > remaining:
+                break
+            kept.append({"role": message["role"], "content": message["content"]})
+            remaining -= cost
+        kept.reverse()
+
+        dropped = history[:len(history) - len(kept)]
+        summary = self.summarizer.summarize(dropped) if dropped else ""
+
+        reference = CONTEXT_HEADING + context
+        messages = [self._system_message]
+        if summary:
+            messages.append({"role": "system", "content": SUMMARY_HEADING + summary})
+        messages += kept + [{"role": "system", "content": reference}, query_message]
+        token_count = sum(self.counter.count_message(m) for m in messages)
+        return BuiltPrompt(messages, kept, summary, token_count, reference)
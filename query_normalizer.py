@@ -0,0 +1,231 @@
+"""Typo- and Hinglish-tolerant query normalisation against the knowledge base vocabulary.
+
+Runs before FAQ routing, catalog parsing and retrieval, so "shiping chrges",
+"refnd kab milega" and "ashwagandha price kya hai" reach the same sections as
+their English spellings. The LLM still sees the customer's own words. Each
+word is, in order:
+
+1. mapped through the Hinglish synonym table ("kab" -> "when", "wapas" -> "return")
+2. kept if it is in the vocabulary or a common query word
+3. spelling-corrected to the closest, most frequent vocabulary word, found
+   with a symmetric-delete index (edit distance 1, or 2 for long words), or
+   else stemmed to a vocabulary word by removing a suffix ("charged" -> "charge")
+
+A vocabulary word found inside the query word at its start or end is never a
+correction: "repayment" and "border" are other words, not "payment" and
+"order" misspelt.
+
+Whole queries and single words are memoised in bounded LRU caches, so a
+repeated phrasing costs one dict lookup. The examples below run with
+`python -m doctest query_normalizer.py`.
+"""
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set
+
+from search_index import STOPWORDS
+
+WORD_PATTERN = re.compile(r"[a-z]+")
+WHITESPACE = re.compile(r"\s+")
+
+# Phrases replaced before word-level normalisation
+HINGLISH_PHRASES: Dict[str, str] = {
+    "sir dard": "headache",
+    "pet dard": "stomach pain",
+    "cash on delivery": "cod",
+    "kitne din": "how many days",
+    "kitna time": "how long",
+    "kitna samay": "how long",
+}
+
+# Hinglish words mapped to the English terms the knowledge base uses; "" drops a filler word
+HINGLISH_SYNONYMS: Dict[str, str] = {
+    # Question words
+    "kya": "what", "kab": "when", "kahan": "where", "kaha": "where", "kaise": "how",
+    "kitna": "how much", "kitne": "how much", "kitni": "how much", "kyun": "why", "kyu": "why",
+    "kaun": "which", "konsa": "which", "kaunsa": "which",
+    # Fillers
+    "hai": "", "hain": "", "ho": "", "hoga": "", "hogi": "", "ka": "", "ki": "", "ke": "", "ko": "",
+    "se": "", "bhi": "", "toh": "", "ji": "", "mujhe": "", "karna": "", "karni": "", "karein": "",
+    "mein": "in", "liye": "for", "aur": "and", "mera": "my", "meri": "my", "mere": "my",
+    "aap": "you", "aapka": "your", "aapke": "your", "aapki": "your",
+    # Verbs
+    "milega": "get", "milegi": "get", "milta": "get", "chahiye": "need", "batao": "tell",
+    "bataye": "tell", "lun": "take", "lena": "take", "bhejo": "send", "aayega": "arrive",
+    "aayegi": "arrive", "pahuchega": "arrive", "lautana": "return",
+    # Orders, money and service
+    "daam": "price", "keemat": "price", "kimat": "price", "paisa": "money", "paise": "money",
+    "wapas": "return", "vapas": "return", "wapsi": "return", "vapsi": "return", "din": "days",
+    "samay": "time", "jaldi": "fast", "sasta": "cheap", "saste": "cheap", "mehnga": "expensive",
+    "bhugtan": "payment", "nakad": "cash", "salah": "consultation", "sampark": "contact",
+    # Health
+    "dawa": "medicine", "dawai": "medicine", "baal": "hair", "balon": "hair", "neend": "sleep",
+    "khansi": "cough", "jukam": "cold", "zukam": "cold", "bukhar": "fever", "tel": "oil",
+    "dard": "pain", "twacha": "skin", "chehra": "face", "chehre": "face", "vajan": "weight",
+    "wajan": "weight", "pachan": "digestion", "kabz": "constipation", "tanav": "stress",
+    "thakan": "fatigue", "kamzori": "weakness", "shakkar": "sugar", "madhumeh": "diabetes",
+    "jodon": "joint", "ghutne": "knee",
+    # Chat shorthand
+    "u": "you", "ur": "your", "wat": "what", "wht": "what", "pls": "please", "plz": "please",
+    "thx": "thanks", "abt": "about", "msg": "message", "info": "information",
+    # Opinion
+    "acha": "good", "achha": "good", "accha": "good", "behtar": "better", "nahi": "not", "nahin": "not",
+}
+
+# Never corrected even when the knowledge base does not use them
+COMMON_QUERY_WORDS = STOPWORDS | frozenset([
+    "under", "below", "above", "over", "between", "less", "more", "than", "least", "most", "upto",
+    "within", "max", "min", "cheap", "cheaper", "cheapest", "rs", "inr", "rupee", "rupees",
+    "hi", "hello", "hey", "thanks", "thank", "ok", "okay", "yes", "no", "not", "good", "best",
+    "better", "help", "why", "who", "much", "many", "there", "if", "should", "take", "use", "change",
+])
+
+# Suffixes removed, longest first, when what remains is a vocabulary word
+SUFFIXES = ("ing", "ies", "ed", "es", "ly", "s")
+
+# Words at least this long may be corrected by two edits rather than one
+LONG_WORD_LENGTH = 10
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (adjacent swaps count once); limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _deletes(word: str, distance: int) -> Set[str]:
+    """Every string made by removing up to `distance` characters from word"""
+    results = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - results
+        results |= frontier
+    return results
+
+
+class QueryNormalizer:
+    """Maps misspelt, inflected and Hinglish query words onto a fixed vocabulary
+
+    The symmetric-delete index stores every deletion (up to max_distance) of
+    each vocabulary word's first prefix_length characters. A query word's own
+    deletions then find its candidates with a few dict lookups, and only
+    those candidates have their edit distance computed. The index is built
+    on the first correction, off the startup path.
+
+    >>> normalizer = QueryNormalizer(Counter({"payment": 3, "order": 5, "shipping": 2, "charges": 1,
+    ...                                       "refund": 4}))
+    >>> normalizer.normalize("shiping chrges kab")
+    'shipping charges when'
+    >>> normalizer.normalize("refnd kab milega")
+    'refund when get'
+    >>> normalizer.correct("repayment") is None, normalizer.correct("border") is None
+    (True, True)
+    >>> normalizer.normalize("When is my loan repayment due? Do you ship across the border?")
+    'when is my loan repayment due? do you ship across the border?'
+    """
+
+    def __init__(self, vocabulary: Counter, synonyms: Optional[Dict[str, str]] = None,
+                 phrases: Optional[Dict[str, str]] = None, max_distance: int = 2, prefix_length: int = 7,
+                 min_length: int = 5, cache_size: int = 4096):
+        self.vocabulary = vocabulary
+        self.synonyms = HINGLISH_SYNONYMS if synonyms is None else synonyms
+        self.phrases = HINGLISH_PHRASES if phrases is None else phrases
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        # Shorter words have too many close neighbours to correct safely
+        self.min_length = min_length
+        self._phrase_pattern = re.compile(
+            r"\b(?:" + "|".join(re.escape(p) for p in sorted(self.phrases, key=len, reverse=True)) + r")\b"
+        ) if self.phrases else None
+        self._deletes: Optional[Dict[str, List[str]]] = None
+        self._lock = threading.Lock()
+        self.normalize = lru_cache(maxsize=cache_size)(self._normalize)
+        self._normalize_word = lru_cache(maxsize=cache_size * 4)(self._normalize_word_uncached)
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str], extra_words: Iterable[str] = (), **kwargs) -> "QueryNormalizer":
+        """Vocabulary of every word in texts, with its frequency as the tie-breaker"""
+        vocabulary = Counter()
+        for text in texts:
+            vocabulary.update(word for word in WORD_PATTERN.findall(text.lower()) if len(word) > 1)
+        vocabulary.update(word for word in extra_words)
+        return cls(vocabulary, **kwargs)
+
+    def _normalize(self, query: str) -> str:
+        """Normalised, lowercase query; digits, ₹ and punctuation are kept as they are"""
+        text = query.lower()
+        if self._phrase_pattern is not None:
+            text = self._phrase_pattern.sub(lambda match: self.phrases[match.group(0)], text)
+        text = WORD_PATTERN.sub(lambda match: self._normalize_word(match.group(0)), text)
+        return WHITESPACE.sub(" ", text).strip()
+
+    def _normalize_word_uncached(self, word: str) -> str:
+        if word in self.synonyms:
+            return self.synonyms[word]
+        if word in self.vocabulary or word in COMMON_QUERY_WORDS:
+            return word
+        stem, corrected = self.stem(word), self.correct(word)
+        # "shiping" is "shipping" misspelt, not "ship" inflected
+        if corrected is not None and (stem is None or corrected.endswith(word[-2:])):
+            return corrected
+        return stem or word
+
+    def stem(self, word: str) -> Optional[str]:
+        """The word without an inflection suffix, if that is a vocabulary word"""
+        for suffix in SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                base = word[:-len(suffix)]
+                for candidate in ((base + "y", base) if suffix == "ies" else (base, base + "e")):
+                    if candidate in self.vocabulary:
+                        return candidate
+        return None
+
+    def correct(self, word: str) -> Optional[str]:
+        """Closest vocabulary word, most frequent first on ties; None when nothing is close enough"""
+        if len(word) < self.min_length:
+            return None
+        limit = self.max_distance if len(word) >= LONG_WORD_LENGTH else 1
+        deletes = self._delete_index()
+        best = None
+        seen = set()
+        for key in _deletes(word[:self.prefix_length], limit):
+            for candidate in deletes.get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                # Letters only added before or after a known word make a different word
+                if word.startswith(candidate) or word.endswith(candidate):
+                    continue
+                distance = edit_distance(word, candidate, limit)
+                if distance <= limit:
+                    rank = (distance, -self.vocabulary[candidate], candidate)
+                    if best is None or rank < best:
+                        best = rank
+        return best[2] if best is not None else None
+
+    def _delete_index(self) -> Dict[str, List[str]]:
+        if self._deletes is None:
+            with self._lock:
+                if self._deletes is None:
+                    index: Dict[str, List[str]] = {}
+                    for word in self.vocabulary:
+                        if len(word) >= self.min_length - self.max_distance:
+                            for key in _deletes(word[:self.prefix_length], self.max_distance):
+                                index.setdefault(key, []).append(word)
+                    self._deletes = index
+        return self._deletes
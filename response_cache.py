@@ -0,0 +1,350 @@
+import hashlib
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialised within one process
+    fcntl = None
+
+PUNCTUATION = re.compile(r"[^\w\s₹]")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace so trivial variants share a key"""
+    return WHITESPACE.sub(" ", PUNCTUATION.sub(" ", query.lower())).strip()
+
+
+def make_cache_key(query: str, context: str, history: List[Dict[str, str]], version: str = "") -> str:
+    """Fingerprint the normalised query, the retrieved context and the history sent upstream
+
+    `version` is the knowledge version, so a reload invalidates every earlier answer.
+    """
+    digest = hashlib.sha256(version.encode("utf-8") + b"\0")
+    digest.update(normalize_query(query).encode("utf-8") + b"\0")
+    digest.update(hashlib.sha256(context.encode("utf-8")).digest())
+    for message in history:
+        digest.update(f"{message['role']}\0{message['content']}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SQLiteCacheBackend:
+    """Persistent second-level store so cached answers survive restarts"""
+
+    def __init__(self, path: Path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return (value, created timestamp) or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+        return row
+
+    def set(self, key: str, value: str, created: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, created, created),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def prune(self, max_entries: int, ttl_seconds: Optional[float]) -> int:
+        """Drop expired rows and the least recently used rows beyond max_entries"""
+        with self._lock:
+            removed = 0
+            if ttl_seconds is not None:
+                removed += self._conn.execute(
+                    "DELETE FROM responses WHERE created < ?", (time.time() - ttl_seconds,)
+                ).rowcount
+            removed += self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (max_entries,),
+            ).rowcount
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+
+# Shared cache file: magic, format version, slot count, slot size
+SHARED_HEADER = struct.Struct("<4sIII")
+SHARED_HEADER_SIZE = 64
+SHARED_MAGIC = b"AVRC"
+# Each slot: sequence number (odd while being written), created, key digest, value length, checksum
+SLOT_HEADER = struct.Struct("<Qd16sII")
+SEQUENCE = struct.Struct("<Q")
+# Slots checked for a key, starting at its hash bucket
+PROBE_LENGTH = 4
+
+
+class SharedMemoryCacheBackend:
+    """Second-level store shared by every worker process on a host, with lock-free reads
+
+    A fixed-size hash table in one memory-mapped file; put it on tmpfs
+    (/dev/shm) and it never touches the disk. Writers take a file lock, mark
+    the slot odd, write it and mark it even again; readers take no lock and
+    retry or miss when the sequence number changed under them or the
+    checksum does not match (a seqlock). A full bucket overwrites its oldest
+    entry, and values larger than a slot stay in the per-process cache only.
+    """
+
+    def __init__(self, path: Union[str, Path], slots: int = 4096, slot_size: int = 8192):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Serialises writers within this process; the file lock does it across processes
+        self._lock = threading.Lock()
+        self._fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o600)
+        with self._write_lock():
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            header = os.read(self._fd, SHARED_HEADER.size)
+            if len(header) == SHARED_HEADER.size and header[:4] == SHARED_MAGIC:
+                # The first process to create the file decides its geometry
+                _, _, slots, slot_size = SHARED_HEADER.unpack(header)
+            else:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, SHARED_HEADER_SIZE + slots * slot_size)
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                os.write(self._fd, SHARED_HEADER.pack(SHARED_MAGIC, 1, slots, slot_size))
+        self.slots = slots
+        self.slot_size = slot_size
+        self.max_value_bytes = slot_size - SLOT_HEADER.size
+        self._map = mmap.mmap(self._fd, SHARED_HEADER_SIZE + slots * slot_size)
+
+    def _write_lock(self):
+        return _FileLock(self._lock, self._fd)
+
+    @staticmethod
+    def _digest(key: str) -> bytes:
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+    def _offsets(self, digest: bytes):
+        bucket = int.from_bytes(digest[:8], "little") % self.slots
+        for probe in range(PROBE_LENGTH):
+            yield SHARED_HEADER_SIZE + ((bucket + probe) % self.slots) * self.slot_size
+
+    @staticmethod
+    def _checksum(digest: bytes, created: float, data: bytes) -> int:
+        return zlib.crc32(data, zlib.crc32(digest + struct.pack("<d", created)))
+
+    def _read_slot(self, offset: int, digest: bytes) -> Optional[Tuple[str, float]]:
+        for _ in range(3):
+            sequence, created, slot_digest, length, checksum = SLOT_HEADER.unpack_from(self._map, offset)
+            if sequence & 1:
+                continue
+            if slot_digest != digest or length > self.max_value_bytes:
+                return None
+            start = offset + SLOT_HEADER.size
+            data = self._map[start:start + length]
+            if (SEQUENCE.unpack_from(self._map, offset)[0] == sequence
+                    and self._checksum(digest, created, data) == checksum):
+                return data.decode("utf-8"), created
+        # Still being written; a miss is cheaper than waiting
+        return None
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return (value, created timestamp) or None, without taking any lock"""
+        digest = self._digest(key)
+        for offset in self._offsets(digest):
+            row = self._read_slot(offset, digest)
+            if row is not None:
+                return row
+        return None
+
+    def _write_slot(self, offset: int, digest: bytes, created: float, data: bytes) -> None:
+        sequence = SEQUENCE.unpack_from(self._map, offset)[0]
+        SEQUENCE.pack_into(self._map, offset, sequence + 1)
+        start = offset + SLOT_HEADER.size
+        self._map[start:start + len(data)] = data
+        SLOT_HEADER.pack_into(self._map, offset, sequence + 1, created, digest, len(data),
+                              self._checksum(digest, created, data))
+        SEQUENCE.pack_into(self._map, offset, sequence + 2)
+
+    def set(self, key: str, value: str, created: float) -> None:
+        data = value.encode("utf-8")
+        if len(data) > self.max_value_bytes:
+            return
+        digest = self._digest(key)
+        with self._write_lock():
+            # The key's own slot, else an empty one, else the oldest in the bucket
+            target, target_created = None, None
+            for offset in self._offsets(digest):
+                _, slot_created, slot_digest, length, _ = SLOT_HEADER.unpack_from(self._map, offset)
+                if slot_digest == digest:
+                    target = offset
+                    break
+                if target_created is None or slot_created < target_created:
+                    target, target_created = offset, slot_created
+            self._write_slot(target, digest, created, data)
+
+    def delete(self, key: str) -> None:
+        digest = self._digest(key)
+        with self._write_lock():
+            for offset in self._offsets(digest):
+                if SLOT_HEADER.unpack_from(self._map, offset)[2] == digest:
+                    self._write_slot(offset, bytes(16), 0.0, b"")
+
+    def prune(self, max_entries: int, ttl_seconds: Optional[float]) -> int:
+        """Nothing to do: the slot count bounds the entries and expired ones are dropped when read
+
+        Scanning every slot would fault in the whole file on each worker start.
+        """
+        return 0
+
+    def clear(self) -> None:
+        with self._write_lock():
+            for slot in range(self.slots):
+                offset = SHARED_HEADER_SIZE + slot * self.slot_size
+                if SLOT_HEADER.unpack_from(self._map, offset)[3]:
+                    self._write_slot(offset, bytes(16), 0.0, b"")
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+class _FileLock:
+    """Thread lock plus an exclusive lock on the whole file (per process, so safe across fork)"""
+
+    def __init__(self, lock: threading.Lock, fd: int):
+        self._lock = lock
+        self._fd = fd
+
+    def __enter__(self) -> None:
+        self._lock.acquire()
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc_info) -> None:
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
+
+
+def backend_from_env() -> Optional[Union[SharedMemoryCacheBackend, SQLiteCacheBackend]]:
+    """RESPONSE_CACHE_SHM (one cache for every worker on the host) else RESPONSE_CACHE_DB, if set
+
+    Open it in each process, after forking.
+    """
+    shared_path = os.getenv("RESPONSE_CACHE_SHM")
+    if shared_path:
+        return SharedMemoryCacheBackend(shared_path)
+    cache_db = os.getenv("RESPONSE_CACHE_DB")
+    return SQLiteCacheBackend(cache_db) if cache_db else None
+
+
+class ResponseCache:
+    """Bounded LRU cache with TTL expiry and an optional shared-memory or SQLite second level"""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: Optional[float] = 6 * 3600,
+                 backend: Optional[Union[SharedMemoryCacheBackend, SQLiteCacheBackend]] = None, backend_max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self.backend_max_entries = backend_max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._backend_writes = 0
+        if backend is not None:
+            backend.prune(backend_max_entries, ttl_seconds)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def get(self, key: str, count: bool = True) -> Optional[str]:
+        """Return the cached response for key, or None on a miss
+
+        With count=False the lookup leaves the hit and miss counters alone.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[1]):
+                    self._entries.move_to_end(key)
+                    self.hits += count
+                    return entry[0]
+                del self._entries[key]
+                self.expirations += 1
+
+        if self.backend is not None:
+            row = self.backend.get(key)
+            if row is not None:
+                if not self._expired(row[1]):
+                    with self._lock:
+                        self._store(key, row[0], row[1])
+                        self.hits += count
+                    return row[0]
+                self.backend.delete(key)
+                with self._lock:
+                    self.expirations += 1
+
+        with self._lock:
+            self.misses += count
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        """Store a response, evicting the least recently used entries beyond max_entries"""
+        created = time.time()
+        with self._lock:
+            self._store(key, value, created)
+        if self.backend is not None:
+            self.backend.set(key, value, created)
+            self._backend_writes += 1
+            if self._backend_writes % 256 == 0:
+                self.backend.prune(self.backend_max_entries, self.ttl_seconds)
+
+    def _store(self, key: str, value: str, created: float) -> None:
+        self._entries[key] = (value, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
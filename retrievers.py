@@ -0,0 +1,48 @@
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from knowledge_base import KnowledgeBase
+from vector_index import VectorIndex
+
+# Curated keywords are repeated so they weigh like the BM25 keyword boost
+KEYWORD_REPEAT = 3
+
+
+class KeywordRetriever:
+    """Retriever backed by the knowledge base's BM25 inverted index"""
+
+    def __init__(self, knowledge_base: KnowledgeBase, top_k: int = 5):
+        self.knowledge_base = knowledge_base
+        self.top_k = top_k
+
+    def retrieve(self, query: str) -> Dict[str, Any]:
+        """Return the context dict for the sections most relevant to query"""
+        return self.knowledge_base.search_knowledge(query, self.top_k)
+
+
+class VectorRetriever:
+    """Retriever backed by a hashed TF-IDF vector index over every knowledge section
+
+    With index_path set the matrix is saved as .npy files and memory-mapped, so
+    several worker processes on one host share a single copy of the index.
+    Passing the retriever of the previous knowledge version as `previous`
+    re-vectorises only the sections that changed.
+    """
+
+    def __init__(self, knowledge_base: KnowledgeBase, top_k: int = 5, min_score: float = 0.08,
+                 index_path: Optional[Path] = None, mmap: bool = True,
+                 previous: Optional["VectorRetriever"] = None):
+        self.knowledge_base = knowledge_base
+        self.top_k = top_k
+        self.min_score = min_score
+        documents = [
+            (doc_id, " ".join([keywords] * KEYWORD_REPEAT + [text]))
+            for doc_id, text, keywords in knowledge_base.documents
+        ]
+        self.index = VectorIndex.load_or_build(documents, index_path, mmap=mmap,
+                                               previous=previous.index if previous is not None else None)
+
+    def retrieve(self, query: str) -> Dict[str, Any]:
+        """Return the context dict for the sections most similar to query"""
+        hits = self.index.search(query, self.top_k, self.min_score)
+        return self.knowledge_base.collect_sections(doc_id for doc_id, _ in hits)
@@ -0,0 +1,95 @@
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset([
+    "a", "all", "an", "and", "any", "are", "as", "at", "be", "by", "can", "could",
+    "do", "does", "for", "from", "get", "have", "how", "i", "in", "is", "it",
+    "know", "me", "my", "need", "of", "offer", "on", "or", "our", "please",
+    "tell", "that", "the", "this", "to", "us", "want", "we", "what", "when",
+    "where", "which", "will", "with", "would", "you", "your"
+])
+
+
+def _fold_plural(token: str) -> str:
+    """Fold simple English plurals so 'products' and 'product' share a term"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase index terms, dropping stopwords"""
+    return [
+        _fold_plural(token)
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+class InvertedIndex:
+    """In-memory inverted index with BM25 ranking"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, keyword_weight: int = 5):
+        self.k1 = k1
+        self.b = b
+        self.keyword_weight = keyword_weight
+        self.doc_ids: List[str] = []
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.idf: Dict[str, float] = {}
+        self.avg_doc_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def add_document(self, doc_id: str, text: str, keywords: str = "") -> None:
+        """Add a document to the index; call build() once all documents are added
+
+        Keyword terms count keyword_weight times but do not add to the document
+        length, so a long section is not penalised for its curated keywords.
+        """
+        doc_index = len(self.doc_ids)
+        terms = Counter(tokenize(text))
+        self.doc_ids.append(doc_id)
+        self.doc_lengths.append(sum(terms.values()))
+        for term in tokenize(keywords):
+            terms[term] += self.keyword_weight
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, []).append((doc_index, frequency))
+
+    def build(self) -> "InvertedIndex":
+        """Precompute IDF weights and the average document length"""
+        doc_count = len(self.doc_ids)
+        self.avg_doc_length = (sum(self.doc_lengths) / doc_count) if doc_count else 0.0
+        self.idf = {
+            term: math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for term, posting in self.postings.items()
+        }
+        return self
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """Return up to top_k (doc_id, score) pairs ranked by BM25"""
+        return self.search_terms(tokenize(query), top_k)
+
+    def search_terms(self, terms: Iterable[str], top_k: int = 5) -> List[Tuple[str, float]]:
+        """Rank documents for already-tokenized query terms"""
+        scores: Dict[int, float] = {}
+        k1, b, avg_length = self.k1, self.b, self.avg_doc_length or 1.0
+        for term in set(terms):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = self.idf[term]
+            for doc_index, frequency in posting:
+                norm = k1 * (1 - b + b * self.doc_lengths[doc_index] / avg_length)
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * frequency * (k1 + 1) / (frequency + norm)
+
+        ranked = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(self.doc_ids[doc_index], score) for doc_index, score in ranked]
@@ -0,0 +1,230 @@
+"""Bounded, optionally persistent conversation histories keyed by session ID.
+
+Both stores expose append(), recent(), count() and delete():
+
+- MemorySessionStore keeps the newest messages of each session in a ring buffer
+  and evicts sessions that are least recently used or idle.
+- SQLiteSessionStore appends every message to a SQLite (WAL) log, so
+  conversations survive restarts and are shared by worker processes. A
+  MemorySessionStore in front of it serves repeat reads of the newest turns.
+"""
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Deque, Dict, Iterable, List, Optional
+
+Message = Dict[str, str]
+
+
+class _Session:
+    __slots__ = ("last_used", "messages", "total")
+
+    def __init__(self, max_messages: int):
+        self.last_used = time.monotonic()
+        self.messages: Deque[Message] = deque(maxlen=max_messages)
+        # Messages ever appended, including those that fell out of the ring
+        self.total = 0
+
+
+class MemorySessionStore:
+    """Newest max_messages per session, for at most max_sessions sessions
+
+    Sessions are evicted least-recently-used beyond max_sessions or once idle
+    for idle_ttl seconds, so memory stays flat however many visitors come.
+    """
+
+    def __init__(self, max_sessions: int = 10000, max_messages: int = 100, idle_ttl: float = 3600.0):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _touch(self, session_id: str, create: bool = False) -> Optional[_Session]:
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is not None and now - session.last_used >= self.idle_ttl:
+            del self._sessions[session_id]
+            session = None
+        if session is None:
+            if not create:
+                return None
+            session = self._sessions[session_id] = _Session(self.max_messages)
+        session.last_used = now
+        self._sessions.move_to_end(session_id)
+        self._evict(now)
+        return session
+
+    def _evict(self, now: float) -> None:
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if len(self._sessions) <= self.max_sessions and now - oldest.last_used < self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+
+    def append(self, session_id: str, messages: Iterable[Message]) -> None:
+        with self._lock:
+            session = self._touch(session_id, create=True)
+            for message in messages:
+                session.messages.append({"role": message["role"], "content": message["content"]})
+                session.total += 1
+
+    def recent(self, session_id: str, limit: Optional[int] = None) -> List[Message]:
+        """The newest `limit` retained messages (all retained when None), oldest first"""
+        with self._lock:
+            session = self._touch(session_id)
+            if session is None:
+                return []
+            messages = list(session.messages)
+        return messages if limit is None else messages[-limit:] if limit > 0 else []
+
+    def count(self, session_id: str) -> int:
+        """Messages appended to the session, including those no longer retained"""
+        with self._lock:
+            session = self._touch(session_id)
+            return session.total if session is not None else 0
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def replace(self, session_id: str, messages: List[Message], total: int) -> None:
+        """Load the newest messages of a session read from elsewhere"""
+        with self._lock:
+            session = self._touch(session_id, create=True)
+            session.messages.clear()
+            session.messages.extend(messages)
+            session.total = total
+
+    def cached_total(self, session_id: str) -> Optional[int]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session.total if session is not None else None
+
+
+class SQLiteSessionStore:
+    """Append-only message log in SQLite (WAL) with a bounded in-memory tier
+
+    Messages are keyed by (session_id, seq), so reloading the last N turns is
+    one index range scan. Each read first checks the session's message count,
+    so appends made by other worker processes are picked up. Sessions idle
+    for longer than retention seconds, and messages beyond max_stored_messages
+    per session, are pruned every 256 appends.
+    """
+
+    def __init__(self, path: Path, cache: Optional[MemorySessionStore] = None,
+                 max_stored_messages: int = 1000, retention: float = 30 * 86400.0):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.cache = cache if cache is not None else MemorySessionStore()
+        self.max_stored_messages = max_stored_messages
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._appends = 0
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, messages INTEGER NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+            "created REAL NOT NULL, PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+        )
+        self.prune()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def _total(self, session_id: str) -> int:
+        row = self._conn.execute("SELECT messages FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def append(self, session_id: str, messages: Iterable[Message]) -> None:
+        messages = [{"role": m["role"], "content": m["content"]} for m in messages]
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so workers cannot reuse a seq
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                total = self._total(session_id)
+                self._conn.executemany(
+                    "INSERT INTO messages (session_id, seq, role, content, created) VALUES (?, ?, ?, ?, ?)",
+                    [(session_id, total + i, m["role"], m["content"], now) for i, m in enumerate(messages)],
+                )
+                self._conn.execute(
+                    "INSERT INTO sessions (session_id, messages, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET messages = excluded.messages, updated = excluded.updated",
+                    (session_id, total + len(messages), now),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._appends += 1
+            prune = self._appends % 256 == 0
+
+        # Extend the cached ring only when it was already up to date
+        if self.cache.cached_total(session_id) == total:
+            self.cache.append(session_id, messages)
+        if prune:
+            self.prune()
+
+    def recent(self, session_id: str, limit: Optional[int] = None) -> List[Message]:
+        """The newest `limit` messages (the cache's ring size when None), oldest first"""
+        limit = self.cache.max_messages if limit is None else limit
+        if limit <= 0:
+            return []
+        with self._lock:
+            total = self._total(session_id)
+        if total == 0:
+            return []
+        if limit <= self.cache.max_messages and self.cache.cached_total(session_id) == total:
+            return self.cache.recent(session_id, limit)
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                (session_id, max(limit, self.cache.max_messages)),
+            ).fetchall()
+        messages = [{"role": role, "content": content} for role, content in reversed(rows)]
+        self.cache.replace(session_id, messages[-self.cache.max_messages:], total)
+        return messages[-limit:]
+
+    def count(self, session_id: str) -> int:
+        with self._lock:
+            return self._total(session_id)
+
+    def delete(self, session_id: str) -> bool:
+        self.cache.delete(session_id)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            deleted = self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount
+            self._conn.execute("COMMIT")
+        return deleted > 0
+
+    def prune(self) -> int:
+        """Drop idle sessions and messages beyond max_stored_messages; returns messages removed"""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            removed = self._conn.execute(
+                "DELETE FROM messages WHERE session_id IN (SELECT session_id FROM sessions WHERE updated < ?)",
+                (cutoff,),
+            ).rowcount
+            self._conn.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,))
+            removed += self._conn.execute(
+                "DELETE FROM messages WHERE seq < ("
+                "SELECT s.messages FROM sessions s WHERE s.session_id = messages.session_id) - ?",
+                (self.max_stored_messages,),
+            ).rowcount
+            self._conn.execute("COMMIT")
+        return removed
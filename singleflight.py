@@ -0,0 +1,182 @@
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+
+class _Flight:
+    """Shared state of one in-flight upstream call"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.deltas: List[str] = []
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls so only one reaches the upstream
+
+    Callers that arrive while a call with the same key is running wait for
+    it and receive its result (or exception) instead of starting their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def _join(self, key: str):
+        """Return (flight, is_leader) for key"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            self.calls += 1
+            return flight, True
+
+    def _finish(self, key: str, flight: _Flight) -> None:
+        with self._lock:
+            self._flights.pop(key, None)
+        with flight.cond:
+            flight.done = True
+            flight.cond.notify_all()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run fn once for all concurrent callers with the same key"""
+        flight, leader = self._join(key)
+        if leader:
+            try:
+                flight.result = fn()
+            except BaseException as e:
+                flight.error = e
+            finally:
+                self._finish(key, flight)
+        else:
+            with flight.cond:
+                flight.cond.wait_for(lambda: flight.done)
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def stream(self, key: str, fn: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """Fan the deltas of one upstream stream out to every concurrent caller
+
+        The upstream is drained by a background thread, so a caller that stops
+        reading early (e.g. the user navigated away) does not cut off the rest.
+        Late joiners first replay the deltas produced so far.
+        """
+        flight, leader = self._join(key)
+        if leader:
+            threading.Thread(target=self._produce, args=(key, flight, fn), daemon=True).start()
+
+        position = 0
+        while True:
+            with flight.cond:
+                flight.cond.wait_for(lambda: flight.done or len(flight.deltas) > position)
+                pending = flight.deltas[position:]
+                finished = flight.done
+            for delta in pending:
+                yield delta
+            position += len(pending)
+            if finished and position == len(flight.deltas):
+                break
+
+        if flight.error is not None:
+            raise flight.error
+
+    def _produce(self, key: str, flight: _Flight, fn: Callable[[], Iterator[str]]) -> None:
+        try:
+            for delta in fn():
+                with flight.cond:
+                    flight.deltas.append(delta)
+                    flight.cond.notify_all()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            self._finish(key, flight)
+
+
+class _AsyncFlight:
+    def __init__(self):
+        self.changed = asyncio.Event()
+        self.deltas: List[str] = []
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        self.done = False
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight
+
+    The upstream call runs in its own task, so cancelling one waiter leaves the
+    others unaffected; the task is cancelled only once every waiter has gone.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _AsyncFlight] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def _join(self, key: str, start: Callable[[_AsyncFlight], Awaitable[Any]]) -> _AsyncFlight:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _AsyncFlight()
+            flight.task = asyncio.ensure_future(start(flight))
+            flight.task.add_done_callback(lambda _: self._finish(key, flight))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        return flight
+
+    def _finish(self, key: str, flight: _AsyncFlight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        flight.done = True
+        flight.changed.set()
+
+    def _leave(self, flight: _AsyncFlight) -> None:
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            flight.task.cancel()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn once for all concurrent callers with the same key"""
+        flight = self._join(key, lambda _: fn())
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            self._leave(flight)
+
+    async def stream(self, key: str, fn: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Fan the deltas of one upstream async stream out to every concurrent caller"""
+
+        async def produce(flight: _AsyncFlight) -> None:
+            async for delta in fn():
+                flight.deltas.append(delta)
+                flight.changed.set()
+
+        flight = self._join(key, produce)
+        position = 0
+        try:
+            while True:
+                if position < len(flight.deltas):
+                    pending = flight.deltas[position:]
+                    position += len(pending)
+                    for delta in pending:
+                        yield delta
+                    continue
+                if flight.done:
+                    break
+                flight.changed.clear()
+                await flight.changed.wait()
+
+            if not flight.task.cancelled() and flight.task.exception() is not None:
+                raise flight.task.exception()
+        finally:
+            self._leave(flight)
@@ -0,0 +1,178 @@
+"""Cold-start helpers: lazy Groq client, warm-up hook and a startup-time report.
+
+Run ahead of time (e.g. in a container build step) to prebuild the on-disk
+corpus snapshot and vector index, so new workers only load them:
+
+    python startup.py
+"""
+import importlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# First import of this module approximates the start of the worker's first script run
+PROCESS_START = time.perf_counter()
+
+# Exercise FAQ routing, the catalog, retrieval, prompt building and spelling correction once each
+WARM_UP_QUERIES = [
+    "What products do you offer?",
+    "How long does shipping take?",
+    "Garry N Sun products under ₹500",
+    "Do you have capsules for immunity?",
+    "immunty ke liye kya hai",
+]
+
+_env_lock = threading.Lock()
+_env_loaded = False
+
+
+def load_environment() -> None:
+    """Load .env once per process instead of on every Streamlit rerun"""
+    global _env_loaded
+    with _env_lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _env_loaded = True
+
+
+class StartupReport:
+    """Wall-clock phases of a worker's cold start, ending at first interactive render"""
+
+    def __init__(self, started: float = PROCESS_START):
+        self.started = started
+        self.phases: List[Dict[str, Any]] = []
+        self.interactive_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, start)
+
+    def add(self, name: str, seconds: float, start: Optional[float] = None) -> None:
+        with self._lock:
+            self.phases.append({
+                "phase": name,
+                "ms": round(seconds * 1000, 1),
+                "offset_ms": round(((start or time.perf_counter() - seconds) - self.started) * 1000, 1),
+            })
+
+    def mark_interactive(self) -> bool:
+        """Record the first complete render; returns True only for that first call"""
+        with self._lock:
+            if self.interactive_at is not None:
+                return False
+            self.interactive_at = time.perf_counter()
+            return True
+
+    @property
+    def time_to_interactive_ms(self) -> Optional[float]:
+        if self.interactive_at is None:
+            return None
+        return round((self.interactive_at - self.started) * 1000, 1)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            phases = list(self.phases)
+        return {"time_to_interactive_ms": self.time_to_interactive_ms, "phases": phases}
+
+    def format(self) -> str:
+        report = self.as_dict()
+        phases = ", ".join(f"{p['phase']} {p['ms']:.0f}ms" for p in report["phases"])
+        tti = report["time_to_interactive_ms"]
+        return f"Startup: {phases}" + (f"; interactive after {tti:.0f}ms" if tti is not None else "")
+
+
+# One report per worker process
+startup_report = StartupReport()
+
+
+class LazyGroqClient:
+    """Stand-in for groq.Groq that imports the SDK on first use
+
+    Importing groq (pydantic models, httpx) is the slowest import on the
+    page, and FAQ, catalog and cached answers never need it, so it is
+    deferred until the first LLM-bound message or a background preload.
+    """
+
+    def __init__(self, report: Optional[StartupReport] = None, module: str = "groq",
+                 class_name: str = "Groq", **client_kwargs: Any):
+        self.report = report
+        self.module = module
+        self.class_name = class_name
+        self.client_kwargs = client_kwargs
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._client is not None
+
+    def get_client(self) -> Any:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    start = time.perf_counter()
+                    client_class = getattr(importlib.import_module(self.module), self.class_name)
+                    client = client_class(**self.client_kwargs)
+                    if self.report is not None:
+                        self.report.add("groq_import", time.perf_counter() - start, start)
+                    self._client = client
+        return self._client
+
+    def preload(self) -> threading.Thread:
+        """Import the SDK on a background thread so the first LLM call does not wait for it"""
+        thread = threading.Thread(target=self.get_client, name="groq-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for attributes not set in __init__, e.g. chat, close
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get_client(), name)
+
+
+def warm_up(chat_handler: Any, queries: Optional[List[str]] = None,
+            report: Optional[StartupReport] = None) -> None:
+    """Run the pre-LLM pipeline on sample queries to fill lazy indexes and caches
+
+    Internal traces keep warm-up requests out of the metrics, the profiler
+    and the cache hit rate.
+    """
+    report = report or startup_report
+    with report.phase("warm_up"):
+        for query in queries or WARM_UP_QUERIES:
+            chat_handler._prepare_request(query, [], chat_handler.metrics.internal_trace())
+
+
+def _timed(report: StartupReport, name: str, build: Callable[[], Any]) -> Any:
+    with report.phase(name):
+        return build()
+
+
+def prebuild() -> Dict[str, Any]:
+    """Build the corpus snapshot and vector index on disk and report the timings"""
+    report = StartupReport(time.perf_counter())
+    from ingestion import load_corpus
+    from intent_classifier import IntentClassifier
+    from knowledge_base import KnowledgeBase
+    from retrievers import VectorRetriever
+    from vector_index import VECTOR_INDEX_DIR
+
+    corpus = _timed(report, "corpus_snapshot", load_corpus)
+    knowledge_base = _timed(report, "knowledge_base", lambda: KnowledgeBase(corpus))
+    _timed(report, "vector_index", lambda: VectorRetriever(knowledge_base, index_path=VECTOR_INDEX_DIR))
+    _timed(report, "intent_classifier", IntentClassifier.load_or_train)
+    report.mark_interactive()
+    return report.as_dict()
+
+
+if __name__ == "__main__":
+    print(json.dumps(prebuild(), indent=2))
@@ -0,0 +1,425 @@
+"""Resilient calls to the Groq chat completions API.
+
+Every attempt gets strict connect and read deadlines inside an overall
+budget. Retryable failures (timeouts, connection errors, 408/409/429 and
+5xx) are retried with jittered exponential backoff. Once recent latencies
+are known, a request still unanswered at their p95 can be hedged with a
+second identical request, and the first to answer wins. A circuit breaker
+per model skips a model after repeated failures, so requests move to the
+fallback model straight away. When every model is unavailable,
+UpstreamUnavailable is raised, and the caller answers from retrieval alone.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+
+from metrics import MetricsRecorder, percentile
+
+RETRYABLE_STATUS = (408, 409, 429)
+
+
+class UpstreamUnavailable(Exception):
+    """Every model failed, ran out of time or has an open circuit"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True for failures another attempt (or model) may not hit"""
+    # Both are already loaded by the client that raised the error
+    import groq
+    import httpx
+
+    if isinstance(error, groq.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    # Timeouts raised by httpx while reading a stream are not wrapped by the SDK
+    return isinstance(error, (groq.APIConnectionError, httpx.TransportError, TimeoutError, ConnectionError))
+
+
+class CircuitBreaker:
+    """Closed, open after `failure_threshold` consecutive failures, half open after `reset_timeout`
+
+    While half open a single probe request is let through; its outcome
+    closes the circuit again or re-opens it for another `reset_timeout`. A
+    probe that ends with neither (cancelled, or out of time) is released so
+    the next request can probe instead.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._probe_owner: Optional[object] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self, owner: Optional[object] = None) -> bool:
+        """True when a request may go ahead; a half-open probe belongs to `owner` until release()"""
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                self._probe_owner = owner
+                return True
+            return False
+
+    def release(self, owner: object) -> None:
+        """End owner's probe if no success or failure was recorded for it"""
+        with self._lock:
+            if self._probing and owner is not None and self._probe_owner is owner:
+                self._probing = False
+                self._probe_owner = None
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+            self._probe_owner = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+            self._probe_owner = None
+
+
+class RetryPolicy:
+    """Attempts per model and their "full jitter" exponential backoff"""
+
+    def __init__(self, attempts: int = 3, base_delay: float = 0.25, max_delay: float = 2.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class PrefetchedStream:
+    """A completion stream whose first chunk has already arrived"""
+
+    def __init__(self, stream: Any):
+        self.stream = stream
+        self._chunks = iter(stream)
+        self.first = next(self._chunks, None)
+
+    def __iter__(self) -> Iterator[Any]:
+        if self.first is not None:
+            yield self.first
+        yield from self._chunks
+
+    def close(self) -> None:
+        self.stream.close()
+
+
+class AsyncPrefetchedStream:
+    """An async completion stream whose first chunk has already arrived"""
+
+    def __init__(self, stream: Any):
+        self.stream = stream
+        self._chunks = aiter(stream)
+        self.first = None
+
+    async def prefetch(self) -> "AsyncPrefetchedStream":
+        self.first = await anext(self._chunks, None)
+        return self
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        if self.first is not None:
+            yield self.first
+        async for chunk in self._chunks:
+            yield chunk
+
+    async def close(self) -> None:
+        await self.stream.close()
+
+
+class _UpstreamBase:
+    def __init__(self, client: Any, model: str, fallback_model: Optional[str] = None,
+                 connect_timeout: float = 3.0, read_timeout: float = 20.0, total_timeout: float = 45.0,
+                 retry: Optional[RetryPolicy] = None, hedge: bool = False, hedge_percentile: float = 0.95,
+                 hedge_min_samples: int = 20, hedge_min_delay: float = 0.25, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0, metrics: Optional[MetricsRecorder] = None):
+        self.client = client
+        self.models = [model] + ([fallback_model] if fallback_model and fallback_model != model else [])
+        self.connect_timeout = connect_timeout
+        # For streams this bounds the wait for each chunk, including the first
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.retry = retry or RetryPolicy()
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self.breakers = {name: CircuitBreaker(failure_threshold, reset_timeout) for name in self.models}
+        self.metrics = metrics
+        # Recent time to response (or first chunk) per (model, stream)
+        self._latencies: Dict[Tuple[str, bool], Deque[float]] = {}
+        self._raw_client: Any = None
+
+    @property
+    def model(self) -> str:
+        return self.models[0]
+
+    def circuit_states(self) -> Dict[str, str]:
+        return {name: breaker.state for name, breaker in self.breakers.items()}
+
+    def hedge_delay(self, model: str, stream: bool) -> Optional[float]:
+        """Seconds after which a second request is sent, or None while hedging is off"""
+        samples = self._latencies.get((model, stream))
+        if not self.hedge or samples is None or len(samples) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, percentile(sorted(samples), self.hedge_percentile))
+
+    def _observe(self, model: str, stream: bool, seconds: float) -> None:
+        self._latencies.setdefault((model, stream), deque(maxlen=256)).append(seconds)
+
+    def _count(self, event: str) -> None:
+        if self.metrics is not None:
+            self.metrics.count_upstream(event)
+
+    def _client(self) -> Any:
+        # Retries are ours, so the SDK's own are switched off
+        if self._raw_client is None:
+            self._raw_client = self.client.with_options(max_retries=0)
+        return self._raw_client
+
+    def _timeout(self, remaining: float) -> Any:
+        import httpx  # loaded with the SDK
+
+        return httpx.Timeout(min(self.read_timeout, remaining), connect=min(self.connect_timeout, remaining))
+
+    def _failed(self, model: str, error: BaseException) -> bool:
+        """Record a failed attempt; returns True when it is worth retrying"""
+        if not is_retryable(error):
+            # The service answered; the request itself is at fault
+            self.breakers[model].record_success()
+            return False
+        self._count("timeout" if "Timeout" in type(error).__name__ else "error")
+        self.breakers[model].record_failure()
+        return True
+
+
+class UpstreamClient(_UpstreamBase):
+    """Resilient completions over a blocking Groq client
+
+    Hedged requests run on a small thread pool; a losing request is left to
+    finish in the background and its stream, if any, is closed.
+    """
+
+    def __init__(self, client: Any, model: str, fallback_model: Optional[str] = None,
+                 hedge_workers: int = 32, **options: Any):
+        super().__init__(client, model, fallback_model, **options)
+        self.hedge_workers = hedge_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def create(self, messages: List[Dict[str, str]], stream: bool = False, **params: Any) -> Any:
+        """Return a completion, or a PrefetchedStream of chunks when stream=True"""
+        deadline = time.monotonic() + self.total_timeout
+        for index, model in enumerate(self.models):
+            if deadline - time.monotonic() <= 0:
+                raise UpstreamUnavailable("deadline exceeded")
+            breaker = self.breakers[model]
+            ticket = object()
+            if not breaker.allow(ticket):
+                self._count("circuit_open")
+                continue
+            try:
+                if index:
+                    self._count("fallback_model")
+                for attempt in range(self.retry.attempts):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise UpstreamUnavailable("deadline exceeded")
+                    try:
+                        result = self._hedged(model, messages, stream, params, remaining)
+                    except Exception as e:
+                        if not self._failed(model, e):
+                            raise
+                        if breaker.state != CircuitBreaker.CLOSED or attempt + 1 == self.retry.attempts:
+                            break
+                        self._count("retry")
+                        time.sleep(min(self.retry.backoff(attempt), max(0.0, deadline - time.monotonic())))
+                        continue
+                    breaker.record_success()
+                    return result
+            finally:
+                # A cancelled or timed-out probe must not keep the circuit half open forever
+                breaker.release(ticket)
+        raise UpstreamUnavailable("no model available")
+
+    def _attempt(self, model: str, messages: List[Dict[str, str]], stream: bool,
+                 params: Dict[str, Any], remaining: float) -> Any:
+        started = time.perf_counter()
+        response = self._client().chat.completions.create(
+            model=model, messages=messages, stream=stream, timeout=self._timeout(remaining), **params
+        )
+        if stream:
+            try:
+                response = PrefetchedStream(response)
+            except BaseException:
+                response.close()
+                raise
+        self._observe(model, stream, time.perf_counter() - started)
+        return response
+
+    def _hedged(self, model: str, messages: List[Dict[str, str]], stream: bool,
+                params: Dict[str, Any], remaining: float) -> Any:
+        delay = self.hedge_delay(model, stream)
+        if delay is None or delay >= remaining:
+            return self._attempt(model, messages, stream, params, remaining)
+
+        started = time.monotonic()
+        primary = self._executor().submit(self._attempt, model, messages, stream, params, remaining)
+        pending = {primary}
+        if not wait(pending, timeout=delay).done:
+            self._count("hedge")
+            pending.add(self._executor().submit(self._attempt, model, messages, stream, params,
+                                                remaining - delay))
+        error: Optional[BaseException] = None
+        winner: Optional[Future] = None
+        finished: List[Future] = []
+        while pending and winner is None:
+            left = remaining - (time.monotonic() - started)
+            done, pending = wait(pending, timeout=max(0.0, left), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if winner is None and future.exception() is None:
+                    winner = future
+                else:
+                    error = error or future.exception()
+                    finished.append(future)
+        # Streams opened by requests that lost the race are closed as they finish
+        for loser in finished + list(pending):
+            loser.add_done_callback(_close_stream)
+        if winner is not None:
+            if winner is not primary:
+                self._count("hedge_won")
+            return winner.result()
+        if pending:
+            raise TimeoutError("upstream deadline exceeded")
+        raise error
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(self.hedge_workers, thread_name_prefix="upstream")
+        return self._pool
+
+
+def _close_stream(future: Future) -> None:
+    """Close the stream of a request that lost the race"""
+    if not future.cancelled() and future.exception() is None and isinstance(future.result(), PrefetchedStream):
+        future.result().close()
+
+
+class AsyncUpstreamClient(_UpstreamBase):
+    """Resilient completions over AsyncGroq; a losing hedged request is cancelled"""
+
+    async def create(self, messages: List[Dict[str, str]], stream: bool = False, **params: Any) -> Any:
+        """Return a completion, or an AsyncPrefetchedStream of chunks when stream=True"""
+        deadline = time.monotonic() + self.total_timeout
+        for index, model in enumerate(self.models):
+            if deadline - time.monotonic() <= 0:
+                raise UpstreamUnavailable("deadline exceeded")
+            breaker = self.breakers[model]
+            ticket = object()
+            if not breaker.allow(ticket):
+                self._count("circuit_open")
+                continue
+            try:
+                if index:
+                    self._count("fallback_model")
+                for attempt in range(self.retry.attempts):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise UpstreamUnavailable("deadline exceeded")
+                    try:
+                        result = await asyncio.wait_for(
+                            self._hedged(model, messages, stream, params, remaining), remaining
+                        )
+                    except Exception as e:
+                        if not self._failed(model, e):
+                            raise
+                        if breaker.state != CircuitBreaker.CLOSED or attempt + 1 == self.retry.attempts:
+                            break
+                        self._count("retry")
+                        await asyncio.sleep(min(self.retry.backoff(attempt), max(0.0, deadline - time.monotonic())))
+                        continue
+                    breaker.record_success()
+                    return result
+            finally:
+                # A cancelled or timed-out probe must not keep the circuit half open forever
+                breaker.release(ticket)
+        raise UpstreamUnavailable("no model available")
+
+    async def _attempt(self, model: str, messages: List[Dict[str, str]], stream: bool,
+                       params: Dict[str, Any], remaining: float) -> Any:
+        started = time.perf_counter()
+        response = await self._client().chat.completions.create(
+            model=model, messages=messages, stream=stream, timeout=self._timeout(remaining), **params
+        )
+        if stream:
+            try:
+                response = await AsyncPrefetchedStream(response).prefetch()
+            except BaseException:
+                await response.close()
+                raise
+        self._observe(model, stream, time.perf_counter() - started)
+        return response
+
+    async def _hedged(self, model: str, messages: List[Dict[str, str]], stream: bool,
+                      params: Dict[str, Any], remaining: float) -> Any:
+        delay = self.hedge_delay(model, stream)
+        if delay is None or delay >= remaining:
+            return await self._attempt(model, messages, stream, params, remaining)
+
+        primary = asyncio.ensure_future(self._attempt(model, messages, stream, params, remaining))
+        tasks = {primary}
+        finished: List[asyncio.Future] = []
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self._count("hedge")
+                tasks.add(asyncio.ensure_future(self._attempt(model, messages, stream, params,
+                                                              remaining - delay)))
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                finished.extend(done)
+                for task in done:
+                    if task.exception() is None:
+                        finished.remove(task)
+                        if task is not primary:
+                            self._count("hedge_won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Cancelling the loser closes its connection; one that also finished is closed here
+            for task in tasks:
+                task.cancel()
+            for task in finished:
+                if task.exception() is None and isinstance(task.result(), AsyncPrefetchedStream):
+                    await task.result().close()
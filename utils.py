@@ -1,30 +1,77 @@
+import re
+import uuid
 import streamlit as st
 from typing import List, Dict
 
+# Messages rendered per page of history; "Load earlier" reveals one more page
+HISTORY_WINDOW = 20
+
+SESSION_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
 def initialize_session_state():
-    """Initialize session state variables"""
-    if 'chat_history' not in st.session_state:
-        st.session_state.chat_history = []
+    """Initialize session state variables
+    
+    The conversation itself lives in the session store under session_id,
+    which is kept in the page URL (?sid=...) so a reload or a redeploy
+    resumes the same conversation.
+    """
+    if 'session_id' not in st.session_state:
+        session_id = st.query_params.get("sid")
+        if not session_id or not SESSION_ID_PATTERN.fullmatch(session_id):
+            session_id = uuid.uuid4().hex
+            st.query_params["sid"] = session_id
+        st.session_state.session_id = session_id
     
     if 'user_info' not in st.session_state:
         st.session_state.user_info = {}
+    
+    if 'history_window' not in st.session_state:
+        st.session_state.history_window = HISTORY_WINDOW
+
+def display_message(message: Dict[str, str]):
+    """Render one chat message bubble"""
+    if message["role"] == "user":
+        with st.chat_message("user", avatar="👤"):
+            st.write(message["content"])
+    elif message["role"] == "assistant":
+        with st.chat_message("assistant", avatar="🪷"):
+            st.write(message["content"])
+
+def _load_earlier_messages():
+    st.session_state.history_window += HISTORY_WINDOW
+
+@st.fragment
+def _display_history_window(store):
+    """Render the newest messages; "Load earlier" reruns only this fragment"""
+    window = st.session_state.history_window
+    # One extra message tells whether the store still holds anything older
+    history = store.recent(st.session_state.session_id, window + 1)
+    if len(history) > window:
+        history = history[1:]
+        st.button("⬆️ Load earlier messages", key="load_earlier",
+                  on_click=_load_earlier_messages, use_container_width=True)
+    for message in history:
+        display_message(message)
 
-def display_chat_history():
-    """Display chat history in the main interface"""
-    if st.session_state.chat_history:
+def display_chat_history(store):
+    """Display chat history in the main interface
+    
+    Only the last HISTORY_WINDOW messages are read from the session store
+    and rendered, so a rerun costs the same however long the conversation
+    is. Returns the welcome message's placeholder when the history is
+    empty, so it can be cleared once a question is asked without a full rerun.
+    """
+    if store.count(st.session_state.session_id):
         # Create a container for chat messages
         chat_container = st.container()
         
         with chat_container:
-            for i, message in enumerate(st.session_state.chat_history):
-                if message["role"] == "user":
-                    with st.chat_message("user", avatar="👤"):
-                        st.write(message["content"])
-                elif message["role"] == "assistant":
-                    with st.chat_message("assistant", avatar="🪷"):
-                        st.write(message["content"])
-    else:
-        # Welcome message with professional styling
+            _display_history_window(store)
+        return None
+    
+    # Welcome message with professional styling
+    welcome = st.empty()
+    with welcome.container():
         with st.chat_message("assistant", avatar="🪷"):
             st.markdown("""
             <div style="background: linear-gradient(135deg, #e8f5e8 0%, #f0f8ff 100%); padding: 20px; border-radius: 10px; border: 1px solid #2E8B57;">
@@ -40,6 +87,7 @@ def display_chat_history():
                 <p style="color: #2E8B57; font-weight: bold; margin: 15px 0 0 0;">How can I assist you today?</p>
             </div>
             """, unsafe_allow_html=True)
+    return welcome
 
 def format_product_info(products: List[Dict]) -> str:
     """Format product information for display"""
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import shutil
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from search_index import tokenize
+
+VECTOR_INDEX_DIR = Path(__file__).resolve().parent / ".cache" / "vector_index"
+
+N_FEATURES = 1 << 14
+NGRAM_RANGE = (3, 4)
+
+# Saved index versions kept on disk; older ones are deleted after a new save
+KEEP_VERSIONS = 3
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _features(text: str) -> Counter:
+    """Word terms plus character n-grams of each term, as hashable strings"""
+    features = Counter()
+    low, high = NGRAM_RANGE
+    for token in tokenize(text):
+        features["w:" + token] += 1
+        padded = f" {token} "
+        for n in range(low, high + 1):
+            for start in range(len(padded) - n + 1):
+                features[padded[start:start + n]] += 1
+    return features
+
+
+class HashingTfidfVectorizer:
+    """Hashed TF-IDF over word and character n-gram features"""
+
+    def __init__(self, n_features: int = N_FEATURES):
+        self.n_features = n_features
+        self.idf = np.ones(n_features, dtype=np.float32)
+
+    def _bucket(self, feature: str) -> int:
+        # crc32 is stable across processes, unlike the builtin hash()
+        return zlib.crc32(feature.encode("utf-8")) % self.n_features
+
+    def _term_counts(self, text: str) -> Counter:
+        counts = Counter()
+        for feature, count in _features(text).items():
+            counts[self._bucket(feature)] += count
+        return counts
+
+    def fit_transform(self, texts: Sequence[str]) -> np.ndarray:
+        """Learn IDF weights from texts and return their L2-normalised matrix"""
+        rows = [self._term_counts(text) for text in texts]
+        doc_freq = np.zeros(self.n_features, dtype=np.float32)
+        for counts in rows:
+            doc_freq[list(counts)] += 1
+        self.idf = (np.log((1 + len(rows)) / (1 + doc_freq)) + 1).astype(np.float32)
+        return self._to_matrix(rows)
+
+    def refit_transform(self, texts: Sequence[Optional[str]], previous_rows: np.ndarray,
+                        previous_idf: np.ndarray) -> np.ndarray:
+        """fit_transform where texts that are None reuse a row of a previous fit
+
+        A saved row is the normalised product of the log term frequencies
+        and the old IDF, so dividing by the old IDF recovers the frequencies up
+        to a scale factor that the final normalisation removes. Only new and
+        changed texts are tokenised. previous_rows holds one row for each
+        None text, in order.
+        """
+        matrix = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        reused = [index for index, text in enumerate(texts) if text is None]
+        if reused:
+            matrix[reused] = previous_rows / previous_idf
+        for index, text in enumerate(texts):
+            if text is not None:
+                counts = self._term_counts(text)
+                if counts:
+                    columns = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+                    values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+                    matrix[index, columns] = 1 + np.log(values)
+        doc_freq = np.count_nonzero(matrix, axis=0).astype(np.float32)
+        self.idf = (np.log((1 + len(texts)) / (1 + doc_freq)) + 1).astype(np.float32)
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def transform(self, texts: Iterable[str]) -> np.ndarray:
+        """Vectorise texts with the fitted IDF weights"""
+        return self._to_matrix([self._term_counts(text) for text in texts])
+
+    def _to_matrix(self, rows: List[Counter]) -> np.ndarray:
+        matrix = np.zeros((len(rows), self.n_features), dtype=np.float32)
+        for row_index, counts in enumerate(rows):
+            if counts:
+                columns = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+                values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+                matrix[row_index, columns] = 1 + np.log(values)
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+class VectorIndex:
+    """Dense float32 document matrix with batched cosine top-k search"""
+
+    def __init__(self, doc_ids: List[str], matrix: np.ndarray, vectorizer: HashingTfidfVectorizer,
+                 fingerprint: str = "", doc_hashes: Optional[List[str]] = None):
+        self.doc_ids = doc_ids
+        self.matrix = matrix
+        self.vectorizer = vectorizer
+        self.fingerprint = fingerprint
+        # Hash of each row's text, so a rebuild can tell which rows are unchanged
+        self.doc_hashes = doc_hashes
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @staticmethod
+    def fingerprint_documents(documents: Sequence[Tuple[str, str]]) -> str:
+        """Stable hash of (doc_id, text) pairs, used to detect stale saved indexes"""
+        digest = hashlib.sha256(f"{N_FEATURES}:{NGRAM_RANGE}".encode("utf-8"))
+        for doc_id, text in documents:
+            digest.update(doc_id.encode("utf-8") + b"\0" + text.encode("utf-8") + b"\0")
+        return digest.hexdigest()
+
+    @classmethod
+    def build(cls, documents: Sequence[Tuple[str, str]], n_features: int = N_FEATURES,
+              previous: Optional["VectorIndex"] = None) -> "VectorIndex":
+        """Vectorise (doc_id, text) pairs into a contiguous matrix
+
+        With a previous index, rows of documents whose text is unchanged are
+        rescaled to the new IDF instead of being re-vectorised.
+        """
+        vectorizer = HashingTfidfVectorizer(n_features)
+        texts = [text for _, text in documents]
+        hashes = [_text_hash(text) for text in texts]
+        old_rows = {}
+        if previous is not None and previous.doc_hashes and previous.vectorizer.n_features == n_features:
+            old_rows = {text_hash: row for row, text_hash in enumerate(previous.doc_hashes)}
+        reused = [old_rows.get(text_hash) for text_hash in hashes]
+        if any(row is not None for row in reused):
+            matrix = vectorizer.refit_transform(
+                [None if row is not None else text for text, row in zip(texts, reused)],
+                previous.matrix[[row for row in reused if row is not None]],
+                previous.vectorizer.idf,
+            )
+        else:
+            matrix = vectorizer.fit_transform(texts)
+        return cls([doc_id for doc_id, _ in documents], np.ascontiguousarray(matrix), vectorizer,
+                   cls.fingerprint_documents(documents), hashes)
+
+    def search(self, query: str, top_k: int = 5, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """Return up to top_k (doc_id, cosine score) pairs for one query"""
+        return self.search_batch([query], top_k, min_score)[0]
+
+    def search_batch(self, queries: Sequence[str], top_k: int = 5,
+                     min_score: float = 0.0) -> List[List[Tuple[str, float]]]:
+        """Score every query against every document in a single matrix product"""
+        if not len(self.doc_ids):
+            return [[] for _ in queries]
+        scores = self.vectorizer.transform(queries) @ self.matrix.T
+        k = min(top_k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        results = []
+        for row, candidates in zip(scores, top):
+            ordered = candidates[np.argsort(-row[candidates])]
+            results.append([
+                (self.doc_ids[column], float(row[column]))
+                for column in ordered if row[column] > min_score
+            ])
+        return results
+
+    def save(self, directory: Path) -> None:
+        """Write the index as raw .npy arrays that load() can memory-map"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        suffix = f".{os.getpid()}.tmp"
+        for name, array in (("matrix", self.matrix), ("idf", self.vectorizer.idf)):
+            tmp_path = directory / f"{name}{suffix}"
+            with open(tmp_path, "wb") as handle:
+                np.save(handle, np.ascontiguousarray(array))
+            os.replace(tmp_path, directory / f"{name}.npy")
+        # Metadata goes last so a reader never pairs it with half-written arrays
+        meta_tmp = directory / f"meta{suffix}"
+        with open(meta_tmp, "w", encoding="utf-8") as handle:
+            json.dump({"fingerprint": self.fingerprint, "n_features": self.vectorizer.n_features,
+                       "doc_ids": self.doc_ids, "doc_hashes": self.doc_hashes}, handle)
+        os.replace(meta_tmp, directory / "meta.json")
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> "VectorIndex":
+        """Load a saved index; with mmap the matrix pages are shared between processes"""
+        directory = Path(directory)
+        with open(directory / "meta.json", "r", encoding="utf-8") as handle:
+            meta = json.load(handle)
+        mode = "r" if mmap else None
+        vectorizer = HashingTfidfVectorizer(meta["n_features"])
+        vectorizer.idf = np.load(directory / "idf.npy", mmap_mode=mode)
+        matrix = np.load(directory / "matrix.npy", mmap_mode=mode)
+        return cls(meta["doc_ids"], matrix, vectorizer, meta["fingerprint"], meta.get("doc_hashes"))
+
+    @classmethod
+    def load_or_build(cls, documents: Sequence[Tuple[str, str]], directory: Optional[Path],
+                      mmap: bool = True, previous: Optional["VectorIndex"] = None) -> "VectorIndex":
+        """Reuse a saved index when it matches the documents, else build and save one
+
+        Each version is saved to its own subdirectory named after the
+        fingerprint and never overwritten, so processes still reading an
+        older version's memory-mapped files are unaffected by a rebuild.
+        """
+        if directory is None:
+            return cls.build(documents, previous=previous)
+        fingerprint = cls.fingerprint_documents(documents)
+        version_dir = Path(directory) / fingerprint[:16]
+        try:
+            index = cls.load(version_dir, mmap=mmap)
+            if index.fingerprint == fingerprint:
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+        index = cls.build(documents, previous=previous)
+        try:
+            index.save(version_dir)
+            cls._prune_versions(Path(directory), version_dir)
+            return cls.load(version_dir, mmap=mmap) if mmap else index
+        except OSError:
+            return index
+
+    @staticmethod
+    def _prune_versions(directory: Path, current: Path, keep: int = KEEP_VERSIONS) -> None:
+        """Delete all but the newest saved versions; open memory maps stay valid after unlink"""
+        versions = sorted((path for path in directory.iterdir() if path.is_dir() and path != current),
+                          key=lambda path: path.stat().st_mtime, reverse=True)
+        for path in versions[keep - 1:]:
+            shutil.rmtree(path, ignore_errors=True)